@@ -1,3 +1,5 @@
+import os
+
 import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
@@ -26,19 +28,32 @@ def create_app():
 
     db.init_app(app)
 
+    from app.engine import init_engine
+    from app.services.autocomplete import ShortQueryMiddleware
+    from app.services.compression import init_compression
+    from app.services.metrics import init_metrics
+    from app.services.profiler import init_profiler
+    from app.services.upstream import init_upstream
+    init_engine(app)
+    init_metrics(app)
+    init_profiler(app)
+    init_upstream(app)
+    init_compression(app)
+    app.wsgi_app = ShortQueryMiddleware(app.wsgi_app)
+
     from app.routes.main import main_bp
     from app.routes.search import search_bp
     from app.routes.images import images_bp
     from app.routes.oddoneout import oddoneout_bp
+    from app.routes.daily import daily_bp
+    from app.routes.metrics import metrics_bp
 
     app.register_blueprint(main_bp)
     app.register_blueprint(search_bp, url_prefix="/search")
     app.register_blueprint(images_bp, url_prefix="/images")
     app.register_blueprint(oddoneout_bp, url_prefix="/oddoneout")
-
-    with app.app_context():
-        from app import models  # noqa: F401
-        db.create_all()
+    app.register_blueprint(daily_bp, url_prefix="/daily")
+    app.register_blueprint(metrics_bp)
 
     _register_cli(app)
 
@@ -49,6 +64,70 @@ def _register_cli(app):
     from datetime import date, timedelta
 
     from app.models import OddOneOutRound, Suggestion, Title
+    from app.services.suggestions import bump_version
+
+    @app.cli.group("db")
+    def db_cli():
+        """Manage the database schema."""
+
+    @db_cli.command()
+    def upgrade():
+        """Apply pending schema migrations. Run once per deploy, before workers start."""
+        from app.migrations import current_version, upgrade as upgrade_schema
+
+        for version, description in upgrade_schema():
+            click.echo(f"  Applied {version:>3}: {description}")
+        click.echo(f"Schema at version {current_version()} "
+                   f"({db.engine.url.render_as_string(hide_password=True)}).")
+
+    @db_cli.command()
+    def status():
+        """Show the current schema version and any pending migrations."""
+        from app.migrations import current_version, pending
+
+        click.echo(f"Schema at version {current_version()}.")
+        for version, description, _ in pending():
+            click.echo(f"  Pending {version:>3}: {description}")
+
+    @db_cli.command()
+    @click.option("--verbose", "-v", is_flag=True, help="Print every plan, not just failures.")
+    def explain(verbose):
+        """Check that every hot query is served by an index (exit 1 if not)."""
+        from app.migrations import check_query_plans, format_plan
+
+        try:
+            results = check_query_plans()
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        failed = 0
+        for name, problems, plan in results:
+            click.echo(f"  {'FAIL' if problems else 'ok':<4}  {name}" + (f" — {'; '.join(problems)}" if problems else ""))
+            if problems or verbose:
+                for line in format_plan(plan):
+                    click.echo(f"          {line}")
+            failed += bool(problems)
+        if failed:
+            raise SystemExit(1)
+
+    @db_cli.command("migrate-sqlite-to-postgres")
+    @click.argument("source", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--batch-size", default=5000, help="Rows read and COPY'd per batch.")
+    @click.option("--truncate", is_flag=True, help="Empty the Postgres tables first.")
+    def migrate_sqlite_to_postgres_cmd(source, batch_size, truncate):
+        """Copy every row from the SQLite file SOURCE into the Postgres DATABASE_URL."""
+        from app.services.transfer import migrate_sqlite_to_postgres
+
+        def progress(table, rows):
+            click.echo(f"\r  {table:<18} {rows:>10,} row(s)", nl=False)
+
+        try:
+            copied = migrate_sqlite_to_postgres(source, batch_size, truncate, progress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo("\r" + " " * 40 + "\r", nl=False)
+        for table, rows in copied:
+            click.echo(f"  {table:<18} {rows:>10,} row(s)")
+        click.echo("Done. Point DATABASE_URL at Postgres on every worker, then restart.")
 
     @app.cli.group()
     def suggestions():
@@ -64,6 +143,8 @@ def _register_cli(app):
                 db.session.add(Suggestion(title_1=t1, title_2=t2))
                 added += 1
         db.session.commit()
+        if added:
+            bump_version()
         click.echo(f"Added {added} suggestion(s) ({len(STARTER_SUGGESTIONS) - added} already existed).")
 
     @suggestions.command()
@@ -73,6 +154,7 @@ def _register_cli(app):
         """Add a new suggestion pair."""
         db.session.add(Suggestion(title_1=title_1, title_2=title_2))
         db.session.commit()
+        bump_version()
         click.echo(f"Added: '{title_1}' & '{title_2}'")
 
     @suggestions.command("list")
@@ -102,6 +184,48 @@ def _register_cli(app):
         db.session.commit()
         click.echo(f"Cleared cache for: {title.title} ({title.release_year})")
 
+    @cache.command("refresh-worker")
+    @click.option("--budget", type=int, default=None, help="Stop after this many TMDB requests (default: no limit).")
+    @click.option("--once", is_flag=True, help="Exit when no titles are due instead of waiting for more.")
+    def refresh_worker(budget, once):
+        """Re-fetch the stalest and most popular cached titles in the background, paced to
+        REFRESH_REQUESTS_PER_MINUTE. Safe to stop and restart at any time."""
+        from app.services.refresher import run
+
+        totals = run(budget=budget, once=once, echo=click.echo)
+        refreshed = sum(n for mode, n in totals.items() if mode != "error")
+        click.echo(f"Done. Refreshed {refreshed} title(s), {totals.get('error', 0)} error(s).")
+
+    @cache.command("similar")
+    @click.option("--top-k", default=20, help="Most connected titles kept per title.")
+    def similar(top_k):
+        """Rebuild the most-connected-titles index behind /similar/<id> (nightly; saves keep it current)."""
+        from app.services.similar import build
+
+        titles, pairs, seconds = build(top_k=top_k)
+        click.echo(f"Indexed {pairs:,} similar pair(s) for {titles:,} title(s) in {seconds:.1f}s.")
+
+    @cache.command("compile")
+    @click.option("--output", default=None, help="Snapshot path (default: CREDIT_SNAPSHOT_PATH or instance/credits.snap).")
+    def compile_snapshot_cmd(output):
+        """Export cached credits to the read-only snapshot used on the hot path."""
+        from app.services.snapshot import compile_snapshot, snapshot_path
+
+        path = output or snapshot_path()
+        titles, credits, persons = compile_snapshot(path)
+        size_kb = os.path.getsize(path) / 1024
+        click.echo(f"Compiled {titles} title(s), {credits} credit(s), {persons} person(s) to {path} ({size_kb:.0f} KB).")
+
+    @cache.command("rebuild-stats")
+    def rebuild_stats():
+        """Recompute title_stats (cast/crew counts, top cast) from the credits table."""
+        from app.engine import write_transaction
+        from app.services.title_stats import rebuild
+
+        with write_transaction() as session:
+            written = rebuild(session)
+        click.echo(f"Rebuilt stats for {written} title(s).")
+
     @cache.command("list")
     def list_cache():
         """List all cached titles."""
@@ -116,6 +240,59 @@ def _register_cli(app):
             click.echo(f"  {t.id:>8}  {t.media_type:>5}  {year:>4}  {t.title}")
         click.echo(f"\n  {len(rows)} title(s) cached.")
 
+    @app.cli.group()
+    def profiles():
+        """Inspect captured request profiles."""
+
+    @profiles.command("list")
+    def list_profiles_cmd():
+        """List captured profiles, newest last."""
+        from app.services.profiler import list_profiles
+
+        rows = list_profiles()
+        if not rows:
+            click.echo("No profiles captured. Set PROFILE_SAMPLE_RATE or send a signed X-Samecast-Profile header.")
+            return
+        click.echo(f"  {'Profile':<56}  {'ms':>8}  {'Samples':>7}  {'SQL':>4}  Path")
+        for name, data in rows:
+            click.echo(
+                f"  {name:<56}  {data['duration_ms']:>8.1f}  {data['samples']:>7}  {len(data['sql']):>4}  {data['path']}"
+            )
+
+    @profiles.command("show")
+    @click.argument("name")
+    @click.option("--top", default=15, help="Rows per section.")
+    def show_profile(name, top):
+        """Summarize one profile: hottest functions and SQL statements."""
+        from app.services.profiler import list_profiles, summarize
+
+        matches = [(n, d) for n, d in list_profiles() if n.startswith(name)]
+        if not matches:
+            click.echo(f"No profile matching '{name}'.")
+            return
+        name, data = matches[-1]
+        self_counts, inclusive, sql_groups = summarize(data, top)
+        samples = data["samples"] or 1
+        click.echo(f"{name}\n  {data['path']} → {data['status']} in {data['duration_ms']:.1f} ms, "
+                   f"{data['samples']} samples @ {data['interval_ms']:.1f} ms")
+        click.echo("\n  Self time:")
+        for frame, count in self_counts:
+            click.echo(f"    {count / samples:>6.1%}  {frame}")
+        click.echo("\n  Inclusive time:")
+        for frame, count in inclusive:
+            click.echo(f"    {count / samples:>6.1%}  {frame}")
+        click.echo(f"\n  SQL ({len(data['sql'])} statements):")
+        for stmt, (calls, total_ms) in sql_groups:
+            click.echo(f"    {calls:>4}x  {total_ms:>8.2f} ms  {stmt[:100]}")
+
+    @profiles.command("sign")
+    @click.argument("path")
+    def sign_profile(path):
+        """Print an X-Samecast-Profile header value that profiles PATH for 5 minutes."""
+        from app.services.profiler import HEADER, sign
+
+        click.echo(f"{HEADER}: {sign(path, app.config['SECRET_KEY'])}")
+
     # --- OddOneOut game commands ---
 
     @app.cli.group()
@@ -137,13 +314,22 @@ def _register_cli(app):
                 click.echo(f"  {target}  — already has {existing} round(s), skipping.")
                 continue
             try:
-                generate_rounds_for_date(target)
+                rounds = generate_rounds_for_date(target)
                 created += 1
-                click.echo(f"  {target}  — generated 3 rounds.")
+                click.echo(f"  {target}  — generated 3 rounds ({', '.join(r.difficulty for r in rounds)}).")
             except ValueError as e:
                 click.echo(f"  {target}  — ERROR: {e}")
         click.echo(f"\nDone. Created puzzles for {created} day(s).")
 
+    @game.command()
+    @click.option("--top-k", default=25, help="Co-stars kept per person.")
+    def costars(top_k):
+        """Rebuild co-star overlap scores used to tier round difficulty (run before 'game seed')."""
+        from app.services.costars import build
+
+        persons, pairs, seconds = build(top_k=top_k)
+        click.echo(f"Scored {pairs:,} co-star pair(s) for {persons:,} person(s) in {seconds:.1f}s.")
+
     @game.command()
     @click.option("--force", is_flag=True, help="Overwrite existing rounds.")
     def curated(force):
@@ -214,7 +400,7 @@ def _register_cli(app):
             click.echo(
                 f"    R{r.round_number}: {r.title_name} — "
                 f"{r.actor_1_name}, {r.actor_2_name}, {r.actor_3_name} "
-                f"(outsider: {r.outsider_name})"
+                f"(outsider: {r.outsider_name})" + (f" [{r.difficulty}]" if r.difficulty else "")
             )
 
     @game.command()
@@ -254,3 +440,134 @@ def _register_cli(app):
         db.session.add(row)
         db.session.commit()
         click.echo(f"Added round {round_num} for {target}: {title_name}")
+
+    # --- SameCast Daily commands ---
+
+    @app.cli.group()
+    def daily():
+        """Manage SameCast Daily pairs."""
+
+    @daily.command("seed")
+    @click.option("--days", default=7, help="Number of days to generate ahead.")
+    def seed_daily(days):
+        """Generate pairs and their answers for the next N days (default 7)."""
+        from app.models import DailyPair
+        from app.services.daily import generate_daily
+
+        today = date.today()
+        created = 0
+        for i in range(days):
+            target = today + timedelta(days=i)
+            existing = DailyPair.query.filter_by(puzzle_date=target).first()
+            if existing:
+                click.echo(f"  {target}  — already set: {existing.title_1_name} & {existing.title_2_name}, skipping.")
+                continue
+            try:
+                pair = generate_daily(target)
+                created += 1
+                click.echo(f"  {target}  — {pair.title_1_name} & {pair.title_2_name} "
+                           f"({len(pair.answers)} shared, {len(pair.decoys)} decoys).")
+            except ValueError as e:
+                click.echo(f"  {target}  — ERROR: {e}")
+        click.echo(f"\nDone. Created pairs for {created} day(s).")
+
+    @daily.command("list")
+    def list_daily():
+        """List upcoming pairs."""
+        from app.models import DailyPair
+
+        rows = DailyPair.query.filter(DailyPair.puzzle_date >= date.today()).order_by(DailyPair.puzzle_date).all()
+        if not rows:
+            click.echo("No upcoming pairs. Run 'flask daily seed' to generate some.")
+            return
+        for p in rows:
+            names = ", ".join(a["name"] for a in p.answers[:5]) + (", …" if len(p.answers) > 5 else "")
+            click.echo(f"  {p.puzzle_date}: {p.title_1_name} & {p.title_2_name} — {names}")
+
+    # --- WhoAmI commands ---
+
+    @app.cli.group()
+    def whoami():
+        """Manage WhoAmI daily puzzles."""
+
+    @whoami.command("seed")
+    @click.option("--days", default=30, help="Number of days to generate ahead.")
+    def seed_whoami(days):
+        """Generate puzzles for the next N days (default 30) from one filmography index."""
+        from app.services.whoami import generate_puzzles
+
+        try:
+            puzzles, seconds = generate_puzzles(date.today(), days)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for p in puzzles:
+            click.echo(f"  {p.puzzle_date}  — {p.person_name} ({len(p.clues)} clues)")
+        click.echo(f"\nDone. Created {len(puzzles)} puzzle(s) in {seconds:.1f}s.")
+
+    @whoami.command("list")
+    @click.option("--clues", "show_clues", is_flag=True, help="Show each puzzle's clues.")
+    def list_whoami(show_clues):
+        """List upcoming puzzles."""
+        from app.models import WhoAmIPuzzle
+
+        rows = (WhoAmIPuzzle.query.filter(WhoAmIPuzzle.puzzle_date >= date.today())
+                .order_by(WhoAmIPuzzle.puzzle_date).all())
+        if not rows:
+            click.echo("No upcoming puzzles. Run 'flask whoami seed' to generate some.")
+            return
+        for p in rows:
+            click.echo(f"  {p.puzzle_date}: {p.person_name}")
+            if show_clues:
+                for clue in p.clues:
+                    click.echo(f"      {clue['text']}  [{clue['remaining']:,} left]")
+
+    @app.cli.group()
+    def compare():
+        """Compare titles in bulk."""
+
+    @compare.command("batch")
+    @click.argument("pairs_file", type=click.File("r"))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv", help="Output format.")
+    @click.option("--output", type=click.File("w"), default="-", help="Write results here (default: stdout).")
+    @click.option("--fetch", is_flag=True, help="Fetch titles that aren't cached from TMDB instead of skipping them.")
+    def compare_batch(pairs_file, fmt, output, fetch):
+        """Count shared cast and crew for every pair in PAIRS_FILE
+        (CSV: title_id_1,media_type_1,title_id_2,media_type_2; '-' for stdin)."""
+        import time
+
+        from app.services.batch_compare import compare_pairs, format_rows, read_pairs
+
+        try:
+            pairs = read_pairs(pairs_file)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        start = time.perf_counter()
+        for text in format_rows(compare_pairs(pairs, fetch=fetch), fmt):
+            output.write(text)
+        output.flush()
+        seconds = time.perf_counter() - start
+        click.echo(f"Compared {len(pairs)} pair(s) in {seconds:.2f}s "
+                   f"({len(pairs) / max(seconds, 1e-9):,.0f}/s).", err=True)
+
+    @app.cli.group()
+    def assets():
+        """Build-time processing of static assets."""
+
+    @assets.command("compress")
+    def compress_assets():
+        """Write .br and .gz variants next to each static text asset (run at build, after changing assets)."""
+        from app.services.compression import encodings, precompress, static_assets
+
+        count = raw = 0
+        best = {}
+        for path in static_assets(app.static_folder, skip=[app.config["IMAGE_CACHE_DIR"]]):
+            sizes = precompress(path)
+            size = os.path.getsize(path)
+            count += 1
+            raw += size
+            for encoding in encodings():
+                best[encoding] = best.get(encoding, 0) + sizes.get(encoding, size)
+            click.echo(f"  {os.path.relpath(path, app.static_folder)}: {size:,} B"
+                       + "".join(f", {e} {n:,} B" for e, n in sizes.items()))
+        summary = ", ".join(f"{e} {n:,} B" for e, n in best.items())
+        click.echo(f"Compressed {count} asset(s): {raw:,} B raw, {summary}.")
@@ -4,10 +4,97 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def normalize_database_url(url):
+    """Point postgres:// and postgresql:// URLs (as Render and Heroku hand them out) at psycopg 3."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def _engine_options(url):
+    if url.startswith("sqlite"):
+        return {}
+    # Per worker process: pool_size + max_overflow connections at most.
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
-    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///samecast.db")
+    SQLALCHEMY_DATABASE_URI = normalize_database_url(os.environ.get("DATABASE_URL", "sqlite:///samecast.db"))
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite connection pragmas (applied to every new connection, see app/engine.py)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+
     TMDB_API_KEY = os.environ.get("TMDB_API_KEY")
-    TMDB_BASE_URL = "https://api.themoviedb.org/3"
-    TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p"
+    TMDB_BASE_URL = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+    TMDB_IMAGE_BASE_URL = os.environ.get("TMDB_IMAGE_BASE_URL", "https://image.tmdb.org/t/p")
+    IMAGE_CACHE_DIR = os.environ.get(
+        "IMAGE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "static", "images")
+    )
+
+    # Compiled credit snapshot (flask cache compile); defaults to instance/credits.snap
+    CREDIT_SNAPSHOT_PATH = os.environ.get("CREDIT_SNAPSHOT_PATH")
+
+    # Rendered comparison HTML (per worker), with an optional shared on-disk tier
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    FRAGMENT_CACHE_DIR = os.environ.get("FRAGMENT_CACHE_DIR")
+    FRAGMENT_CACHE_DISK_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+    # Rewritten by `flask suggestions` so workers on this host re-render the homepage at once
+    # (default: instance/suggestions.version); other hosts see changes within SUGGESTIONS_DB_CHECK_SECONDS
+    SUGGESTIONS_VERSION_PATH = os.environ.get("SUGGESTIONS_VERSION_PATH")
+    SUGGESTIONS_DB_CHECK_SECONDS = float(os.environ.get("SUGGESTIONS_DB_CHECK_SECONDS", "30"))
+    # Dynamic responses smaller than this go out uncompressed
+    COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+    # Autocomplete dropdowns: server-side reuse window and the public Cache-Control max-age
+    AUTOCOMPLETE_CACHE_SECONDS = int(os.environ.get("AUTOCOMPLETE_CACHE_SECONDS", "300"))
+
+    # /metrics — per-worker snapshots merged at scrape time (default: instance/metrics)
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # POST /compare/batch is disabled unless this is set (Authorization: Bearer <token>)
+    BATCH_COMPARE_TOKEN = os.environ.get("BATCH_COMPARE_TOKEN")
+    BATCH_COMPARE_MAX_PAIRS = int(os.environ.get("BATCH_COMPARE_MAX_PAIRS", "100000"))
+
+    # Sampling profiler for /compare, /oddoneout and /search/autocomplete (default: instance/profiles)
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR")
+    PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+
+    # Upstream HTTP connection pool (shared per worker process)
+    HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "100"))
+
+    # TMDB circuit breaker (per worker): open after N consecutive failures, probe again after M seconds
+    TMDB_BREAKER_FAILURES = int(os.environ.get("TMDB_BREAKER_FAILURES", "5"))
+    TMDB_BREAKER_RESET_SECONDS = float(os.environ.get("TMDB_BREAKER_RESET_SECONDS", "30"))
+    # How long a failed title lookup is answered from memory: TMDB 404s, then timeouts/5xx
+    NEGATIVE_CACHE_NOT_FOUND_SECONDS = float(os.environ.get("NEGATIVE_CACHE_NOT_FOUND_SECONDS", "600"))
+    NEGATIVE_CACHE_ERROR_SECONDS = float(os.environ.get("NEGATIVE_CACHE_ERROR_SECONDS", "30"))
+
+    # Every request's TMDB calls must finish within this many seconds of it starting (0: no deadline)
+    REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "8"))
+    # Re-fetching a cached title due for a refresh gives up after this and serves the cached copy
+    STALE_REFRESH_BUDGET_SECONDS = float(os.environ.get("STALE_REFRESH_BUDGET_SECONDS", "2"))
+
+    # TV aggregate_credits bodies are buffered in memory up to this size, then on disk, while streamed
+    STREAM_SPOOL_BYTES = int(os.environ.get("STREAM_SPOOL_BYTES", str(1024 * 1024)))
+
+    # Background refresh worker (flask cache refresh-worker)
+    REFRESH_MIN_AGE_HOURS = float(os.environ.get("REFRESH_MIN_AGE_HOURS", "168"))  # never re-fetch sooner
+    REFRESH_REQUESTS_PER_MINUTE = float(os.environ.get("REFRESH_REQUESTS_PER_MINUTE", "30"))
+    REFRESH_BATCH_SIZE = int(os.environ.get("REFRESH_BATCH_SIZE", "20"))
+    REFRESH_IDLE_SECONDS = float(os.environ.get("REFRESH_IDLE_SECONDS", "300"))
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from sqlalchemy import event
+
+from app import db
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines — fall back to SQLite's busy handler alone
+    fcntl = None
+
+_write_lock = threading.RLock()
+_local = threading.local()
+_lock_path = None
+_serialize_writes = False
+
+
+def init_engine(app):
+    """Attach SQLite tuning hooks to the app's engine.
+
+    Every new connection gets WAL journaling, a busy timeout and the cache/mmap
+    sizes from config. Transactions are started by SQLAlchemy rather than the
+    sqlite3 driver so that write_transaction() can take the write lock up front
+    with BEGIN IMMEDIATE instead of failing on a read-to-write upgrade.
+
+    Postgres needs none of this: pooling comes from SQLALCHEMY_ENGINE_OPTIONS
+    and concurrent writers are left to row locks.
+    """
+    global _lock_path, _serialize_writes
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+    _serialize_writes = True
+
+    database = engine.url.database
+    if database and database != ":memory:" and fcntl is not None:
+        _lock_path = f"{database}-writelock"
+
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if getattr(_local, "immediate", False) else "BEGIN")
+
+
+@contextmanager
+def _process_lock():
+    """Queue writers across worker processes on a lock file next to the DB.
+
+    SQLite's busy handler retries with growing sleeps, so under sustained
+    contention one worker can starve past busy_timeout. Polling a flock with a
+    short sleep keeps the hand-off tight and stays cooperative under gevent.
+    """
+    if _lock_path is None:
+        yield
+        return
+    fd = os.open(_lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                time.sleep(0.002)
+        yield
+    finally:
+        os.close(fd)  # releases the flock
+
+
+@contextmanager
+def write_transaction():
+    """Run a block of session writes as one serialized transaction.
+
+    On SQLite, writers in this process queue on a lock, writers in other
+    gunicorn workers on a lock file, and SQLite's own write lock is taken up
+    front with BEGIN IMMEDIATE. On Postgres it is a plain transaction.
+    Commits on success, rolls back on error.
+    """
+    if getattr(_local, "immediate", False):
+        # Nested call — already inside the outer write transaction.
+        yield db.session
+        return
+    with _write_lock if _serialize_writes else nullcontext():
+        # End any open read snapshot so the next BEGIN is the immediate one.
+        db.session.commit()
+        with _process_lock():
+            _local.immediate = True
+            try:
+                yield db.session
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                _local.immediate = False
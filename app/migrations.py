@@ -0,0 +1,305 @@
+"""Versioned schema migrations, run once per deploy instead of on every worker boot.
+
+`flask --app wsgi db upgrade` applies each pending migration in its own write
+transaction and records it in `schema_version`; create_app() never touches
+DDL, so gunicorn workers boot (and recycle) without taking a write lock.
+
+Migrations are append-only: never edit one that has shipped, add a new one.
+Migration 1 creates the baseline tables from the models, so an empty database
+and one that predates this module both end up at the same version.
+
+`flask --app wsgi db explain` runs the hot read queries through the
+database's planner and fails if any of them stops using an index.
+"""
+import json
+from datetime import date, datetime, timezone
+
+import sqlalchemy as sa
+from sqlalchemy import func, select, text
+
+from app import db
+from app.engine import write_transaction
+
+MIGRATIONS = []
+
+_versions = sa.Table(
+    "schema_version",
+    sa.MetaData(),
+    sa.Column("version", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("description", sa.String(200), nullable=False),
+    sa.Column("applied_at", sa.DateTime, nullable=False),
+)
+
+
+def migration(version, description):
+    """Register `fn(session)` as schema migration `version`."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _add_column(session, table_name, column_name):
+    """ALTER TABLE ... ADD COLUMN for a column declared on the models, if it's missing."""
+    conn = session.connection()
+    if column_name in {c["name"] for c in sa.inspect(conn).get_columns(table_name)}:
+        return
+    column_type = db.metadata.tables[table_name].c[column_name].type.compile(dialect=conn.dialect)
+    session.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+
+
+def _create_index(session, table_name, index_name):
+    """Create one index declared on the models, if it doesn't exist yet."""
+    table = db.metadata.tables[table_name]
+    index = next(i for i in table.indexes if i.name == index_name)
+    index.create(session.connection(), checkfirst=True)
+
+
+@migration(1, "baseline tables")
+def _baseline(session):
+    from app import models  # noqa: F401
+
+    names = ("titles", "persons", "credits", "suggestions", "oddoneout_rounds")
+    db.metadata.create_all(session.connection(), tables=[db.metadata.tables[n] for n in names])
+
+
+@migration(2, "covering indexes for credit lookups by title and by person")
+def _covering_credit_indexes(session):
+    _create_index(session, "credits", "ix_credit_title_type_order")
+    _create_index(session, "credits", "ix_credit_person_type_title")
+    # (person_id) is a prefix of ix_credit_person_type_title.
+    session.execute(text("DROP INDEX IF EXISTS ix_credit_person"))
+
+
+@migration(3, "title_stats for puzzle candidate lookups")
+def _title_stats(session):
+    from app.services.title_stats import rebuild
+
+    db.metadata.tables["title_stats"].create(session.connection(), checkfirst=True)
+    rebuild(session)
+
+
+@migration(4, "costar_scores and per-round difficulty")
+def _costar_scores(session):
+    db.metadata.tables["costar_scores"].create(session.connection(), checkfirst=True)
+    _add_column(session, "oddoneout_rounds", "difficulty")
+
+
+@migration(5, "daily_pairs for SameCast Daily")
+def _daily_pairs(session):
+    db.metadata.tables["daily_pairs"].create(session.connection(), checkfirst=True)
+
+
+@migration(6, "whoami_puzzles")
+def _whoami_puzzles(session):
+    db.metadata.tables["whoami_puzzles"].create(session.connection(), checkfirst=True)
+
+
+@migration(7, "titles.credits_hash for conditional refreshes")
+def _credits_hash(session):
+    _add_column(session, "titles", "credits_hash")
+
+
+@migration(8, "indexes for the background refresh worker")
+def _refresh_indexes(session):
+    _create_index(session, "titles", "ix_titles_cached_at")
+    _create_index(session, "title_stats", "ix_title_stats_popularity")
+
+
+@migration(9, "similar_titles for most connected titles")
+def _similar_titles(session):
+    db.metadata.tables["similar_titles"].create(session.connection(), checkfirst=True)
+
+
+@migration(10, "title_stats.sample_key for indexed puzzle candidate sampling")
+def _title_stats_sample_key(session):
+    _add_column(session, "title_stats", "sample_key")
+    # Rows inserted from now on get random.random() from the model; backfill the rest in SQL.
+    uniform = "random()" if session.get_bind().dialect.name == "postgresql" else "random() / 18446744073709551616.0 + 0.5"
+    session.execute(text(f"UPDATE title_stats SET sample_key = {uniform} WHERE sample_key IS NULL"))
+    _create_index(session, "title_stats", "ix_title_stats_sample_key")
+
+
+def current_version():
+    """Highest applied migration, or 0 for an empty/unversioned database."""
+    if not sa.inspect(db.engine).has_table("schema_version"):
+        return 0
+    return db.session.execute(select(func.max(_versions.c.version))).scalar() or 0
+
+
+def pending():
+    """Migrations not yet applied, in order."""
+    version = current_version()
+    return [m for m in sorted(MIGRATIONS, key=lambda m: m[0]) if m[0] > version]
+
+
+def upgrade():
+    """Apply pending migrations. Returns the list of (version, description) applied."""
+    _versions.create(db.engine, checkfirst=True)
+    applied = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        with write_transaction() as session:
+            if session.get_bind().dialect.name == "postgresql":
+                # Serialize concurrent deploys; released at commit.
+                session.execute(text("SELECT pg_advisory_xact_lock(hashtext('samecast_schema'))"))
+            done = session.execute(
+                select(_versions.c.version).where(_versions.c.version == version)
+            ).first()
+            if done:
+                continue
+            fn(session)
+            session.execute(_versions.insert().values(
+                version=version, description=description,
+                applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            ))
+        applied.append((version, description))
+    return applied
+
+
+# --- Query plan checks ---
+
+def hot_queries():
+    """The read queries on request and puzzle paths, each with the tables that
+    must be reached through an index and whether an explicit sort is allowed.
+
+    These mirror the queries in app/services and app/routes; update both together.
+    """
+    from app.models import (CostarScore, Credit, DailyPair, OddOneOutRound, SimilarTitle, Title, TitleStat,
+                            WhoAmIPuzzle)
+
+    from app.services.puzzle import CANDIDATE_COLUMNS, CANDIDATE_SAMPLE, MIN_CAST
+    from app.services.refresher import due_queries
+    from app.services.title_stats import sample_query
+
+    title_id, person_id, today = 1, 1, date.today()
+    stalest, hottest = due_queries(datetime.now(timezone.utc).replace(tzinfo=None), 80)
+    return [
+        ("puzzle candidate titles",
+         sample_query(CANDIDATE_COLUMNS, MIN_CAST, 0.5, CANDIDATE_SAMPLE),
+         {"title_stats", "titles"}, False),
+        ("puzzle candidate titles (wrapped)",
+         sample_query(CANDIDATE_COLUMNS, MIN_CAST, 0.5, CANDIDATE_SAMPLE, before=True),
+         {"title_stats", "titles"}, False),
+        ("round cast by billing",
+         select(Credit)
+         .where(Credit.title_id == title_id, Credit.credit_type == "cast")
+         .order_by(Credit.display_order.asc())
+         .limit(15),
+         {"credits"}, False),
+        ("title cast ids",
+         select(Credit.person_id).where(Credit.title_id == title_id, Credit.credit_type == "cast"),
+         {"credits"}, True),
+        ("title credits",
+         select(Credit.credit_type, Credit.person_id, Credit.character, Credit.job)
+         .where(Credit.title_id == title_id),
+         {"credits"}, True),
+        ("person filmography",
+         select(Credit.title_id, Credit.credit_type).where(Credit.person_id == person_id),
+         {"credits"}, True),
+        ("daily rounds",
+         select(OddOneOutRound)
+         .where(OddOneOutRound.puzzle_date == today)
+         .order_by(OddOneOutRound.round_number),
+         {"oddoneout_rounds"}, False),
+        ("insider co-stars",
+         select(CostarScore.costar_id, CostarScore.shared_titles)
+         .where(CostarScore.person_id.in_([person_id, person_id + 1, person_id + 2])),
+         {"costar_scores"}, True),
+        ("round lookup",
+         select(OddOneOutRound)
+         .where(OddOneOutRound.puzzle_date == today, OddOneOutRound.round_number == 1),
+         {"oddoneout_rounds"}, True),
+        ("daily pair partners",
+         select(Title.id, Title.media_type)
+         .join(Credit, Credit.title_id == Title.id)
+         .where(Credit.person_id.in_([person_id, person_id + 1, person_id + 2]), Credit.credit_type == "cast",
+                Credit.title_id != title_id, Title.credits_cached == True)  # noqa: E712
+         .group_by(Title.id, Title.media_type)
+         .having(func.count(func.distinct(Credit.person_id)) >= 3),
+         {"credits", "titles"}, True),
+        ("daily pair lookup",
+         select(DailyPair.id).where(DailyPair.puzzle_date == today),
+         {"daily_pairs"}, True),
+        ("whoami puzzle lookup",
+         select(WhoAmIPuzzle).where(WhoAmIPuzzle.puzzle_date == today),
+         {"whoami_puzzles"}, True),
+        ("similar titles",
+         select(SimilarTitle, Title)
+         .join(Title, Title.id == SimilarTitle.similar_id)
+         .where(SimilarTitle.title_id == title_id)
+         .order_by(SimilarTitle.shared_total.desc(), SimilarTitle.similar_id)
+         .limit(20),
+         {"similar_titles", "titles"}, True),
+        ("refresh stalest titles", stalest, {"titles"}, False),
+        ("refresh hottest titles", hottest, {"titles", "title_stats"}, True),
+    ]
+
+
+def explain(stmt):
+    """Return the planner output for `stmt` as a list of lines (SQLite) or a JSON plan (Postgres).
+
+    Raises ValueError for any other database.
+    """
+    session = db.session
+    dialect = session.get_bind().dialect
+    sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if dialect.name == "sqlite":
+        return [row[3] for row in session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    if dialect.name == "postgresql":
+        # Tiny or freshly loaded tables make a seq scan the cheapest plan;
+        # the question here is whether an index *can* serve the query.
+        session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        return plan if isinstance(plan, list) else json.loads(plan)
+    raise ValueError(f"No query plan check for {dialect.name}; only SQLite and Postgres are supported.")
+
+
+def _plan_problems(plan, indexed_tables, sort_ok):
+    problems = []
+    if isinstance(plan[0], str):  # SQLite: "SEARCH credits USING COVERING INDEX ..."
+        for table in indexed_tables:
+            if not any(line.startswith(f"SEARCH {table} ") for line in plan):
+                problems.append(f"{table} not searched by index")
+        if not sort_ok and any("TEMP B-TREE FOR ORDER BY" in line for line in plan):
+            problems.append("sorts instead of reading the index in order")
+        return problems
+
+    nodes, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.get("Plans", []))
+    for table in indexed_tables:
+        scans = [n["Node Type"] for n in nodes if n.get("Relation Name") == table]
+        if not scans or any(s == "Seq Scan" for s in scans):
+            problems.append(f"{table} not searched by index")
+    if not sort_ok and any(n["Node Type"] in ("Sort", "Incremental Sort") for n in nodes):
+        problems.append("sorts instead of reading the index in order")
+    return problems
+
+
+def format_plan(plan):
+    """One line per plan step: SQLite's detail strings, or an indented Postgres node tree."""
+    if isinstance(plan[0], str):
+        return list(plan)
+    lines, stack = [], [(plan[0]["Plan"], 0)]
+    while stack:
+        node, depth = stack.pop()
+        line = "  " * depth + node["Node Type"]
+        if "Relation Name" in node:
+            line += f" on {node['Relation Name']}"
+        if "Index Name" in node:
+            line += f" using {node['Index Name']}"
+        lines.append(line)
+        stack.extend((child, depth + 1) for child in reversed(node.get("Plans", [])))
+    return lines
+
+
+def check_query_plans():
+    """EXPLAIN every hot query. Returns [(name, problems, plan)]; empty problems means OK."""
+    results = []
+    for name, stmt, indexed_tables, sort_ok in hot_queries():
+        plan = explain(stmt)
+        db.session.rollback()  # drop SET LOCAL between queries
+        results.append((name, _plan_problems(plan, indexed_tables, sort_ok), plan))
+    return results
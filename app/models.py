@@ -1,4 +1,7 @@
+import random
 from datetime import datetime, timezone
+from hashlib import blake2b
+
 from app import db
 
 
@@ -14,9 +17,25 @@ class Title(db.Model):
     poster_cached = db.Column(db.Boolean, default=False)
     credits_cached = db.Column(db.Boolean, default=False)
     cached_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Fingerprint of the normalized cast and crew last saved (cache.CreditsFingerprint).
+    credits_hash = db.Column(db.String(32))
 
     credits = db.relationship("Credit", back_populates="title", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # The refresh worker walks cached titles oldest first.
+        db.Index("ix_titles_cached_at", "cached_at"),
+    )
+
+    @property
+    def content_version(self):
+        """Short hash that changes when anything a comparison shows for this title
+        does: its credits (credits_hash) or its display fields. Rows saved before
+        credits_hash existed use cached_at instead."""
+        key = (self.credits_hash or self.cached_at.isoformat(), self.media_type, self.title,
+               self.release_year, self.overview, self.poster_path)
+        return blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
     def __repr__(self):
         return f"<Title {self.id}: {self.title} ({self.media_type})>"
 
@@ -52,15 +71,80 @@ class Credit(db.Model):
     title = db.relationship("Title", back_populates="credits")
     person = db.relationship("Person", back_populates="credits")
 
+    # Schema changes here need a migration in app/migrations.py.
     __table_args__ = (
         db.Index("ix_credit_title_person", "title_id", "person_id"),
-        db.Index("ix_credit_person", "person_id"),
+        # Cast by billing for a title (puzzle rounds); covers the person IDs.
+        db.Index("ix_credit_title_type_order", "title_id", "credit_type", "display_order", "person_id"),
+        # A person's filmography without touching the table.
+        db.Index("ix_credit_person_type_title", "person_id", "credit_type", "title_id"),
     )
 
     def __repr__(self):
         return f"<Credit {self.person_id} in {self.title_id} ({self.credit_type})>"
 
 
+class TitleStat(db.Model):
+    """Per-title credit counts, kept in step with the credits by _save_to_db()."""
+
+    __tablename__ = "title_stats"
+
+    title_id = db.Column(db.Integer, db.ForeignKey("titles.id"), primary_key=True, autoincrement=False)
+    cast_count = db.Column(db.Integer, nullable=False, default=0)
+    crew_count = db.Column(db.Integer, nullable=False, default=0)
+    top_cast_ids = db.Column(db.JSON)  # up to 10 person IDs in billing order
+    popularity = db.Column(db.Float)  # TMDB popularity when last fetched
+    difficulty = db.Column(db.Float)  # 0.0 (blockbuster) .. 1.0 (obscure); None if unknown
+    sample_key = db.Column(db.Float, default=random.random)  # fixed at insert; see title_stats.sample_titles()
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # Daily pair candidates: cast_count >= N, read from the index alone.
+        db.Index("ix_title_stats_cast_count", "cast_count", "title_id"),
+        # Puzzle candidates: a window of rows from a random point in sample_key order.
+        db.Index("ix_title_stats_sample_key", "sample_key"),
+        # The refresh worker's most popular titles first.
+        db.Index("ix_title_stats_popularity", "popularity", "title_id"),
+    )
+
+    def __repr__(self):
+        return f"<TitleStat {self.title_id}: {self.cast_count} cast, {self.crew_count} crew>"
+
+
+class CostarScore(db.Model):
+    """How many titles two people were both top-billed in; rebuilt by `flask game costars`.
+
+    Only each person's strongest co-stars are kept (see app/services/costars.py).
+    """
+
+    __tablename__ = "costar_scores"
+
+    person_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    costar_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    shared_titles = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<CostarScore {self.person_id}~{self.costar_id}: {self.shared_titles}>"
+
+
+class SimilarTitle(db.Model):
+    """One of a title's most connected titles by shared cast and crew; rebuilt by `flask cache similar`.
+
+    Only each title's TOP_K biggest overlaps are kept (see app/services/similar.py).
+    """
+
+    __tablename__ = "similar_titles"
+
+    title_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    similar_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    shared_cast = db.Column(db.Integer, nullable=False)
+    shared_crew = db.Column(db.Integer, nullable=False)  # not counting people already in shared_cast
+    shared_total = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<SimilarTitle {self.title_id}~{self.similar_id}: {self.shared_total}>"
+
+
 class Suggestion(db.Model):
     __tablename__ = "suggestions"
 
@@ -97,6 +181,7 @@ class OddOneOutRound(db.Model):
     actor_2_profile = db.Column(db.String(200))
     actor_3_profile = db.Column(db.String(200))
     outsider_profile = db.Column(db.String(200))
+    difficulty = db.Column(db.String(10))  # "easy" | "medium" | "hard"; tier actually achieved
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
     __table_args__ = (
@@ -105,3 +190,48 @@ class OddOneOutRound(db.Model):
 
     def __repr__(self):
         return f"<OddOneOutRound {self.puzzle_date} R{self.round_number}>"
+
+
+class DailyPair(db.Model):
+    """One SameCast Daily puzzle: two titles and their precomputed shared people."""
+
+    __tablename__ = "daily_pairs"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    puzzle_date = db.Column(db.Date, nullable=False, unique=True)
+    title_1_id = db.Column(db.Integer, nullable=False)
+    title_1_type = db.Column(db.String(10), nullable=False)
+    title_1_name = db.Column(db.String(500), nullable=False)
+    title_1_year = db.Column(db.Integer)
+    title_1_poster = db.Column(db.String(200))
+    title_2_id = db.Column(db.Integer, nullable=False)
+    title_2_type = db.Column(db.String(10), nullable=False)
+    title_2_name = db.Column(db.String(500), nullable=False)
+    title_2_year = db.Column(db.Integer)
+    title_2_poster = db.Column(db.String(200))
+    # [{person_id, name, profile_path, role_1, role_2}], cast in billing order, then crew
+    answers = db.Column(db.JSON, nullable=False)
+    # [{person_id, name, title: 1 | 2}] — people in only one of the titles, for "just one" feedback
+    decoys = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<DailyPair {self.puzzle_date}: {self.title_1_name} & {self.title_2_name}>"
+
+
+class WhoAmIPuzzle(db.Model):
+    """One WhoAmI puzzle: a person and the clues, vaguest first, that single them out."""
+
+    __tablename__ = "whoami_puzzles"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    puzzle_date = db.Column(db.Date, nullable=False, unique=True)
+    person_id = db.Column(db.Integer, nullable=False)
+    person_name = db.Column(db.String(300), nullable=False)
+    profile_path = db.Column(db.String(200))
+    # [{kind: "years" | "costar" | "title", text, remaining}] — remaining = candidates left after the clue
+    clues = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<WhoAmIPuzzle {self.puzzle_date}: {self.person_name}>"
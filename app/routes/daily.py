@@ -0,0 +1,67 @@
+from datetime import date
+
+from flask import Blueprint, render_template, request
+
+from app.models import DailyPair
+from app.services.daily import MAX_GUESSES, get_or_generate_daily, guess_index
+from app.services.puzzle import puzzle_number
+
+daily_bp = Blueprint("daily", __name__, template_folder="../templates")
+
+
+def _puzzle_date():
+    try:
+        return date.fromisoformat(request.values.get("puzzle_date", ""))
+    except ValueError:
+        return None
+
+
+@daily_bp.route("/")
+def index():
+    """Serve today's SameCast Daily pair."""
+    try:
+        pair = get_or_generate_daily()
+    except ValueError as e:
+        return render_template("partials/error.html", message=str(e)), 500
+
+    return render_template(
+        "daily.html",
+        pair=pair,
+        answer_count=len(pair.answers),
+        max_guesses=MAX_GUESSES,
+        puzzle_num=puzzle_number(pair.puzzle_date),
+        puzzle_date=pair.puzzle_date.isoformat(),
+    )
+
+
+@daily_bp.route("/guess", methods=["POST"])
+def guess():
+    """Check one guess against the day's precomputed answers."""
+    puzzle_date = _puzzle_date()
+    text = request.form.get("guess", "").strip()
+    if not puzzle_date or not text:
+        return render_template("partials/error.html", message="Missing parameters."), 400
+
+    index = guess_index(puzzle_date)
+    if index is None:
+        return render_template("partials/error.html", message="Puzzle not found."), 404
+
+    match = index.match(text)
+    person, verdict = match if match else (None, None)
+    return render_template(
+        "partials/daily_result.html",
+        guess=text,
+        person=person,
+        verdict=verdict,
+        only_in=index.titles.get(verdict),
+    )
+
+
+@daily_bp.route("/answers")
+def answers():
+    """Reveal the full answer set once the player is out of guesses."""
+    puzzle_date = _puzzle_date()
+    pair = DailyPair.query.filter_by(puzzle_date=puzzle_date).first() if puzzle_date else None
+    if not pair:
+        return render_template("partials/error.html", message="Puzzle not found."), 404
+    return render_template("partials/daily_answers.html", pair=pair)
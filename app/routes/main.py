@@ -1,27 +1,38 @@
-import json
+import hmac
 
-from flask import Blueprint, Response, render_template, request
+from flask import Blueprint, Response, abort, current_app, render_template, request, stream_with_context
+
+from app.services.upstream import TitleNotFound, UpstreamUnavailable
 
-from app.models import Suggestion
-from app.services.comparison import find_shared
 
 main_bp = Blueprint("main", __name__)
 
+UNAVAILABLE_MESSAGE = "Our movie database is having trouble right now. Please try again shortly."
+
 SITEMAP_XML = """<?xml version="1.0" encoding="UTF-8"?>
 <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
   <url><loc>https://samecast.com/</loc><changefreq>weekly</changefreq><priority>1.0</priority></url>
   <url><loc>https://samecast.com/oddoneout</loc><changefreq>daily</changefreq><priority>0.9</priority></url>
+  <url><loc>https://samecast.com/daily</loc><changefreq>daily</changefreq><priority>0.9</priority></url>
 </urlset>"""
 
 ROBOTS_TXT = """User-agent: *
 Allow: /
 Disallow: /search/
 Disallow: /images/
+Disallow: /metrics
 
 Sitemap: https://samecast.com/sitemap.xml
 """
 
 
+@main_bp.app_errorhandler(UpstreamUnavailable)
+def unavailable(e):
+    """TMDB is failing (circuit breaker open, or this lookup failed moments ago): fail fast with a 503."""
+    headers = {"Retry-After": str(max(1, round(e.retry_after)))} if e.retry_after is not None else {}
+    return render_template("partials/error.html", message=UNAVAILABLE_MESSAGE), 503, headers
+
+
 @main_bp.route("/sitemap.xml")
 def sitemap():
     return Response(SITEMAP_XML, mimetype="application/xml")
@@ -34,9 +45,13 @@ def robots():
 
 @main_bp.route("/")
 def index():
-    rows = Suggestion.query.filter_by(active=True).all()
-    suggestions_json = json.dumps([s.to_dict() for s in rows])
-    return render_template("index.html", suggestions_json=suggestions_json)
+    from app.services.suggestions import homepage
+
+    html, etag = homepage()
+    response = Response(html, mimetype="text/html")
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # always revalidate; a 304 when suggestions haven't changed
+    return response.make_conditional(request)
 
 
 @main_bp.route("/compare")
@@ -49,17 +64,79 @@ def compare():
     if not all([title_id_1, media_type_1, title_id_2, media_type_2]):
         return render_template("partials/error.html", message="Please select two titles to compare.")
 
+    if media_type_1 not in ("movie", "tv") or media_type_2 not in ("movie", "tv"):
+        return render_template("partials/error.html", message="Invalid media type.")
+
     if title_id_1 == title_id_2 and media_type_1 == media_type_2:
         return render_template("partials/error.html", message="Please pick two different titles!")
 
+    from app.services.comparison import find_shared
+    from app.services.fragments import comparison_key, get_cache
+
     try:
+        key = comparison_key("partial", title_id_1, media_type_1, title_id_2, media_type_2)
+        html = get_cache("comparison").get(key) if key else None
+        if html is not None:
+            return html
         result = find_shared(title_id_1, media_type_1, title_id_2, media_type_2)
+    except TitleNotFound:
+        return render_template("partials/error.html", message="We couldn't find one of those titles.")
+    except UpstreamUnavailable:
+        return render_template("partials/error.html", message=UNAVAILABLE_MESSAGE)
     except Exception:
         return render_template("partials/error.html",
                                message="Something went wrong fetching data. Please try again.")
 
-    result["permalink"] = f"https://samecast.com/compare/{title_id_1}-{media_type_1}/{title_id_2}-{media_type_2}"
-    return render_template("partials/comparison.html", **result)
+    result["permalink"] = f"https://samecast.com/compare/{int(title_id_1)}-{media_type_1}/{int(title_id_2)}-{media_type_2}"
+    html = render_template("partials/comparison.html", **result)
+    if key:
+        get_cache("comparison").put(key, html)
+    return html
+
+
+@main_bp.route("/similar/<int:title_id>")
+def similar(title_id):
+    """The cached titles sharing the most cast and crew with one title (precomputed)."""
+    from app import db
+    from app.models import Title
+    from app.services.similar import TOP_K, similar_titles
+
+    title = db.session.get(Title, title_id)
+    if title is None:
+        return render_template("partials/error.html", message="That title hasn't been compared yet."), 404
+    limit = max(1, min(request.args.get("limit", TOP_K, type=int), TOP_K))
+    return render_template("partials/similar_titles.html", title=title, similar=similar_titles(title_id, limit))
+
+
+@main_bp.route("/compare/batch", methods=["POST"])
+def compare_batch():
+    """Shared cast/crew counts for many cached pairs, streamed as CSV or JSON lines.
+
+    The body is CSV (title_id_1,media_type_1,title_id_2,media_type_2 per line);
+    ?format=jsonl|csv picks the output. Only cached titles are compared, so a
+    batch never reaches TMDB.
+    """
+    token = current_app.config["BATCH_COMPARE_TOKEN"]
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(403)
+
+    from app.services.batch_compare import compare_pairs, format_rows, read_pairs
+
+    fmt = request.args.get("format", "jsonl")
+    if fmt not in ("csv", "jsonl"):
+        return Response("format must be csv or jsonl\n", status=400, mimetype="text/plain")
+    try:
+        pairs = read_pairs(request.get_data(as_text=True).splitlines())
+    except ValueError as e:
+        return Response(f"{e}\n", status=400, mimetype="text/plain")
+    if len(pairs) > current_app.config["BATCH_COMPARE_MAX_PAIRS"]:
+        return Response(f"at most {current_app.config['BATCH_COMPARE_MAX_PAIRS']} pairs per batch\n",
+                        status=413, mimetype="text/plain")
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(format_rows(compare_pairs(pairs), fmt)), mimetype=mimetype)
 
 
 @main_bp.route("/compare/<int:id1>-<type1>/<int:id2>-<type2>")
@@ -68,10 +145,24 @@ def compare_permalink(id1, type1, id2, type2):
     if type1 not in ("movie", "tv") or type2 not in ("movie", "tv"):
         return render_template("partials/error.html", message="Invalid media type."), 404
 
+    from app.services.comparison import find_shared
+    from app.services.fragments import comparison_key, get_cache
+
     try:
+        key = comparison_key("page", id1, type1, id2, type2)
+        html = get_cache("comparison").get(key) if key else None
+        if html is not None:
+            return html
         result = find_shared(id1, type1, id2, type2)
+    except TitleNotFound:
+        return render_template("partials/error.html", message="We couldn't find one of those titles."), 404
+    except UpstreamUnavailable as e:
+        return unavailable(e)
     except Exception:
         return render_template("partials/error.html",
                                message="Something went wrong fetching data. Please try again."), 500
 
-    return render_template("comparison_page.html", **result)
+    html = render_template("comparison_page.html", **result)
+    if key:
+        get_cache("comparison").put(key, html)
+    return html
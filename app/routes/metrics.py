@@ -0,0 +1,19 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from app.services.metrics import render_prometheus
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint, merged across all gunicorn workers.
+
+    Public unless METRICS_TOKEN is set.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(403)
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -1,20 +1,33 @@
 from flask import Blueprint, render_template, request
 
-from app.services.tmdb import TMDBClient
-
 search_bp = Blueprint("search", __name__)
 
 
 @search_bp.route("/autocomplete")
 def autocomplete():
+    from app.services.autocomplete import MAX_RESULTS, MIN_QUERY_LENGTH, cache_control, cache_key, normalize_query
+    from app.services.fragments import get_cache
+    from app.services.metrics import inc
+
+    # ShortQueryMiddleware normally answers these before they get here.
     query = request.args.get("q", "").strip()
+    normalized = normalize_query(query)
     slot = request.args.get("slot", "1")
-    if len(query) < 2:
+    if len(normalized) < MIN_QUERY_LENGTH:
         return ""
 
-    client = TMDBClient()
-    results = client.search_multi(query)[:8]
-    return render_template("partials/search_results.html", results=results, slot=slot)
+    key = cache_key(normalized, slot)
+    html = get_cache("autocomplete").get(key) if key else None
+    inc("autocomplete_requests_total", result="hit" if html is not None else "miss")
+    if html is None:
+        from app.services.tmdb import TMDBClient
+
+        client = TMDBClient()
+        results = client.search_multi(query)[:MAX_RESULTS]
+        html = render_template("partials/search_results.html", results=results, slot=slot)
+        if key:
+            get_cache("autocomplete").put(key, html)
+    return html, {"Cache-Control": cache_control()}
 
 
 @search_bp.route("/select")
@@ -0,0 +1,77 @@
+"""Caching for /search/autocomplete.
+
+Typing fires a request per pause, and many visitors type the same prefixes.
+Rendered dropdowns are kept in the "autocomplete" FragmentCache, keyed by the
+normalized query, the slot, a hash of the template and the current
+AUTOCOMPLETE_CACHE_SECONDS window. Keys from earlier windows are never asked
+for again and age out of the LRU. Responses carry a matching public
+Cache-Control, so a shared cache in front of the app (Cloudflare) can answer
+repeats without reaching a worker at all.
+
+Queries too short to search are answered by ShortQueryMiddleware before Flask
+builds a request or app context.
+"""
+import re
+import time
+import unicodedata
+from urllib.parse import parse_qs
+
+from flask import current_app
+
+from app.services.metrics import inc
+
+PATH = "/search/autocomplete"
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 8
+SLOTS = ("1", "2")
+TEMPLATES = ("partials/search_results.html",)
+EMPTY_MAX_AGE = 86400  # an empty dropdown never changes
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Case-, width- and spacing-insensitive form of a search query, for cache keys only.
+
+    TMDB is sent the query as typed (stripped): its matching of special-case
+    letters doesn't always agree with NFKC and casefold().
+    """
+    return _whitespace.sub(" ", unicodedata.normalize("NFKC", query)).strip().casefold()
+
+
+def cache_key(query, slot):
+    """Fragment cache key for a normalized query in a slot, or None if it shouldn't be cached."""
+    if slot not in SLOTS:
+        return None
+    from app.services.fragments import template_version  # fragments pulls in cache; the middleware loads at boot
+
+    window = int(time.time() // current_app.config["AUTOCOMPLETE_CACHE_SECONDS"])
+    return "|".join([slot, str(window), template_version(TEMPLATES), query])
+
+
+def cache_control():
+    return f"public, max-age={current_app.config['AUTOCOMPLETE_CACHE_SECONDS']}"
+
+
+class ShortQueryMiddleware:
+    """WSGI middleware: answer autocomplete requests whose query is too short with an empty body.
+
+    htmx fires on every keystroke past its delay, including a cleared box, so
+    these are common; they skip routing, the app context and the metrics hooks.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") == PATH and environ.get("REQUEST_METHOD") in ("GET", "HEAD"):
+            query = parse_qs(environ.get("QUERY_STRING", "")).get("q", [""])[0]
+            if len(normalize_query(query)) < MIN_QUERY_LENGTH:
+                inc("autocomplete_requests_total", result="short")
+                start_response("200 OK", [
+                    ("Content-Type", "text/html; charset=utf-8"),
+                    ("Content-Length", "0"),
+                    ("Cache-Control", f"public, max-age={EMPTY_MAX_AGE}"),
+                ])
+                return [b""]
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,192 @@
+"""Shared-cast counts for many title pairs at once.
+
+`flask compare batch pairs.csv` and POST /compare/batch take a list of pairs,
+load each distinct title's credits once, and count what every pair shares
+the way find_shared() does (shared cast, plus shared crew who aren't also
+shared cast) without materializing any person.
+
+Credits become two sparse title × person incidence matrices, one for cast and
+one for crew. A chunk of pairs (a, b) is then a handful of whole-matrix
+operations: C[a] ∘ C[b] holds each pair's shared cast as a row, so its row
+sums are the counts.
+"""
+import csv
+import io
+import json
+
+import numpy as np
+from sqlalchemy import select
+
+from app import db
+from app.models import Credit, Title
+from app.services.metrics import timed
+
+CHUNK = 5000  # pairs per vectorized step; bounds the gathered matrices' size
+LOAD_BATCH = 5000  # title IDs per credits query
+FIELDS = ("title_id_1", "media_type_1", "title_id_2", "media_type_2", "title_1", "title_2",
+          "shared_cast", "shared_crew", "total_shared", "error")
+
+
+def read_pairs(lines):
+    """Parse CSV lines of title_id_1,media_type_1,title_id_2,media_type_2 (header optional).
+
+    Raises ValueError naming the first malformed line.
+    """
+    pairs = []
+    for n, row in enumerate(csv.reader(lines), 1):
+        if not row or row[0].strip().startswith("#"):
+            continue
+        if n == 1 and row[0].strip() == "title_id_1":
+            continue
+        try:
+            id1, type1, id2, type2 = (v.strip() for v in row[:4])
+            pair = (int(id1), type1, int(id2), type2)
+        except ValueError:
+            raise ValueError(f"line {n}: expected title_id_1,media_type_1,title_id_2,media_type_2") from None
+        if type1 not in ("movie", "tv") or type2 not in ("movie", "tv"):
+            raise ValueError(f"line {n}: media types must be 'movie' or 'tv'")
+        pairs.append(pair)
+    return pairs
+
+
+class IncidenceMatrix:
+    """Cast and crew incidence (title × person, 0/1) for a set of titles."""
+
+    def __init__(self, title_ids, cast, crew):
+        """`cast` and `crew` are (title row, person ID) arrays."""
+        from scipy import sparse  # only batch jobs need it
+
+        self.rows = {title_id: i for i, title_id in enumerate(title_ids)}
+        person_ids, inverse = np.unique(np.concatenate([cast[1], crew[1]]), return_inverse=True)
+        shape = (len(title_ids), len(person_ids))
+
+        def incidence(title_rows, person_cols):
+            m = sparse.csr_matrix((np.ones(len(title_rows), dtype=np.int32), (title_rows, person_cols)), shape=shape)
+            m.sum_duplicates()
+            m.data[:] = 1  # two credits of one kind on a title count once
+            return m
+
+        self.cast = incidence(cast[0], inverse[:len(cast[1])])
+        self.crew = incidence(crew[0], inverse[len(cast[1]):])
+
+    @classmethod
+    def load(cls, titles, fetch=False):
+        """Build the matrix for `titles` ({title_id: media_type}).
+
+        Cached titles are read with one credits query per LOAD_BATCH of them.
+        The rest are fetched from TMDB (and cached) one by one if `fetch` is
+        set, or left out. Returns (matrix, {title_id: name}).
+        """
+        from app.services.cache import get_title_credits
+
+        conn = db.session.connection()
+        cached, names = set(), {}
+        ids = sorted(titles)
+        for start in range(0, len(ids), LOAD_BATCH):
+            for row in conn.execute(
+                select(Title.id, Title.title).where(Title.id.in_(ids[start:start + LOAD_BATCH]),
+                                                    Title.credits_cached == True)  # noqa: E712
+            ):
+                cached.add(row.id)
+                names[row.id] = row.title
+
+        title_ids = sorted(cached)
+        rows = {title_id: i for i, title_id in enumerate(title_ids)}
+        cast_rows, cast_people, crew_rows, crew_people = [], [], [], []
+        for start in range(0, len(title_ids), LOAD_BATCH):
+            result = conn.execution_options(yield_per=50000).execute(
+                select(Credit.title_id, Credit.credit_type, Credit.person_id)
+                .where(Credit.title_id.in_(title_ids[start:start + LOAD_BATCH]))
+            )
+            for batch in result.partitions():
+                for title_id, credit_type, person_id in batch:
+                    if credit_type == "cast":
+                        cast_rows.append(rows[title_id])
+                        cast_people.append(person_id)
+                    else:
+                        crew_rows.append(rows[title_id])
+                        crew_people.append(person_id)
+
+        if fetch:
+            for title_id in ids:
+                if title_id in cached:
+                    continue
+                try:
+                    details, credits = get_title_credits(title_id, titles[title_id])
+                except Exception:
+                    continue  # reported per pair as not available
+                row = rows[title_id] = len(title_ids)
+                title_ids.append(title_id)
+                names[title_id] = details["title"]
+                cast_rows.extend([row] * len(credits.cast_ids))
+                cast_people.extend(credits.cast_ids.tolist())
+                crew_rows.extend([row] * len(credits.crew_ids))
+                crew_people.extend(credits.crew_ids.tolist())
+
+        def arrays(title_rows, people):
+            return np.asarray(title_rows, dtype=np.int64), np.asarray(people, dtype=np.int64)
+
+        return cls(title_ids, arrays(cast_rows, cast_people), arrays(crew_rows, crew_people)), names
+
+    def shared_counts(self, a, b):
+        """(shared cast, shared crew not in shared cast) for title rows a[i] and b[i]."""
+        shared_cast = self.cast[a].multiply(self.cast[b])
+        shared_crew = self.crew[a].multiply(self.crew[b])
+        cast = np.asarray(shared_cast.sum(axis=1)).ravel()
+        crew = np.asarray(shared_crew.sum(axis=1)).ravel() - np.asarray(
+            shared_crew.multiply(shared_cast).sum(axis=1)).ravel()
+        return cast, crew
+
+
+def compare_pairs(pairs, fetch=False):
+    """Yield one result dict per pair (see FIELDS), in input order.
+
+    Pairs naming a title that isn't cached (and couldn't be fetched, with
+    `fetch`) get counts of None and an "error".
+    """
+    with timed("batch_compare_load_seconds"):
+        titles = {}
+        for id1, type1, id2, type2 in pairs:
+            titles.setdefault(id1, type1)
+            titles.setdefault(id2, type2)
+        matrix, names = IncidenceMatrix.load(titles, fetch=fetch)
+    # The matrix is built; don't hold the read transaction while results stream out.
+    db.session.rollback()
+
+    for start in range(0, len(pairs), CHUNK):
+        chunk = pairs[start:start + CHUNK]
+        known = [i for i, (id1, _, id2, _) in enumerate(chunk) if id1 in matrix.rows and id2 in matrix.rows]
+        with timed("batch_compare_chunk_seconds"):
+            a = np.fromiter((matrix.rows[chunk[i][0]] for i in known), dtype=np.int64, count=len(known))
+            b = np.fromiter((matrix.rows[chunk[i][2]] for i in known), dtype=np.int64, count=len(known))
+            cast, crew = matrix.shared_counts(a, b)
+        counts = {i: (int(c), int(r)) for i, c, r in zip(known, cast.tolist(), crew.tolist())}
+        for i, (id1, type1, id2, type2) in enumerate(chunk):
+            row = {"title_id_1": id1, "media_type_1": type1, "title_id_2": id2, "media_type_2": type2,
+                   "title_1": names.get(id1), "title_2": names.get(id2)}
+            if i in counts:
+                c, r = counts[i]
+                row.update(shared_cast=c, shared_crew=r, total_shared=c + r, error=None)
+            else:
+                missing = [str(t) for t in (id1, id2) if t not in matrix.rows]
+                row.update(shared_cast=None, shared_crew=None, total_shared=None,
+                           error=f"no credits for {', '.join(missing)}")
+            yield row
+
+
+def format_rows(rows, fmt, chunk=1000):
+    """Yield result rows as text, `chunk` rows per piece: "csv" (with a header) or "jsonl"."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, FIELDS, lineterminator="\n") if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+    for n, row in enumerate(rows, 1):
+        if writer:
+            writer.writerow(row)
+        else:
+            buf.write(json.dumps(row) + "\n")
+        if n % chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
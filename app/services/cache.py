@@ -1,8 +1,26 @@
 from datetime import datetime, timezone
+from hashlib import blake2b
+
+from flask import current_app
+from sqlalchemy import case, delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
 
 from app import db
-from app.models import Title, Person, Credit
+from app.engine import write_transaction
+from app.models import Title, Person, Credit, TitleStat
+from app.services.metrics import inc, timed
+from app.services.snapshot import credits_version, get_snapshot
+from app.services.title_stats import StreamedStats, stats_row
 from app.services.tmdb import TMDBClient
+from app.services.upstream import DeadlineExceeded, UpstreamUnavailable, latency_budget, mark_stale, title_lookup
+
+# Credits written per statement when a TV title's credits are streamed in.
+CREDIT_BATCH = 1000
+# The columns a credit's and a person's content is compared on (fingerprints, diffs).
+CREDIT_FIELDS = ("person_id", "credit_type", "character", "display_order", "job", "department")
+PERSON_FIELDS = ("name", "profile_path", "known_for_department")
+# Returned by _fetch_or_stale() when the cached copy is served instead of a re-fetch.
+STALE = object()
 
 
 def get_title_with_credits(title_id, media_type):
@@ -12,122 +30,402 @@ def get_title_with_credits(title_id, media_type):
     """
     title_id = int(title_id)
 
-    # Check cache
+    with timed("cache_lookup_seconds") as labels:
+        title, labels["result"] = _cached_title(title_id)
+        if labels["result"] == "hit":
+            return _load_cached(title)
+        details = _fetch_or_stale(title_id, media_type, labels)
+        if details is STALE:
+            return dict(_load_cached(db.session.get(Title, title_id)), stale=True)
+        return details if details is not None else _load_from_db(db.session.get(Title, title_id))
+
+
+def get_title_credits(title_id, media_type):
+    """
+    Like get_title_with_credits(), but returns (details, credits) where credits
+    exposes cast_ids/crew_ids vectors and cast_entry(i)/crew_entry(i). Cached
+    titles come back with empty cast/crew lists in details and credits backed by
+    the snapshot (zero-copy) or a single ID query, so only the people a caller
+    asks for get their display fields loaded.
+    """
+    title_id = int(title_id)
+
+    with timed("cache_lookup_seconds") as labels:
+        title, labels["result"] = _cached_title(title_id)
+        details = None if labels["result"] == "hit" else _fetch_or_stale(title_id, media_type, labels)
+        if labels["result"] in ("hit", "stale_served"):
+            if details is STALE:
+                title = db.session.get(Title, title_id)
+            snapshot = get_snapshot()
+            version = credits_version(title.credits_hash, title.cached_at)
+            credits = snapshot.credit_vectors(title.id, version) if snapshot else None
+            if credits is None:
+                credits = DbCredits(title.id)
+            return dict(_title_dict(title, [], []), stale=details is STALE), credits
+
+        if details is None:
+            return _title_dict(db.session.get(Title, title_id), [], []), DbCredits(title_id)
+        return details, ListCredits(details["cast"], details["crew"])
+
+
+def fresh_cached_title(title_id):
+    """Return the cached Title if its credits can be served without a re-fetch."""
+    title, state = _cached_title(title_id)
+    return title if state == "hit" else None
+
+
+def _cached_title(title_id):
+    """Return (title, state) where state is "hit" (serve from cache), "stale"
+    (cached but due for a re-fetch) or "miss"."""
     title = Title.query.get(title_id)
     if title and title.credits_cached:
         current_year = datetime.now(timezone.utc).year
         if title.release_year is None or title.release_year < current_year:
-            return _load_from_db(title)
+            return title, "hit"
         # Current/future year — re-fetch for fresh data
+        return title, "stale"
+    return title, "miss"
+
+
+def _fetch_or_stale(title_id, media_type, labels):
+    """_fetch_and_save(), except for a title cached but due for a re-fetch ("stale").
+
+    Its re-fetch gets STALE_REFRESH_BUDGET_SECONDS (within the request's
+    deadline); if it fails or runs out of time, the cached copy is served
+    instead: STALE is returned, labels["result"] becomes "stale_served" and
+    the response is flagged.
+    """
+    if labels["result"] != "stale":
+        return _fetch_and_save(title_id, media_type)
+    try:
+        with latency_budget(current_app.config["STALE_REFRESH_BUDGET_SECONDS"]):
+            return _fetch_and_save(title_id, media_type)
+    except Exception as e:
+        reason = ("deadline" if isinstance(e, DeadlineExceeded)
+                  else "unavailable" if isinstance(e, UpstreamUnavailable) else "error")
+        current_app.logger.warning("serving cached %s %s: re-fetch failed (%s): %s", media_type, title_id, reason, e)
+        inc("stale_served_total", reason=reason)
+        labels["result"] = "stale_served"
+        mark_stale()
+        return STALE
+
 
-    # Cache miss — fetch from TMDB
+def _fetch_and_save(title_id, media_type):
+    """Fetch a title from TMDB and cache it.
+
+    Raises TitleNotFound or UpstreamUnavailable, also for a lookup that failed
+    within its negative-cache TTL (see app.services.upstream).
+
+    Returns the details dict for movies. TV credits are streamed straight into
+    the database instead, and None is returned: read them back from the cache.
+    """
+    # Cache miss — fetch from TMDB. End the read transaction first so the
+    # pooled DB connection isn't held while we wait on the network.
+    db.session.rollback()
     client = TMDBClient()
     if media_type == "movie":
-        details = client.get_movie_details(title_id)
-    else:
-        details = client.get_tv_details(title_id)
+        with title_lookup(title_id, media_type):
+            details = client.get_movie_details(title_id)
+        _save_to_db(details)
+        return details
 
-    _save_to_db(details)
-    return details
+    with title_lookup(title_id, media_type):
+        details, records = client.stream_tv_details(title_id)
+    _save_streamed(title_id, details, records)
+    return None
 
 
 def _save_to_db(details):
-    """Upsert title, persons, and credits into the database."""
+    """Upsert title, persons, and credits into the database. Returns the refresh mode."""
+    return save_many([details])[0]
+
+
+def save_many(batch):
+    """Save several titles' details (as from get_movie_details()) in one write transaction.
+
+    The credits are fingerprinted first (CreditsFingerprint). A refresh whose
+    fingerprint matches the saved one rewrites only the title and title_stats
+    rows, which bumps cached_at (the refresh-age clock) but keeps the snapshot
+    and fragment cache keys, which follow credits_hash; one that differs applies just the credits
+    that changed. Titles, persons and stats are written with INSERT ... ON
+    CONFLICT DO UPDATE, one statement per table rather than a lookup per row.
+    _refresh_modes() locks the titles' rows first: on Postgres that queues a
+    concurrent refresh of the same title behind this one.
+
+    Returns each title's refresh mode ("noop", "diff" or "full"), in order.
+    """
     now = datetime.now(timezone.utc)
-    title_id = details["id"]
+    entries, hashes = [], []
+    for details in batch:
+        entries.append(details.get("cast", []) + details.get("crew", []))
+        fingerprint = CreditsFingerprint()
+        fingerprint.add(entries[-1])
+        hashes.append(fingerprint.hexdigest())
+    with timed("db_save_seconds"), write_transaction():
+        modes = _refresh_modes({details["id"]: h for details, h in zip(batch, hashes)})
+        _upsert(Title, [_title_row(details, now, h) for details, h in zip(batch, hashes)])
+        for details, title_entries in zip(batch, entries):
+            if modes[details["id"]] == "diff":
+                _apply_credit_diff(details["id"], title_entries, now)
+            elif modes[details["id"]] == "full":
+                db.session.execute(delete(Credit).where(Credit.title_id == details["id"]))
+                _write_credits(details["id"], title_entries, now)
+        _upsert(TitleStat, [stats_row(details, now) for details in batch], key="title_id")
+    result = [modes[details["id"]] for details in batch]
+    for mode in result:
+        inc("credit_refresh_total", mode=mode)
+    _update_similar([details["id"] for details, mode in zip(batch, result) if mode != "noop"])
+    return result
 
-    # Upsert title
-    title = Title.query.get(title_id)
-    if title:
-        title.title = details["title"]
-        title.media_type = details["media_type"]
-        title.release_year = details["release_year"]
-        title.overview = details["overview"]
-        title.poster_path = details["poster_path"]
-        title.credits_cached = True
-        title.cached_at = now
-    else:
-        title = Title(
-            id=title_id,
-            media_type=details["media_type"],
-            title=details["title"],
-            release_year=details["release_year"],
-            overview=details["overview"],
-            poster_path=details["poster_path"],
-            credits_cached=True,
-            cached_at=now,
-        )
-        db.session.add(title)
-
-    # Delete old credits for this title (full refresh)
-    Credit.query.filter_by(title_id=title_id).delete()
-
-    # Upsert persons and insert credits
-    all_credits = []
-    for entry in details.get("cast", []):
-        _upsert_person(entry, now)
-        all_credits.append(Credit(
-            title_id=title_id,
-            person_id=entry["person_id"],
-            credit_type="cast",
-            character=entry.get("character", ""),
-            display_order=entry.get("display_order", 999),
-        ))
 
-    for entry in details.get("crew", []):
-        _upsert_person(entry, now)
-        all_credits.append(Credit(
-            title_id=title_id,
-            person_id=entry["person_id"],
-            credit_type="crew",
-            job=entry.get("job", ""),
-            department=entry.get("department", ""),
+def _save_streamed(title_id, details, records):
+    """_save_to_db() for a TV title from TMDBClient.stream_tv_details(). Returns the refresh mode.
+
+    `records` is read twice. The first pass, before the write transaction,
+    fingerprints the credits and collects their stats; if the fingerprint
+    matches, only the title and title_stats rows are written. Otherwise the
+    second pass writes the credits CREDIT_BATCH records at a time as they are
+    parsed, so memory stays flat however long the cast list is. A changed
+    streamed title is rewritten in full rather than diffed, since a diff needs
+    every existing credit in memory at once.
+    """
+    now = datetime.now(timezone.utc)
+    fingerprint = CreditsFingerprint()
+    stats = StreamedStats()
+    try:
+        for batch in _batched(records, CREDIT_BATCH):
+            fingerprint.add(batch)
+            stats.add(batch)
+        with timed("db_save_seconds"), write_transaction():
+            mode = _refresh_modes({title_id: fingerprint.hexdigest()})[title_id]
+            _upsert(Title, [_title_row(details, now, fingerprint.hexdigest())])
+            if mode != "noop":
+                mode = "full"
+                db.session.execute(delete(Credit).where(Credit.title_id == title_id))
+                for batch in _batched(records, CREDIT_BATCH):
+                    _write_credits(title_id, batch, now)
+            _upsert(TitleStat, [stats.row(details, now)], key="title_id")
+    finally:
+        records.close()
+    inc("credit_refresh_total", mode=mode)
+    if mode != "noop":
+        _update_similar([title_id])
+    return mode
+
+
+def _update_similar(title_ids):
+    """Fold titles whose credits just changed into similar_titles (after their save commits)."""
+    from app.services.similar import update_titles
+
+    if not title_ids:
+        return
+    try:
+        with timed("similar_update_seconds"):
+            update_titles(title_ids)
+    except Exception:
+        # The credits are saved; the index catches up at the next `flask cache similar`.
+        current_app.logger.exception("similar_titles update failed for %s", title_ids)
+        inc("similar_update_errors_total")
+
+
+def _refresh_modes(fingerprints):
+    """How to save credits over what's cached, for {title_id: fingerprint}.
+
+    Each title maps to "full" if it has no cached credits, "noop" if they are
+    unchanged and "diff" otherwise. Takes the titles' row locks (SELECT ...
+    FOR UPDATE, in ID order so concurrent batches can't deadlock).
+    """
+    saved = {row.id: row for row in db.session.execute(
+        select(Title.id, Title.credits_cached, Title.credits_hash)
+        .where(Title.id.in_(list(fingerprints)))
+        .order_by(Title.id)
+        .with_for_update()
+    )}
+    modes = {}
+    for title_id, fingerprint in fingerprints.items():
+        row = saved.get(title_id)
+        if row is None or not row.credits_cached:
+            modes[title_id] = "full"
+        else:
+            modes[title_id] = "noop" if row.credits_hash == fingerprint else "diff"
+    return modes
+
+
+def _title_row(details, now, credits_hash):
+    return {
+        "id": details["id"],
+        "media_type": details["media_type"],
+        "title": details["title"],
+        "release_year": details["release_year"],
+        "overview": details["overview"],
+        "poster_path": details["poster_path"],
+        "credits_cached": True,
+        "cached_at": now,
+        "credits_hash": credits_hash,
+    }
+
+
+def _person_row(entry, now):
+    return {
+        "id": entry["person_id"],
+        "name": entry["name"],
+        "profile_path": entry.get("profile_path"),
+        "known_for_department": entry.get("known_for_department"),
+        "cached_at": now,
+    }
+
+
+def _credit_row(title_id, entry):
+    is_cast = entry["credit_type"] == "cast"
+    return {
+        "title_id": title_id,
+        "person_id": entry["person_id"],
+        "credit_type": entry["credit_type"],
+        "character": entry.get("character", "") if is_cast else None,
+        "display_order": entry.get("display_order", 999) if is_cast else None,
+        "job": None if is_cast else entry.get("job", ""),
+        "department": None if is_cast else entry.get("department", ""),
+    }
+
+
+class CreditsFingerprint:
+    """Order-independent hash of a title's normalized credits, fed a batch at a time.
+
+    Each credit (with its person's fields) is hashed on its own and the
+    digests are summed mod 2**128, so the same credits give the same
+    fingerprint in any order and however they are batched.
+    """
+
+    def __init__(self):
+        self._sum = 0
+
+    def add(self, entries):
+        for entry in entries:
+            credit, person = _credit_row(None, entry), _person_row(entry, None)
+            key = tuple(credit[f] for f in CREDIT_FIELDS) + tuple(person[f] for f in PERSON_FIELDS)
+            self._sum += int.from_bytes(blake2b(repr(key).encode(), digest_size=16).digest(), "big")
+
+    def hexdigest(self):
+        return f"{self._sum % (1 << 128):032x}"
+
+
+def _write_credits(title_id, entries, now):
+    """Upsert the people in `entries` and insert their credits on `title_id`."""
+    # Keyed by id: a person credited twice must appear once per upsert batch.
+    person_rows = {entry["person_id"]: _person_row(entry, now) for entry in entries}
+    credit_rows = [_credit_row(title_id, entry) for entry in entries]
+    _upsert(Person, list(person_rows.values()))
+    if credit_rows:
+        db.session.execute(insert(Credit.__table__), credit_rows)
+
+
+def _apply_credit_diff(title_id, entries, now):
+    """Bring the credits on `title_id` in line with `entries`, writing only what changed.
+
+    Existing credits are matched to the new ones on every column, so an
+    unchanged credit keeps its row; the unmatched old rows are deleted and the
+    unmatched entries inserted. People are upserted only if they are new or
+    their fields changed. Returns (inserted, deleted).
+    """
+    credits = Credit.__table__
+    existing = {}
+    for row in db.session.execute(
+        select(credits.c.id, *(credits.c[f] for f in CREDIT_FIELDS)).where(credits.c.title_id == title_id)
+    ):
+        existing.setdefault(tuple(row[1:]), []).append(row.id)
+    added = []
+    for entry in entries:
+        credit = _credit_row(title_id, entry)
+        ids = existing.get(tuple(credit[f] for f in CREDIT_FIELDS))
+        if ids:
+            ids.pop()
+        else:
+            added.append(credit)
+    removed = [credit_id for ids in existing.values() for credit_id in ids]
+    for batch in _batched(removed, CREDIT_BATCH):
+        db.session.execute(delete(Credit).where(Credit.id.in_(batch)))
+
+    people = {entry["person_id"]: _person_row(entry, now) for entry in entries}
+    persons = Person.__table__
+    saved = set()
+    for batch in _batched(list(people), CREDIT_BATCH):
+        saved.update(tuple(row) for row in db.session.execute(
+            select(persons.c.id, *(persons.c[f] for f in PERSON_FIELDS)).where(persons.c.id.in_(batch))
         ))
+    _upsert(Person, [row for row in people.values()
+                     if (row["id"], *(row[f] for f in PERSON_FIELDS)) not in saved])
+    if added:
+        db.session.execute(insert(credits), added)
+    return len(added), len(removed)
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _upsert(model, rows, key="id"):
+    """INSERT ... ON CONFLICT (key) DO UPDATE every other column in `rows`.
+
+    `key` is a column name, or a tuple of them for a composite key.
+    """
+    if not rows:
+        return
+    keys = (key,) if isinstance(key, str) else key
+    dialect = db.session.get_bind().dialect.name
+    stmt = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(model.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: stmt.excluded[column] for column in rows[0] if column not in keys},
+    )
+    db.session.execute(stmt, rows)
 
-    db.session.add_all(all_credits)
-    db.session.commit()
-
-
-def _upsert_person(entry, now):
-    """Insert or update a person record."""
-    person_id = entry["person_id"]
-    person = Person.query.get(person_id)
-    if person:
-        person.name = entry["name"]
-        person.profile_path = entry.get("profile_path")
-        person.known_for_department = entry.get("known_for_department")
-        person.cached_at = now
-    else:
-        person = Person(
-            id=person_id,
-            name=entry["name"],
-            profile_path=entry.get("profile_path"),
-            known_for_department=entry.get("known_for_department"),
-            cached_at=now,
-        )
-        db.session.add(person)
+
+def _load_cached(title):
+    """Load a cached title from the compiled snapshot, falling back to the database."""
+    snapshot = get_snapshot()
+    version = credits_version(title.credits_hash, title.cached_at)
+    credits = snapshot.load_credits(title.id, version) if snapshot else None
+    if credits is None:
+        return _load_from_db(title)
+    cast, crew = credits
+    return _title_dict(title, cast, crew)
 
 
 def _load_from_db(title):
     """Load title details and credits from the database into the standard dict format."""
-    credits = Credit.query.filter_by(title_id=title.id).all()
+    with timed("db_load_seconds"):
+        return _load_credits_from_db(title)
+
+
+def _load_credits_from_db(title):
+    # One join rather than a person lookup per credit: streamed TV titles can have thousands.
+    rows = db.session.execute(
+        select(Credit.credit_type, Credit.character, Credit.job, Credit.department, Credit.display_order,
+               Person.id, Person.name, Person.profile_path, Person.known_for_department)
+        .join(Person, Person.id == Credit.person_id)
+        .where(Credit.title_id == title.id)
+    ).all()
 
     cast = []
     crew = []
-    for c in credits:
-        person = Person.query.get(c.person_id)
-        if not person:
-            continue
+    for c in rows:
         entry = {
-            "person_id": person.id,
-            "name": person.name,
-            "profile_path": person.profile_path,
-            "known_for_department": person.known_for_department,
+            "person_id": c.id,
+            "name": c.name,
+            "profile_path": c.profile_path,
+            "known_for_department": c.known_for_department,
             "credit_type": c.credit_type,
         }
         if c.credit_type == "cast":
             entry["character"] = c.character or ""
-            entry["display_order"] = c.display_order or 999
+            entry["display_order"] = 999 if c.display_order is None else c.display_order
             cast.append(entry)
         else:
             entry["job"] = c.job or ""
@@ -136,6 +434,10 @@ def _load_from_db(title):
 
     cast.sort(key=lambda x: x.get("display_order", 999))
 
+    return _title_dict(title, cast, crew)
+
+
+def _title_dict(title, cast, crew):
     return {
         "id": title.id,
         "media_type": title.media_type,
@@ -146,3 +448,70 @@ def _load_from_db(title):
         "cast": cast,
         "crew": crew,
     }
+
+
+class ListCredits:
+    """Person-ID vectors over already loaded cast/crew lists of dicts."""
+
+    def __init__(self, cast, crew):
+        import numpy as np  # off the boot path: fragments and suggestions import this module
+
+        self._cast = cast
+        self._crew = crew
+        self.cast_ids = np.fromiter((c["person_id"] for c in cast), dtype=np.int32, count=len(cast))
+        self.crew_ids = np.fromiter((c["person_id"] for c in crew), dtype=np.int32, count=len(crew))
+
+    def cast_entry(self, i):
+        return self._cast[i]
+
+    def crew_entry(self, i):
+        return self._crew[i]
+
+
+class DbCredits:
+    """Person-ID vectors for a cached title read with one narrow credits query.
+
+    Person rows are only fetched for entries that are actually materialized.
+    """
+
+    def __init__(self, title_id):
+        import numpy as np
+
+        is_crew = case((Credit.credit_type == "cast", 0), else_=1)
+        rows = db.session.execute(
+            select(is_crew, Credit.person_id, Credit.character, Credit.job,
+                   Credit.department, Credit.display_order)
+            .join(Person, Person.id == Credit.person_id)
+            .where(Credit.title_id == title_id)
+            .order_by(is_crew, Credit.id)
+        ).all()
+        split = next((i for i, row in enumerate(rows) if row[0]), len(rows))
+        self._cast = rows[:split]
+        self._crew = rows[split:]
+        self.cast_ids = np.fromiter((r.person_id for r in self._cast), dtype=np.int32, count=len(self._cast))
+        self.crew_ids = np.fromiter((r.person_id for r in self._crew), dtype=np.int32, count=len(self._crew))
+
+    def cast_entry(self, i):
+        row = self._cast[i]
+        entry = _person_fields(row.person_id, "cast")
+        entry["character"] = row.character or ""
+        entry["display_order"] = 999 if row.display_order is None else row.display_order
+        return entry
+
+    def crew_entry(self, i):
+        row = self._crew[i]
+        entry = _person_fields(row.person_id, "crew")
+        entry["job"] = row.job or ""
+        entry["department"] = row.department or ""
+        return entry
+
+
+def _person_fields(person_id, credit_type):
+    person = db.session.get(Person, person_id)
+    return {
+        "person_id": person.id,
+        "name": person.name,
+        "profile_path": person.profile_path,
+        "known_for_department": person.known_for_department,
+        "credit_type": credit_type,
+    }
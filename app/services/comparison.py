@@ -1,46 +1,51 @@
-from app.services.cache import get_title_with_credits
+import numpy as np
+
+from app.services.cache import get_title_credits
+from app.services.metrics import timed
 
 
 def find_shared(title_id_1, media_type_1, title_id_2, media_type_2):
     """Find shared cast and crew between two titles (uses DB cache)."""
-    details_1 = get_title_with_credits(title_id_1, media_type_1)
-    details_2 = get_title_with_credits(title_id_2, media_type_2)
+    details_1, credits_1 = get_title_credits(title_id_1, media_type_1)
+    details_2, credits_2 = get_title_credits(title_id_2, media_type_2)
+    with timed("find_shared_seconds"):
+        return _shared(details_1, credits_1, details_2, credits_2)
 
-    # Build lookup dicts by person_id
-    cast_1 = {c["person_id"]: c for c in details_1["cast"]}
-    cast_2 = {c["person_id"]: c for c in details_2["cast"]}
-    crew_1 = {c["person_id"]: c for c in details_1["crew"]}
-    crew_2 = {c["person_id"]: c for c in details_2["crew"]}
 
-    # Set intersection
-    shared_cast_ids = set(cast_1.keys()) & set(cast_2.keys())
-    shared_crew_ids = set(crew_1.keys()) & set(crew_2.keys())
+def _shared(details_1, credits_1, details_2, credits_2):
+    # Intersect the person-ID vectors; only shared people get materialized
+    cast_ids, cast_idx_1, cast_idx_2 = _intersect(credits_1.cast_ids, credits_2.cast_ids)
+    crew_ids, crew_idx_1, crew_idx_2 = _intersect(credits_1.crew_ids, credits_2.crew_ids)
 
     # Remove people who appear in shared cast from shared crew (avoid duplicates)
-    shared_crew_ids -= shared_cast_ids
+    keep = ~np.isin(crew_ids, cast_ids, assume_unique=True)
+    crew_idx_1, crew_idx_2 = crew_idx_1[keep], crew_idx_2[keep]
 
     shared_cast = []
-    for pid in shared_cast_ids:
+    for i1, i2 in zip(cast_idx_1.tolist(), cast_idx_2.tolist()):
+        c1 = credits_1.cast_entry(i1)
+        c2 = credits_2.cast_entry(i2)
         shared_cast.append({
-            "person_id": pid,
-            "name": cast_1[pid]["name"],
-            "profile_path": cast_1[pid]["profile_path"],
-            "role_1": cast_1[pid].get("character", ""),
-            "role_2": cast_2[pid].get("character", ""),
-            "order": min(cast_1[pid].get("display_order", 999),
-                         cast_2[pid].get("display_order", 999)),
+            "person_id": c1["person_id"],
+            "name": c1["name"],
+            "profile_path": c1["profile_path"],
+            "role_1": c1.get("character", ""),
+            "role_2": c2.get("character", ""),
+            "order": min(c1.get("display_order", 999), c2.get("display_order", 999)),
         })
     shared_cast.sort(key=lambda x: x["order"])
 
     shared_crew = []
-    for pid in shared_crew_ids:
+    for i1, i2 in zip(crew_idx_1.tolist(), crew_idx_2.tolist()):
+        c1 = credits_1.crew_entry(i1)
+        c2 = credits_2.crew_entry(i2)
         shared_crew.append({
-            "person_id": pid,
-            "name": crew_1[pid]["name"],
-            "profile_path": crew_1[pid]["profile_path"],
-            "role_1": crew_1[pid].get("job", ""),
-            "role_2": crew_2[pid].get("job", ""),
-            "department": crew_1[pid].get("department", ""),
+            "person_id": c1["person_id"],
+            "name": c1["name"],
+            "profile_path": c1["profile_path"],
+            "role_1": c1.get("job", ""),
+            "role_2": c2.get("job", ""),
+            "department": c1.get("department", ""),
         })
     dept_order = {"Directing": 0, "Writing": 1, "Production": 2, "Sound": 3, "Camera": 4}
     shared_crew.sort(key=lambda x: (dept_order.get(x["department"], 99), x["name"]))
@@ -53,4 +58,15 @@ def find_shared(title_id_1, media_type_1, title_id_2, media_type_2):
         "shared_cast": shared_cast,
         "shared_crew": shared_crew,
         "total_shared": len(shared_cast) + len(shared_crew),
+        "stale": details_1.get("stale", False) or details_2.get("stale", False),
     }
+
+
+def _intersect(ids_1, ids_2):
+    """Return (shared_ids, idx_1, idx_2) for two int32 person-ID vectors.
+
+    A person credited more than once on a title resolves to their last credit,
+    the same entry a {person_id: credit} dict would have kept.
+    """
+    shared, rev_1, rev_2 = np.intersect1d(ids_1[::-1], ids_2[::-1], return_indices=True)
+    return shared, len(ids_1) - 1 - rev_1, len(ids_2) - 1 - rev_2
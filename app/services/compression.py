@@ -0,0 +1,187 @@
+"""Compressed responses: on the fly for dynamic HTML, precompressed for static assets.
+
+Dynamic responses (pages, HTMX partials, JSON) of at least COMPRESS_MIN_BYTES
+are compressed in an after_request hook with brotli when the client accepts
+it (and the module is installed), otherwise gzip. Streamed and file responses
+are left alone. A compressed response keeps its ETag as a weak one, so
+If-None-Match revalidation still works across encodings.
+
+Static assets are compressed once at build time by `flask assets compress`,
+which writes `.br` and `.gz` files next to each text asset at maximum
+quality. The static route serves the best variant the client accepts when it
+is at least as new as the original.
+"""
+import gzip
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request, send_from_directory
+
+from app.services.metrics import inc
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "application/xml", "image/svg+xml",
+}
+STATIC_EXTENSIONS = (".css", ".js", ".mjs", ".svg", ".html", ".json", ".txt", ".xml", ".map")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # near gzip -6 speed, smaller output; static assets use 11
+VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+MEMO_SIZE = 64  # compressed bodies of responses with an ETag (the homepage), per worker
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def encodings():
+    """Encodings this worker can produce, preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept, available):
+    """The accepted encoding in `available` with the highest q (earliest on ties), or None."""
+    best, best_q = None, 0
+    for encoding in available:
+        q = accept[encoding]
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding, static=False):
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+
+
+def _compressible(response):
+    return (
+        200 <= response.status_code < 300 and response.status_code != 204
+        and not response.direct_passthrough and not response.is_streamed
+        and "Content-Encoding" not in response.headers
+        and response.mimetype in COMPRESSIBLE_TYPES
+    )
+
+
+def _compressed_body(response, encoding):
+    etag, _ = response.get_etag()
+    key = (request.path, etag, encoding) if etag else None
+    if key is not None:
+        with _memo_lock:
+            body = _memo.get(key)
+            if body is not None:
+                _memo.move_to_end(key)
+                return body
+    body = compress(response.get_data(), encoding)
+    if key is not None:
+        with _memo_lock:
+            _memo[key] = body
+            while len(_memo) > MEMO_SIZE:
+                _memo.popitem(last=False)
+    return body
+
+
+def init_compression(app):
+    """Register response compression and the precompressed static route."""
+
+    @app.after_request
+    def _compress_response(response):
+        if not _compressible(response):
+            return response
+        size = response.calculate_content_length()
+        if size is None or size < current_app.config["COMPRESS_MIN_BYTES"]:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.accept_encodings, encodings())
+        if encoding is None:
+            return response
+        body = _compressed_body(response, encoding)
+        if len(body) >= size:
+            return response
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        inc("compressed_responses_total", encoding=encoding)
+        inc("compression_saved_bytes_total", size - len(body))
+        return response
+
+    if app.static_folder:
+        app.view_functions["static"] = _static_view(app)
+
+
+def _static_view(app):
+    def static(filename):
+        original = app.send_static_file(filename)  # 404s and path checks as before
+        if original.status_code != 200 or not filename.endswith(STATIC_EXTENSIONS):
+            return original
+        path = os.path.join(app.static_folder, filename)
+        available = {encoding: suffix for encoding, suffix in VARIANTS if _fresh_variant(path, suffix)}
+        if not available:
+            return original
+        encoding = choose_encoding(request.accept_encodings, [e for e, _ in VARIANTS if e in available])
+        if encoding is None:
+            original.vary.add("Accept-Encoding")
+            return original
+        original.close()
+        response = send_from_directory(
+            app.static_folder, filename + available[encoding],
+            mimetype=mimetypes.guess_type(filename)[0], max_age=app.get_send_file_max_age(filename),
+        )
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        return response
+
+    return static
+
+
+def _fresh_variant(path, suffix):
+    try:
+        return os.stat(path + suffix).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def static_assets(static_folder, skip=()):
+    """Paths of the text assets under `static_folder`, outside the `skip` directories."""
+    skip = {os.path.abspath(d) for d in skip}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in skip]
+        for name in sorted(files):
+            if name.endswith(STATIC_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def precompress(path):
+    """Write `path`.br and `path`.gz where they're smaller than `path`.
+
+    Returns {encoding: compressed size} for the variants kept; a variant that
+    doesn't pay for itself is removed so it can't go stale.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    sizes = {}
+    for encoding, suffix in VARIANTS:
+        if encoding not in encodings():
+            continue
+        body = compress(data, encoding, static=True)
+        if len(body) < len(data):
+            tmp_path = f"{path}{suffix}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path + suffix)
+            sizes[encoding] = len(body)
+        else:
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+    return sizes
@@ -0,0 +1,86 @@
+"""Precomputed co-star overlap, for picking OddOneOut outsiders by difficulty.
+
+`flask game costars` builds a titles × persons incidence matrix from each
+title's top-billed cast (title_stats.top_cast_ids), multiplies it by its
+transpose in blocks of persons, and keeps each person's TOP_K most frequent
+co-stars in costar_scores. Puzzle generation then reads three insiders' rows
+by primary key instead of joining credits at request time.
+"""
+import time
+
+from sqlalchemy import delete, select
+
+from app import db
+from app.engine import write_transaction
+from app.models import CostarScore, TitleStat
+from app.services.transfer import copy_rows
+
+TOP_K = 25
+BLOCK = 5000
+WRITE_BATCH = 50000
+
+
+def build(top_k=TOP_K, block=BLOCK):
+    """Recompute costar_scores from title_stats. Returns (persons, pairs, seconds)."""
+    import numpy as np  # only the batch job needs these; puzzle.py imports this module at boot
+    from scipy import sparse
+
+    start = time.perf_counter()
+    title_rows, person_ids, n_titles = [], [], 0
+    for (top_cast,) in db.session.execute(select(TitleStat.top_cast_ids)):
+        title_rows.extend([n_titles] * len(top_cast or ()))
+        person_ids.extend(top_cast or ())
+        n_titles += 1
+
+    persons, columns = np.unique(np.asarray(person_ids, dtype=np.int64), return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(columns), dtype=np.int32), (np.asarray(title_rows), columns)),
+        shape=(n_titles, len(persons)),
+    )
+    incidence.data[:] = 1  # a person billed twice on one title still shares it once
+    by_person = incidence.T.tocsr()
+
+    sources, targets, weights = [], [], []
+    for lo in range(0, len(persons), block):
+        # shared[p, q] = number of titles where persons lo+p and q are both top-billed
+        shared = (by_person[lo:lo + block] @ incidence).tocsr()
+        shared.setdiag(0, k=lo)
+        shared.eliminate_zeros()
+        for p in range(shared.shape[0]):
+            begin, end = shared.indptr[p], shared.indptr[p + 1]
+            if begin == end:
+                continue
+            counts = shared.data[begin:end]
+            costars = shared.indices[begin:end]
+            if len(counts) > top_k:
+                keep = np.argpartition(counts, -top_k)[-top_k:]
+                counts, costars = counts[keep], costars[keep]
+            sources.append(np.full(len(counts), persons[lo + p]))
+            targets.append(persons[costars])
+            weights.append(counts)
+
+    pairs = sum(len(w) for w in weights)
+    columns = [np.concatenate(c) if c else np.empty(0, dtype=np.int64) for c in (sources, targets, weights)]
+    with write_transaction() as session:
+        session.execute(delete(CostarScore))
+        for lo in range(0, pairs, WRITE_BATCH):
+            copy_rows(session.connection(), CostarScore.__table__, ["person_id", "costar_id", "shared_titles"],
+                      zip(*(c[lo:lo + WRITE_BATCH].tolist() for c in columns)))
+    return len(persons), pairs, time.perf_counter() - start
+
+
+def overlap(insider_ids, exclude):
+    """{person_id: (insiders co-starred with, total shared titles)} for the insiders' co-stars.
+
+    People in `exclude` (the insiders' own title's cast) are left out.
+    """
+    scores = {}
+    for costar_id, shared in db.session.execute(
+        select(CostarScore.costar_id, CostarScore.shared_titles)
+        .where(CostarScore.person_id.in_(insider_ids))
+    ):
+        if costar_id in exclude:
+            continue
+        linked, total = scores.get(costar_id, (0, 0))
+        scores[costar_id] = (linked + 1, total + shared)
+    return scores
@@ -0,0 +1,181 @@
+"""SameCast Daily: guess the people two titles share.
+
+Each day's pair and its full answer set are computed once with find_shared()
+and stored as a DailyPair row. Guesses are checked against an in-memory index
+of normalized names built from that row, so the guess endpoint never touches
+TMDB or the credits table.
+"""
+import difflib
+import random
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import func, select
+
+from app import db
+from app.engine import write_transaction
+from app.models import Credit, DailyPair, Title, TitleStat
+from app.services.metrics import timed
+
+MAX_GUESSES = 6
+MIN_SHARED = 3  # shared top-billed cast needed for a pair to be playable
+CANDIDATE_SAMPLE = 50
+DECOY_CAST = 40
+DECOY_DEPARTMENTS = ("Directing", "Writing")
+FUZZY_CUTOFF = 0.82
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 8
+
+
+def get_or_generate_daily(target_date=None):
+    """Return the DailyPair for a date (default today), generating it if needed."""
+    target_date = target_date or date.today()
+    pair = DailyPair.query.filter_by(puzzle_date=target_date).first()
+    return pair or generate_daily(target_date)
+
+
+def generate_daily(target_date):
+    """Pick an unused pair of cached titles with shared cast and store its answers."""
+    with timed("daily_generate_seconds"):
+        return _generate_daily(target_date)
+
+
+def _generate_daily(target_date):
+    from app.services.cache import get_title_with_credits
+    from app.services.comparison import find_shared
+
+    used = {frozenset(((p.title_1_id, p.title_1_type), (p.title_2_id, p.title_2_type)))
+            for p in DailyPair.query.all()}
+    pair = _pick_pair(used)
+    if pair is None:
+        raise ValueError("No unused pair of cached titles shares enough cast. Cache more titles first.")
+    (id_1, type_1), (id_2, type_2) = pair
+
+    result = find_shared(id_1, type_1, id_2, type_2)
+    answers = [
+        {"person_id": p["person_id"], "name": p["name"], "profile_path": p["profile_path"],
+         "role_1": p["role_1"], "role_2": p["role_2"]}
+        for p in result["shared_cast"] + result["shared_crew"]
+    ]
+    shared_ids = {a["person_id"] for a in answers}
+    decoys = []
+    for which, (title_id, media_type) in ((1, pair[0]), (2, pair[1])):
+        details = get_title_with_credits(title_id, media_type)
+        cast = sorted(details["cast"], key=lambda c: c.get("display_order", 999))[:DECOY_CAST]
+        crew = [c for c in details["crew"] if c.get("department") in DECOY_DEPARTMENTS]
+        seen = set(shared_ids)
+        for person in cast + crew:
+            if person["person_id"] not in seen:
+                seen.add(person["person_id"])
+                decoys.append({"person_id": person["person_id"], "name": person["name"], "title": which})
+
+    t1, t2 = result["title_1"], result["title_2"]
+    row = DailyPair(
+        puzzle_date=target_date,
+        title_1_id=id_1, title_1_type=type_1, title_1_name=t1["title"],
+        title_1_year=t1["year"], title_1_poster=t1["poster_path"],
+        title_2_id=id_2, title_2_type=type_2, title_2_name=t2["title"],
+        title_2_year=t2["year"], title_2_poster=t2["poster_path"],
+        answers=answers,
+        decoys=decoys,
+    )
+    with write_transaction():
+        db.session.add(row)
+    return row
+
+
+def _pick_pair(used):
+    """Two cached titles whose top-billed cast overlap by MIN_SHARED+, found via the person index."""
+    candidates = db.session.execute(
+        select(Title.id, Title.media_type, TitleStat.top_cast_ids)
+        .join(TitleStat, TitleStat.title_id == Title.id)
+        .where(Title.credits_cached == True, TitleStat.cast_count >= MIN_SHARED)  # noqa: E712
+        .order_by(func.random())
+        .limit(CANDIDATE_SAMPLE)
+    ).all()
+    shared = func.count(func.distinct(Credit.person_id))
+    for title_id, media_type, top_cast_ids in candidates:
+        partners = db.session.execute(
+            select(Title.id, Title.media_type)
+            .join(Credit, Credit.title_id == Title.id)
+            .where(Credit.person_id.in_(top_cast_ids), Credit.credit_type == "cast",
+                   Credit.title_id != title_id, Title.credits_cached == True)  # noqa: E712
+            .group_by(Title.id, Title.media_type)
+            .having(shared >= MIN_SHARED)
+        ).all()
+        random.shuffle(partners)
+        for partner in partners:
+            pair = ((title_id, media_type), (partner.id, partner.media_type))
+            if frozenset(pair) not in used:
+                return pair
+    return None
+
+
+def normalize_name(name):
+    """'Zoë  Saldaña-Pérez' -> 'zoe saldana perez'."""
+    decomposed = unicodedata.normalize("NFKD", name)
+    ascii_only = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", ascii_only.lower()).split())
+
+
+class GuessIndex:
+    """Normalized-name lookup over a DailyPair's answers and decoys.
+
+    Exact matches on the full name win; otherwise a unique surname, then the
+    closest name by difflib ratio above FUZZY_CUTOFF, so "cilian murphy" and
+    "Murphy" both find Cillian Murphy.
+    """
+
+    def __init__(self, pair):
+        self.titles = {1: pair.title_1_name, 2: pair.title_2_name}
+        self._names = {}
+        surnames = {}
+        people = [(a, "both") for a in pair.answers] + [(d, d["title"]) for d in pair.decoys]
+        for person, where in people:
+            key = normalize_name(person["name"])
+            if not key or key in self._names:
+                continue
+            self._names[key] = (person, where)
+            surnames.setdefault(key.split()[-1], []).append(key)
+        self._surnames = {s: keys[0] for s, keys in surnames.items() if len(keys) == 1}
+        self._keys = list(self._names)
+
+    def match(self, guess):
+        """Return (person dict, "both" | 1 | 2) for a guess, or None if nobody is close."""
+        key = normalize_name(guess or "")
+        if not key:
+            return None
+        if key in self._names:
+            return self._names[key]
+        if key in self._surnames:
+            return self._names[self._surnames[key]]
+        close = difflib.get_close_matches(key, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+        return self._names[close[0]] if close else None
+
+
+def guess_index(puzzle_date):
+    """The GuessIndex for a date's puzzle, or None if there is no puzzle.
+
+    Built once per pair per worker; only the pair's id is read per request.
+    """
+    pair_id = db.session.execute(
+        select(DailyPair.id).where(DailyPair.puzzle_date == puzzle_date)
+    ).scalar()
+    if pair_id is None:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(pair_id)
+        if index is not None:
+            _indexes.move_to_end(pair_id)
+            return index
+    index = GuessIndex(db.session.get(DailyPair, pair_id))
+    with _indexes_lock:
+        _indexes[pair_id] = index
+        while len(_indexes) > _INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,165 @@
+"""Rendered-HTML fragment cache.
+
+Hot comparison pages are cached as finished HTML, keyed by the canonical pair,
+the variant (HTMX partial or full permalink page), each title's
+content_version (its credits fingerprint and display fields) and a hash of the
+templates involved. A refresh that changes a title changes its version, so
+stale fragments are never served — they just age out of the LRU — while one
+that changes nothing keeps the cached HTML.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.services.cache import fresh_cached_title
+
+COMPARISON_TEMPLATES = ("partials/comparison.html", "comparison_page.html", "base.html")
+
+_caches = {}
+_template_versions = {}
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered HTML with a byte budget and optional disk tier."""
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+        html = self._disk_get(key)
+        if html is not None:
+            self._memory_put(key, html)
+        return html
+
+    def put(self, key, html):
+        self._memory_put(key, html)
+        self._disk_put(key, html)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _memory_put(self, key, html):
+        size = len(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = html
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode()).hexdigest() + ".html")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_put(self, key, html):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+        except OSError as e:  # full or read-only disk: the page was rendered fine, only the cache write is lost
+            current_app.logger.warning("fragment cache disk write failed: %s", e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._disk_writes += 1
+        if self.disk_max_bytes and self._disk_writes % 100 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Delete least recently written files until the disk tier fits its budget."""
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".html"):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def get_cache(name):
+    """Return this worker's named FragmentCache, created from config on first use."""
+    cache = _caches.get(name)
+    if cache is None:
+        config = current_app.config
+        disk_dir = config["FRAGMENT_CACHE_DIR"]
+        cache = _caches[name] = FragmentCache(
+            max_bytes=config["FRAGMENT_CACHE_MAX_BYTES"],
+            disk_dir=os.path.join(disk_dir, name) if disk_dir else None,
+            disk_max_bytes=config["FRAGMENT_CACHE_DISK_MAX_BYTES"],
+        )
+    return cache
+
+
+def template_version(names):
+    """Short hash of the given templates' sources, so a deploy that edits them
+    starts from a cold cache instead of serving old markup."""
+    version = _template_versions.get(names)
+    if version is None or current_app.debug:
+        env = current_app.jinja_env
+        digest = hashlib.sha1()
+        for name in names:
+            source, _, _ = env.loader.get_source(env, name)
+            digest.update(source.encode())
+        version = _template_versions[names] = digest.hexdigest()[:12]
+    return version
+
+
+def comparison_key(variant, id1, type1, id2, type2):
+    """Cache key for a rendered comparison, or None if either title would be
+    (re-)fetched from TMDB — those always go through find_shared."""
+    title_1 = fresh_cached_title(int(id1))
+    title_2 = fresh_cached_title(int(id2))
+    if not title_1 or not title_2:
+        return None
+    return "|".join([
+        variant,
+        f"{int(id1)}-{type1}/{int(id2)}-{type2}",
+        title_1.content_version,
+        title_2.content_version,
+        template_version(COMPARISON_TEMPLATES),
+    ])
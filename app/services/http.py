@@ -0,0 +1,26 @@
+from flask import current_app
+
+_session = None
+
+
+def get_session():
+    """Return the per-process pooled HTTP session used for all upstream calls.
+
+    Keep-alive connections to TMDB are reused across requests. Under the
+    gevent worker (SAMECAST_ASYNC=1) the socket calls are cooperative, so one
+    worker can keep up to HTTP_POOL_MAXSIZE upstream requests in flight.
+    """
+    global _session
+    if _session is None:
+        import requests  # deferred: keeps it off the worker boot path
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=current_app.config["HTTP_POOL_CONNECTIONS"],
+            pool_maxsize=current_app.config["HTTP_POOL_MAXSIZE"],
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
@@ -0,0 +1,306 @@
+"""In-process metrics with a Prometheus text exposition at /metrics.
+
+Each worker keeps its own counters, gauges and latency histograms and dumps
+them to METRICS_DIR/<pid>-<token>.json every few seconds; the token is set
+once per process, so a recycled worker that reuses a pid starts a new file.
+/metrics merges every worker's file, so whichever gunicorn worker answers the
+scrape reports the whole server. Files of workers that have exited are folded
+into retired.json at scrape time, which keeps their counts in the totals
+(counters stay monotonic across recycles) without growing the directory.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no other processes to race with on the dev server
+    fcntl = None
+
+from flask import before_render_template, current_app, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+
+from app import db
+
+PREFIX = "samecast_"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_last_flush = 0.0
+_metrics_dir = None
+_own_file = None  # (pid, filename) of this process's snapshot
+
+RETIRED = "retired.json"
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(hist["buckets"]):
+            if value <= bound:
+                hist["counts"][i] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the wall time of the block in the `name` histogram.
+
+    Yields the labels dict so the block can fill in a label it only learns
+    partway through (e.g. which cache branch it took).
+    """
+    start = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def init_metrics(app):
+    """Register request timing, per-request DB query counting and the flush hook."""
+    global _metrics_dir
+    _metrics_dir = app.config["METRICS_DIR"] or os.path.join(app.instance_path, "metrics")
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and "db_queries" in g:
+            g.db_queries += 1
+
+    @app.before_request
+    def _start_request():
+        g.request_start = time.perf_counter()
+        g.db_queries = 0
+
+    @app.after_request
+    def _finish_request(response):
+        if "request_start" in g:
+            endpoint = request.endpoint or "unmatched"
+            observe("http_request_seconds", time.perf_counter() - g.request_start, endpoint=endpoint)
+            observe("db_queries_per_request", g.db_queries, buckets=COUNT_BUCKETS, endpoint=endpoint)
+            inc("http_requests_total", endpoint=endpoint, status=str(response.status_code))
+        maybe_flush()
+        return response
+
+    def _before_render(sender, template, context, **extra):
+        g.setdefault("render_starts", []).append(time.perf_counter())
+
+    def _rendered(sender, template, context, **extra):
+        starts = g.get("render_starts")
+        if starts:
+            observe("template_render_seconds", time.perf_counter() - starts.pop(), template=template.name)
+
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_rendered, app, weak=False)
+
+
+def maybe_flush(force=False):
+    """Write this worker's metrics to METRICS_DIR at most every few seconds."""
+    global _last_flush
+    now = time.monotonic()
+    interval = current_app.config["METRICS_FLUSH_INTERVAL"] if has_app_context() else 0
+    if not force and now - _last_flush < interval:
+        return
+    _last_flush = now
+    if _metrics_dir is None:
+        return
+    with _lock:
+        data = {
+            "counters": [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            "gauges": [[name, list(labels), value] for (name, labels), value in _gauges.items()],
+            "histograms": [[name, list(labels), hist] for (name, labels), hist in _histograms.items()],
+        }
+    os.makedirs(_metrics_dir, exist_ok=True)
+    _write(os.path.join(_metrics_dir, _own_filename()), data)
+
+
+def _own_filename():
+    global _own_file
+    pid = os.getpid()
+    if _own_file is None or _own_file[0] != pid:
+        _own_file = (pid, f"{pid}-{time.time_ns()}.json")
+    return _own_file[1]
+
+
+def _write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _worker_files():
+    """[(pid, token, filename)] for every worker snapshot in METRICS_DIR."""
+    files = []
+    for filename in os.listdir(_metrics_dir):
+        stem = filename.removesuffix(".json")
+        if stem == filename or filename == RETIRED:
+            continue
+        pid, _, token = stem.partition("-")
+        try:
+            files.append((int(pid), int(token or 0), filename))
+        except ValueError:
+            continue
+    return files
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data["counters"]:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, hist in data["histograms"]:
+        key = (name, tuple(map(tuple, labels)))
+        merged = histograms.get(key)
+        if merged is None or merged["buckets"] != hist["buckets"]:
+            histograms[key] = hist
+            continue
+        merged["counts"] = [a + b for a, b in zip(merged["counts"], hist["counts"])]
+        merged["sum"] += hist["sum"]
+        merged["count"] += hist["count"]
+
+
+def _retire(filenames):
+    """Fold exited workers' counters and histograms into retired.json and delete their files."""
+    with open(os.path.join(_metrics_dir, "retired.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # scrapes on two workers must not both fold a file
+        counters, histograms = {}, {}
+        retired = _read(os.path.join(_metrics_dir, RETIRED))
+        if retired is not None:
+            _merge(counters, histograms, retired)
+        folded = [f for f in filenames if _fold(counters, histograms, os.path.join(_metrics_dir, f))]
+        if not folded:
+            return
+        _write(os.path.join(_metrics_dir, RETIRED), {
+            "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+            "gauges": [],
+            "histograms": [[name, list(labels), hist] for (name, labels), hist in histograms.items()],
+        })
+        for filename in folded:
+            os.remove(os.path.join(_metrics_dir, filename))
+
+
+def _fold(counters, histograms, path):
+    data = _read(path)  # None if another scrape already retired it
+    if data is None:
+        return False
+    _merge(counters, histograms, data)
+    return True
+
+
+def collect():
+    """Merge every worker's flushed metrics with those of exited workers (retired.json).
+
+    Gauges are only reported for live workers, labelled with their pid.
+    """
+    maybe_flush(force=True)
+    files = _worker_files()
+    # Only one process holds a pid at a time: for a reused pid, the newest token is the live worker.
+    live = {}
+    for pid, token, _ in files:
+        if token >= live.get(pid, -1) and _pid_alive(pid):
+            live[pid] = token
+    exited = [filename for pid, token, filename in files if live.get(pid) != token]
+    if exited:
+        _retire(exited)
+
+    counters, gauges, histograms = {}, {}, {}
+    retired = _read(os.path.join(_metrics_dir, RETIRED))
+    if retired is not None:
+        _merge(counters, histograms, retired)
+    for pid, token, filename in files:
+        if live.get(pid) != token:
+            continue
+        data = _read(os.path.join(_metrics_dir, filename))
+        if data is None:
+            continue
+        _merge(counters, histograms, data)
+        for name, labels, value in data["gauges"]:
+            gauges[(name, tuple(map(tuple, labels)) + (("pid", str(pid)),))] = value
+    return counters, gauges, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, extra=()):
+    items = list(pairs) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus():
+    """Return all merged metrics in the Prometheus text exposition format."""
+    counters, gauges, histograms = collect()
+    lines = []
+    typed = set()
+
+    def type_line(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        type_line(name, "counter")
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        type_line(name, "gauge")
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+    for (name, labels), hist in sorted(histograms.items()):
+        type_line(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(hist["buckets"], hist["counts"]):
+            cumulative += count
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {hist['sum']}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
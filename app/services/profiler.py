@@ -0,0 +1,209 @@
+"""Opt-in sampling profiler for production requests.
+
+A sampled fraction of requests to the hot endpoints (PROFILE_SAMPLE_RATE), or
+any request carrying a valid signed X-Samecast-Profile header, gets a
+statistical stack profile and the list of SQL statements it ran written to
+PROFILE_DIR as JSON. When neither applies the only cost is one header lookup
+and one float comparison per request.
+
+The header value is "<unix_ts>:<hmac>" where hmac = HMAC-SHA256(SECRET_KEY,
+"<unix_ts>:<path>"); `flask profiles sign <path>` prints one.
+"""
+import _thread
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from app import db
+
+HEADER = "X-Samecast-Profile"
+PROFILED_ENDPOINTS = {"main.compare", "main.compare_permalink", "oddoneout.index", "search.autocomplete"}
+SIGNATURE_MAX_AGE = 300
+
+try:
+    from gevent.monkey import get_original, is_module_patched
+except ImportError:
+    get_original = None
+
+if get_original is not None and is_module_patched("threading"):
+    # The sampler must be a real OS thread so it keeps ticking while greenlets block.
+    # threading.get_ident() is patched to return greenlet ids, which sys._current_frames() doesn't know.
+    from greenlet import getcurrent as _current_greenlet
+
+    _start_thread = get_original("_thread", "start_new_thread")
+    _sleep = get_original("time", "sleep")
+    _get_ident = get_original("_thread", "get_ident")
+else:
+    _current_greenlet = None
+    _start_thread = _thread.start_new_thread
+    _sleep = time.sleep
+    _get_ident = threading.get_ident
+
+
+def sign(path, secret_key, timestamp=None):
+    timestamp = int(timestamp or time.time())
+    mac = hmac.new(secret_key.encode(), f"{timestamp}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{timestamp}:{mac}"
+
+
+def _valid_signature(value, path, secret_key):
+    timestamp, _, _ = value.partition(":")
+    if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > SIGNATURE_MAX_AGE:
+        return False
+    return hmac.compare_digest(value, sign(path, secret_key, int(timestamp)))
+
+
+class Sampler:
+    """Samples one thread's (or greenlet's) Python stack at a fixed interval from a side thread."""
+
+    def __init__(self, thread_id, interval, greenlet=None):
+        self.thread_id = thread_id
+        self.greenlet = greenlet
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = False
+
+    def start(self):
+        _start_thread(self._run, ())
+
+    def stop(self):
+        self._stop = True
+
+    def _run(self):
+        while not self._stop:
+            frame = self._frame()
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+            _sleep(self.interval)
+
+    def _frame(self):
+        if self.greenlet is not None:
+            # A switched-out greenlet keeps its frame in gr_frame; a running one is the thread's frame.
+            frame = self.greenlet.gr_frame
+            if frame is not None or self.greenlet.dead:
+                return frame
+        return sys._current_frames().get(self.thread_id)
+
+
+def init_profiler(app):
+    """Register the per-request hooks. Cheap no-ops unless a request is selected."""
+    rate = app.config["PROFILE_SAMPLE_RATE"]
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _sql_start(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and "profile" in g:
+            conn.info.setdefault("profile_sql_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _sql_end(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and "profile" in g:
+            starts = conn.info.get("profile_sql_start")
+            elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+            g.profile["sql"].append({"statement": statement, "ms": round(elapsed * 1000, 3)})
+
+    @app.before_request
+    def _maybe_start_profile():
+        header = request.headers.get(HEADER)
+        if header is None and not (rate and random.random() < rate):
+            return
+        if request.endpoint not in PROFILED_ENDPOINTS:
+            return
+        if header is not None and not _valid_signature(header, request.path, app.config["SECRET_KEY"]):
+            return
+        greenlet = _current_greenlet() if _current_greenlet is not None else None
+        sampler = Sampler(_get_ident(), app.config["PROFILE_INTERVAL"], greenlet)
+        g.profile = {"sampler": sampler, "sql": [], "start": time.perf_counter(), "trigger": "header" if header else "sample"}
+        sampler.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profile["sampler"].stop()
+            _write_profile(profile, response.status_code)
+        return response
+
+
+def profile_dir():
+    return current_app.config["PROFILE_DIR"] or os.path.join(current_app.instance_path, "profiles")
+
+
+def _write_profile(profile, status):
+    sampler = profile["sampler"]
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}-{int(now * 1000) % 1000:03d}-{os.getpid()}-{request.endpoint}.json"
+    data = {
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "status": status,
+        "trigger": profile["trigger"],
+        "duration_ms": round((time.perf_counter() - profile["start"]) * 1000, 3),
+        "interval_ms": sampler.interval * 1000,
+        "samples": sampler.samples,
+        "stacks": sampler.stacks.most_common(),
+        "sql": profile["sql"],
+    }
+    with open(os.path.join(directory, name), "w") as f:
+        json.dump(data, f)
+    _rotate(directory, current_app.config["PROFILE_KEEP"])
+
+
+def _rotate(directory, keep):
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".json"))
+    for name in files[:-keep] if keep else []:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """Return (name, data) for every captured profile, oldest first."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    result = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                result.append((name, json.load(f)))
+    return result
+
+
+def summarize(data, top=15):
+    """Return (self_counts, inclusive_counts, sql_groups) for one profile."""
+    self_counts = Counter()
+    inclusive = Counter()
+    for stack, count in data["stacks"]:
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    sql = {}
+    for entry in data["sql"]:
+        stmt = " ".join(entry["statement"].split())
+        calls, total = sql.get(stmt, (0, 0.0))
+        sql[stmt] = (calls + 1, total + entry["ms"])
+    sql_groups = sorted(sql.items(), key=lambda item: -item[1][1])
+    return self_counts.most_common(top), inclusive.most_common(top), sql_groups[:top]
@@ -1,14 +1,27 @@
 import random
 from datetime import date, datetime, timezone
 
-from sqlalchemy import func
+from sqlalchemy import select
 
 from app import db
-from app.models import Credit, OddOneOutRound, Person, Title
+from app.engine import write_transaction
+from app.models import Credit, OddOneOutRound, Person, Title, TitleStat
+from app.services.costars import overlap
+from app.services.metrics import timed
+from app.services.title_stats import sample_titles
 
 # Day 1 of OddOneOut
 LAUNCH_DATE = date(2026, 2, 25)
 
+# Random eligible titles drawn per generation: a round and its outsider
+# search use at most 11 titles, so this leaves plenty for skips.
+CANDIDATE_SAMPLE = 200
+MIN_CAST = 4
+CANDIDATE_COLUMNS = (Title.id, Title.title, Title.media_type, TitleStat.top_cast_ids, TitleStat.difficulty)
+
+# Round 1 is easy, round 3 is hard.
+TIERS = ("easy", "medium", "hard")
+
 
 def puzzle_number(target_date=None):
     """Return the puzzle number for a given date (Day 1 = launch date)."""
@@ -33,63 +46,61 @@ def get_or_generate_today():
 
 def generate_rounds_for_date(target_date):
     """Auto-generate 3 rounds for a given date using cached titles."""
-    # Find titles with enough cast members
-    titles_with_cast = (
-        db.session.query(Title.id, Title.title, Title.media_type)
-        .join(Credit, Credit.title_id == Title.id)
-        .filter(Title.credits_cached == True, Credit.credit_type == "cast")  # noqa: E712
-        .group_by(Title.id)
-        .having(func.count(Credit.id) >= 4)
-        .all()
-    )
+    with timed("puzzle_generate_seconds"):
+        return _generate_rounds(target_date)
+
+
+def _generate_rounds(target_date):
+    # A random sample of titles with enough cast members (title_stats is kept current by _save_to_db)
+    titles_with_cast = sample_titles(CANDIDATE_COLUMNS, MIN_CAST, CANDIDATE_SAMPLE)
 
     if len(titles_with_cast) < 4:
         raise ValueError("Not enough cached titles with 4+ cast to generate puzzles. Cache more titles first.")
 
-    random.shuffle(titles_with_cast)
     used_title_ids = set()
     rounds = []
 
-    for round_num in range(1, 4):
-        round_row = _build_round(target_date, round_num, titles_with_cast, used_title_ids)
-        if round_row is None:
-            raise ValueError(f"Could not generate round {round_num} — not enough suitable titles.")
-        rounds.append(round_row)
-        db.session.add(round_row)
+    with write_transaction():
+        for round_num, tier in enumerate(TIERS, start=1):
+            round_row = _build_round(target_date, round_num, tier, titles_with_cast, used_title_ids)
+            if round_row is None:
+                raise ValueError(f"Could not generate round {round_num} — not enough suitable titles.")
+            rounds.append(round_row)
+            db.session.add(round_row)
 
-    db.session.commit()
     return rounds
 
 
-def _build_round(target_date, round_number, titles_with_cast, used_title_ids):
-    """Build a single round: pick a title, 3 cast, 1 outsider."""
-    for title_id, title_name, media_type in titles_with_cast:
+def _build_round(target_date, round_number, tier, titles_with_cast, used_title_ids):
+    """Build a single round: pick a title, 3 cast, 1 outsider, aiming for `tier`.
+
+    Easy rounds favour popular titles, hard ones obscure titles (title_stats.difficulty).
+    """
+    if tier == "medium":
+        ordered = titles_with_cast
+    else:
+        ordered = sorted(titles_with_cast, key=lambda t: 0.5 if t.difficulty is None else t.difficulty,
+                         reverse=tier == "hard")
+    for title_id, title_name, media_type, top_cast_ids, _ in ordered:
         if title_id in used_title_ids:
             continue
 
-        # Get top-billed cast for this title
-        cast = (
-            Credit.query
-            .filter_by(title_id=title_id, credit_type="cast")
-            .order_by(Credit.display_order.asc())
-            .limit(15)
-            .all()
-        )
-
-        if len(cast) < 3:
+        # Top-billed cast for this title, in billing order
+        if len(top_cast_ids) < 3:
             continue
 
         # Pick 3 actors from the cast
-        chosen_cast = random.sample(cast[:min(len(cast), 10)], 3)
-        cast_person_ids = {c.person_id for c in Credit.query.filter_by(title_id=title_id, credit_type="cast").all()}
+        chosen_ids = random.sample(top_cast_ids, 3)
+        cast_person_ids = set(db.session.scalars(
+            select(Credit.person_id).filter_by(title_id=title_id, credit_type="cast")
+        ))
 
-        # Find an outsider from a different title
-        outsider = _find_outsider(title_id, cast_person_ids, titles_with_cast, used_title_ids)
+        outsider, achieved = _pick_outsider(tier, title_id, chosen_ids, cast_person_ids, titles_with_cast)
         if outsider is None:
             continue
 
         # Load person details
-        person_ids = [c.person_id for c in chosen_cast] + [outsider.id]
+        person_ids = chosen_ids + [outsider.id]
         persons = {p.id: p for p in Person.query.filter(Person.id.in_(person_ids)).all()}
 
         used_title_ids.add(title_id)
@@ -99,40 +110,60 @@ def _build_round(target_date, round_number, titles_with_cast, used_title_ids):
             round_number=round_number,
             title_id=title_id,
             title_name=title_name,
-            actor_1_id=chosen_cast[0].person_id,
-            actor_2_id=chosen_cast[1].person_id,
-            actor_3_id=chosen_cast[2].person_id,
+            actor_1_id=chosen_ids[0],
+            actor_2_id=chosen_ids[1],
+            actor_3_id=chosen_ids[2],
             outsider_id=outsider.id,
-            actor_1_name=persons.get(chosen_cast[0].person_id, Person(name="?")).name,
-            actor_2_name=persons.get(chosen_cast[1].person_id, Person(name="?")).name,
-            actor_3_name=persons.get(chosen_cast[2].person_id, Person(name="?")).name,
+            actor_1_name=persons.get(chosen_ids[0], Person(name="?")).name,
+            actor_2_name=persons.get(chosen_ids[1], Person(name="?")).name,
+            actor_3_name=persons.get(chosen_ids[2], Person(name="?")).name,
             outsider_name=persons.get(outsider.id, Person(name="?")).name,
-            actor_1_profile=persons.get(chosen_cast[0].person_id, Person()).profile_path,
-            actor_2_profile=persons.get(chosen_cast[1].person_id, Person()).profile_path,
-            actor_3_profile=persons.get(chosen_cast[2].person_id, Person()).profile_path,
+            actor_1_profile=persons.get(chosen_ids[0], Person()).profile_path,
+            actor_2_profile=persons.get(chosen_ids[1], Person()).profile_path,
+            actor_3_profile=persons.get(chosen_ids[2], Person()).profile_path,
             outsider_profile=persons.get(outsider.id, Person()).profile_path,
+            difficulty=achieved,
         )
 
     return None
 
 
-def _find_outsider(target_title_id, cast_person_ids, titles_with_cast, used_title_ids):
+def _pick_outsider(tier, title_id, insider_ids, cast_person_ids, titles_with_cast):
+    """Return (outsider, tier achieved), using precomputed co-star overlap.
+
+    hard: one of the top co-stars shared by at least two insiders.
+    medium: a co-star of exactly one insider.
+    easy: someone from another title with no overlap at all.
+    Falls back a tier at a time; with no costar_scores built, every round is easy.
+    """
+    scores = overlap(insider_ids, cast_person_ids)
+    pools = {
+        "hard": sorted((p for p, (linked, _) in scores.items() if linked >= 2),
+                       key=lambda p: scores[p][1], reverse=True)[:3],
+        "medium": [p for p, (linked, _) in scores.items() if linked == 1],
+    }
+    for level in TIERS[TIERS.index(tier):0:-1]:
+        pool = pools[level]
+        random.shuffle(pool)
+        for person_id in pool:
+            person = Person.query.get(person_id)
+            if person:
+                return person, level
+    outsider = _find_outsider(title_id, cast_person_ids | scores.keys(), titles_with_cast)
+    return outsider, "easy"
+
+
+def _find_outsider(target_title_id, cast_person_ids, titles_with_cast):
     """Find an actor from a different title who is NOT in the target title's cast."""
     candidates = [t for t in titles_with_cast if t[0] != target_title_id]
     random.shuffle(candidates)
 
-    for other_title_id, _, _ in candidates[:10]:
-        other_cast = (
-            Credit.query
-            .filter_by(title_id=other_title_id, credit_type="cast")
-            .order_by(Credit.display_order.asc())
-            .limit(10)
-            .all()
-        )
+    for _, _, _, other_cast, _ in candidates[:10]:
+        other_cast = list(other_cast)
         random.shuffle(other_cast)
-        for credit in other_cast:
-            if credit.person_id not in cast_person_ids:
-                person = Person.query.get(credit.person_id)
+        for person_id in other_cast:
+            if person_id not in cast_person_ids:
+                person = Person.query.get(person_id)
                 if person:
                     return person
     return None
@@ -151,6 +182,7 @@ def rounds_to_json(rounds):
         random.shuffle(actors)
         result.append({
             "round_number": r.round_number,
+            "difficulty": r.difficulty,
             "actors": actors,
             "title_name": r.title_name,
             "outsider_id": r.outsider_id,
@@ -0,0 +1,180 @@
+"""Background refresh of aging cache entries.
+
+`flask cache refresh-worker` re-fetches cached titles from TMDB before users
+have to: each batch takes the due titles (cached more than
+REFRESH_MIN_AGE_HOURS ago) that score highest on age weighted by popularity,
+so stale and popular titles go first. Requests are paced to
+REFRESH_REQUESTS_PER_MINUTE, with an optional hard budget per run.
+
+Movies are fetched a batch at a time and written in one transaction with
+save_many(); TV titles are streamed in with _save_streamed(). Either way the
+conditional save rewrites only what changed, and every save moves cached_at
+forward, so the worker keeps no state of its own: a restarted worker resumes
+from the stalest titles left, and re-running a batch is harmless.
+"""
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import Title, TitleStat
+from app.services.metrics import inc, maybe_flush, set_gauge
+
+CANDIDATE_FACTOR = 4  # rows read per due list for each title a batch needs
+
+
+def priority(cached_at, popularity, now):
+    """Hours since `cached_at`, weighted up to ~4x for the most popular titles."""
+    age = (now - cached_at).total_seconds() / 3600
+    return age * (1 + math.log10(1 + (popularity or 0)))
+
+
+def due_titles(limit, now=None, skip=()):
+    """Up to `limit` (id, media_type) pairs to refresh next, highest priority first.
+
+    Two index scans bound the candidates, the stalest titles and the most
+    popular ones past REFRESH_MIN_AGE_HOURS, and the union is ranked in Python.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = now - timedelta(hours=current_app.config["REFRESH_MIN_AGE_HOURS"])
+    window = limit * CANDIDATE_FACTOR + len(skip)
+    stalest, hottest = due_queries(cutoff, window)
+    candidates = {}
+    for row in [*db.session.execute(stalest), *db.session.execute(hottest)]:
+        if row.id not in skip:
+            candidates[row.id] = (priority(row.cached_at, row.popularity, now), row.id, row.media_type)
+    ranked = sorted(candidates.values(), reverse=True)[:limit]
+    return [(title_id, media_type) for _, title_id, media_type in ranked]
+
+
+def due_queries(cutoff, limit):
+    """The stalest and the most popular cached titles last fetched before `cutoff`."""
+    base = (
+        select(Title.id, Title.media_type, Title.cached_at, TitleStat.popularity)
+        .where(Title.credits_cached == True, Title.cached_at < cutoff)  # noqa: E712
+    )
+    stalest = base.outerjoin(TitleStat, TitleStat.title_id == Title.id).order_by(Title.cached_at).limit(limit)
+    hottest = (
+        base.join(TitleStat, TitleStat.title_id == Title.id)
+        .where(TitleStat.popularity.is_not(None))
+        .order_by(TitleStat.popularity.desc())
+        .limit(limit)
+    )
+    return stalest, hottest
+
+
+class Pacer:
+    """Spaces calls `60 / per_minute` seconds apart and stops after `budget` of them."""
+
+    def __init__(self, per_minute, budget=None):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.remaining = budget
+        self._next = time.monotonic()
+
+    @property
+    def exhausted(self):
+        return self.remaining is not None and self.remaining <= 0
+
+    def take(self):
+        """Wait for the next slot and spend one request of the budget."""
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = max(self._next, time.monotonic()) + self.interval
+        if self.remaining is not None:
+            self.remaining -= 1
+
+
+def refresh_batch(titles, pacer, client):
+    """Re-fetch and save `titles` ([(id, media_type)]), one paced request each.
+
+    Stops early if the pacer's budget runs out, or after waiting out the TMDB
+    circuit breaker if it opens. Returns {title_id: mode or "error"} for the
+    titles it got to.
+    """
+    from app.services.cache import _save_streamed
+    from app.services.upstream import UpstreamUnavailable
+
+    results, movies = {}, []
+    # Don't hold a read transaction (and its pooled connection) across the fetches.
+    db.session.rollback()
+    for title_id, media_type in titles:
+        if pacer.exhausted:
+            break
+        pacer.take()
+        try:
+            if media_type == "movie":
+                movies.append(client.get_movie_details(title_id))
+            else:
+                results[title_id] = _save_streamed(title_id, *client.stream_tv_details(title_id))
+        except UpstreamUnavailable as e:  # breaker open: not this title's fault, so not marked failed
+            current_app.logger.warning("TMDB unavailable, pausing refresh: %s", e)
+            time.sleep(e.retry_after or 0)
+            break
+        except Exception as e:  # a bad title mustn't stop the worker; it's skipped for the run
+            current_app.logger.warning("refresh of %s %s failed: %s", media_type, title_id, e)
+            results[title_id] = "error"
+    if movies:
+        results.update(_save_movies(movies))
+    return results
+
+
+def _save_movies(movies):
+    """{title_id: mode} for one batched save, or, if the batch fails, for a save
+    per title with the failing ones marked "error"."""
+    from app.services.cache import save_many
+
+    try:
+        return dict(zip((d["id"] for d in movies), save_many(movies)))
+    except Exception as e:
+        current_app.logger.warning("batched save of %d movie(s) failed, retrying one by one: %s", len(movies), e)
+    results = {}
+    for details in movies:
+        try:
+            results[details["id"]] = save_many([details])[0]
+        except Exception as e:
+            current_app.logger.warning("refresh of movie %s failed: %s", details["id"], e)
+            results[details["id"]] = "error"
+    return results
+
+
+def run(budget=None, once=False, echo=print):
+    """Refresh due titles until the budget is spent (or forever, idling when none are due).
+
+    With `once`, stops as soon as nothing is due. Titles that fail are skipped
+    for the rest of the run. Returns {mode or "error": count}.
+    """
+    from app.services.tmdb import TMDBClient
+
+    config = current_app.config
+    pacer = Pacer(config["REFRESH_REQUESTS_PER_MINUTE"], budget)
+    client = TMDBClient()
+    totals, failed = {}, set()
+    started = time.monotonic()
+    while not pacer.exhausted:
+        titles = due_titles(config["REFRESH_BATCH_SIZE"], skip=failed)
+        if not titles:
+            if once:
+                break
+            db.session.rollback()
+            time.sleep(config["REFRESH_IDLE_SECONDS"])
+            continue
+        results = refresh_batch(titles, pacer, client)
+        for title_id, mode in results.items():
+            totals[mode] = totals.get(mode, 0) + 1
+            inc("refresh_worker_titles_total", result=mode)
+            if mode == "error":
+                failed.add(title_id)
+        refreshed = sum(n for mode, n in totals.items() if mode != "error")
+        per_minute = refreshed / max(time.monotonic() - started, 1e-9) * 60
+        set_gauge("refresh_worker_titles_per_minute", per_minute)
+        maybe_flush(force=True)
+        echo(f"{refreshed} title(s) refreshed ({_summary(totals)}), {per_minute:.1f}/min")
+    return totals
+
+
+def _summary(totals):
+    return ", ".join(f"{mode} {totals[mode]}" for mode in ("noop", "diff", "full", "error") if mode in totals)
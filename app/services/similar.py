@@ -0,0 +1,189 @@
+"""Precomputed "most connected titles": each title's TOP_K biggest overlaps.
+
+`flask cache similar` loads every cached title's credits into the cast and
+crew incidence matrices of batch_compare (C and R, titles × persons) and
+counts every title pair's overlap the way find_shared() does, in blocks of
+titles:
+
+    shared cast  = C·Cᵀ
+    shared crew  = R·Rᵀ − B·Bᵀ   where B = C ∘ R (crew who are also cast)
+
+Each title keeps its TOP_K largest totals in similar_titles, so /similar/<id>
+is one primary-key range read.
+
+Titles saved afterwards are folded in by update_titles(): the new title's
+overlaps come from its people's filmographies, and it is added to the list
+of every title it now beats. Overlaps that shrink on a refresh are only
+corrected by the next full build.
+"""
+import time
+
+import numpy as np
+from sqlalchemy import delete, select, tuple_
+
+from app import db
+from app.engine import write_transaction
+from app.models import Credit, SimilarTitle, Title
+from app.services.transfer import copy_rows
+
+TOP_K = 20
+BLOCK = 2000
+WRITE_BATCH = 50000
+LOOKUP_BATCH = 1000
+COLUMNS = ["title_id", "similar_id", "shared_cast", "shared_crew", "shared_total"]
+
+
+def _top(row_totals, row_ids, top_k):
+    """Positions of the `top_k` largest totals, ties broken by lower ID."""
+    return np.lexsort((row_ids, -row_totals))[:top_k]
+
+
+def _row_values(m, row, cols):
+    """m[row, cols] as a dense vector, for a CSR matrix with sorted indices."""
+    begin, end = m.indptr[row], m.indptr[row + 1]
+    indices, data = m.indices[begin:end], m.data[begin:end]
+    if not len(indices):
+        return np.zeros(len(cols), dtype=m.dtype)
+    pos = np.minimum(np.searchsorted(indices, cols), len(indices) - 1)
+    return np.where(indices[pos] == cols, data[pos], 0)
+
+
+def build(top_k=TOP_K, block=BLOCK):
+    """Recompute similar_titles from the credits table. Returns (titles, pairs, seconds)."""
+    from app.services.batch_compare import IncidenceMatrix
+
+    start = time.perf_counter()
+    titles = dict(db.session.execute(
+        select(Title.id, Title.media_type).where(Title.credits_cached == True)  # noqa: E712
+    ).all())
+    matrix, _ = IncidenceMatrix.load(titles)
+    title_ids = np.asarray(sorted(matrix.rows, key=matrix.rows.get), dtype=np.int64)
+    cast, crew = matrix.cast, matrix.crew
+    both = cast.multiply(crew).tocsr()
+    cast_t, crew_t, both_t = cast.T.tocsr(), crew.T.tocsr(), both.T.tocsr()
+
+    sources, targets, cast_counts, crew_counts = [], [], [], []
+    for lo in range(0, len(title_ids), block):
+        hi = min(lo + block, len(title_ids))
+        shared_cast = (cast[lo:hi] @ cast_t).tocsr()
+        shared_cast.sort_indices()
+        total = (shared_cast + crew[lo:hi] @ crew_t - both[lo:hi] @ both_t).tocsr()
+        total.setdiag(0, k=lo)
+        total.eliminate_zeros()
+        for t in range(total.shape[0]):
+            begin, end = total.indptr[t], total.indptr[t + 1]
+            if begin == end:
+                continue
+            others = total.indices[begin:end]
+            keep = _top(total.data[begin:end], title_ids[others], top_k)
+            others, totals = others[keep], total.data[begin:end][keep]
+            shared = _row_values(shared_cast, t, others)
+            sources.append(np.full(len(others), title_ids[lo + t]))
+            targets.append(title_ids[others])
+            cast_counts.append(shared)
+            crew_counts.append(totals - shared)
+
+    pairs = sum(len(t) for t in targets)
+    columns = [np.concatenate(c) if c else np.empty(0, dtype=np.int64)
+               for c in (sources, targets, cast_counts, crew_counts)]
+    columns.append(columns[2] + columns[3])
+    with write_transaction() as session:
+        session.execute(delete(SimilarTitle))
+        for lo in range(0, pairs, WRITE_BATCH):
+            copy_rows(session.connection(), SimilarTitle.__table__, COLUMNS,
+                      zip(*(c[lo:lo + WRITE_BATCH].tolist() for c in columns)))
+    return len(title_ids), pairs, time.perf_counter() - start
+
+
+def _overlaps(title_id):
+    """{other title ID: (shared cast, shared crew)} for one title, from its people's filmographies."""
+    people = {}
+    for credit_type, person_id in db.session.execute(
+        select(Credit.credit_type, Credit.person_id).where(Credit.title_id == title_id)
+    ):
+        people.setdefault(person_id, set()).add(credit_type)
+
+    # {other title: {person: credit types there}}
+    shared = {}
+    ids = list(people)
+    for lo in range(0, len(ids), LOOKUP_BATCH):
+        for person_id, credit_type, other in db.session.execute(
+            select(Credit.person_id, Credit.credit_type, Credit.title_id)
+            .where(Credit.person_id.in_(ids[lo:lo + LOOKUP_BATCH]), Credit.title_id != title_id)
+        ):
+            if credit_type in people[person_id]:
+                shared.setdefault(other, {}).setdefault(person_id, set()).add(credit_type)
+
+    overlaps = {}
+    for other, persons in shared.items():
+        cast = sum(1 for types in persons.values() if "cast" in types)
+        overlaps[other] = (cast, len(persons) - cast)
+    return overlaps
+
+
+def update_titles(title_ids, top_k=TOP_K):
+    """Fold freshly saved titles into similar_titles without a full rebuild.
+
+    Each title's own list is replaced, and the title is added to (or updated
+    in) the list of every title it now overlaps more than that list's
+    weakest entry, which is dropped if the list is over `top_k`.
+    """
+    from app.services.cache import _upsert
+
+    cached = set(db.session.scalars(
+        select(Title.id).where(Title.id.in_(list(title_ids)), Title.credits_cached == True)  # noqa: E712
+    ))
+    updates = {title_id: _overlaps(title_id) for title_id in title_ids if title_id in cached}
+    if not updates:
+        return
+
+    with write_transaction() as session:
+        for title_id, overlaps in updates.items():
+            others = np.asarray(list(overlaps), dtype=np.int64)
+            counts = np.asarray(list(overlaps.values()), dtype=np.int64).reshape(-1, 2)
+            totals = counts.sum(axis=1)
+            keep = _top(totals, others, top_k)
+            session.execute(delete(SimilarTitle).where(SimilarTitle.title_id == title_id))
+            if len(keep):
+                session.execute(SimilarTitle.__table__.insert(), [
+                    {"title_id": title_id, "similar_id": int(others[i]), "shared_cast": int(counts[i, 0]),
+                     "shared_crew": int(counts[i, 1]), "shared_total": int(totals[i])}
+                    for i in keep
+                ])
+
+            lists = {}
+            ids = others.tolist()
+            for lo in range(0, len(ids), LOOKUP_BATCH):
+                for row in session.execute(
+                    select(SimilarTitle.title_id, SimilarTitle.similar_id, SimilarTitle.shared_total)
+                    .where(SimilarTitle.title_id.in_(ids[lo:lo + LOOKUP_BATCH]))
+                ):
+                    lists.setdefault(row.title_id, []).append((row.shared_total, row.similar_id))
+            rows, stale = [], []
+            for other, (cast, crew) in overlaps.items():
+                entries = [e for e in lists.get(other, []) if e[1] != title_id]
+                entries.append((cast + crew, title_id))
+                entries.sort(key=lambda e: (-e[0], e[1]))
+                if (cast + crew, title_id) in entries[:top_k]:
+                    rows.append({"title_id": other, "similar_id": title_id, "shared_cast": cast,
+                                 "shared_crew": crew, "shared_total": cast + crew})
+                    stale.extend((other, similar_id) for _, similar_id in entries[top_k:])
+                elif any(e[1] == title_id for e in lists.get(other, [])):
+                    stale.append((other, title_id))
+            for lo in range(0, len(stale), LOOKUP_BATCH):
+                session.execute(delete(SimilarTitle).where(
+                    tuple_(SimilarTitle.title_id, SimilarTitle.similar_id).in_(stale[lo:lo + LOOKUP_BATCH])
+                ))
+            for lo in range(0, len(rows), WRITE_BATCH):
+                _upsert(SimilarTitle, rows[lo:lo + WRITE_BATCH], key=("title_id", "similar_id"))
+
+
+def similar_titles(title_id, limit=TOP_K):
+    """[(SimilarTitle, Title)] for a title, biggest overlap first."""
+    return db.session.execute(
+        select(SimilarTitle, Title)
+        .join(Title, Title.id == SimilarTitle.similar_id)
+        .where(SimilarTitle.title_id == title_id)
+        .order_by(SimilarTitle.shared_total.desc(), SimilarTitle.similar_id)
+        .limit(limit)
+    ).all()
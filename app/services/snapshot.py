@@ -0,0 +1,320 @@
+"""Read-only columnar snapshot of the credits cache.
+
+`flask cache compile` exports every cached title's credits into one flat file:
+int32 columns for title, person, order and role, plus an interned string
+table. Workers mmap the file and serve cached reads straight out of it, so the
+hot path never builds ORM objects. Titles cached after the snapshot was
+compiled with different credits (their version differs) fall back to the
+database. A refresh that changes nothing keeps the version, so it doesn't
+push the title off the snapshot.
+
+Layout (little-endian, each section padded to 8 bytes):
+
+    header      magic, n_titles, n_credits, n_persons, n_strings, compiled_at
+    titles      id[i4], first_credit[i4], credit_count[i4], version[i8]
+    credits     person_id[i4], order[i4], kind[b], role[i4], department[i4]
+    persons     id[i4], name[i4], profile_path[i4], known_for_department[i4]
+    strings     offsets[i4 x n_strings+1], utf-8 blob
+
+Credits are grouped by title and sorted cast-first by billing order, so one
+title is a contiguous slice. String columns hold string-table indexes (-1 for
+NULL).
+"""
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from datetime import timezone
+
+from flask import current_app
+from sqlalchemy import case, func, select
+
+from app import db
+from app.models import Credit, Person, Title
+
+MAGIC = b"SCSNAP02"
+HEADER = struct.Struct("<8s4Id")
+KIND_CAST = 0
+KIND_CREW = 1
+NO_STRING = -1
+NO_ORDER = 999
+
+_snapshot = None
+_snapshot_key = None
+
+
+def _epoch(dt):
+    if dt is None:
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def credits_version(credits_hash, cached_at):
+    """The key a title's snapshot slice is checked against: its credits fingerprint,
+    or cached_at for rows saved before fingerprints existed (negative, so they can't collide)."""
+    if credits_hash:
+        return int(credits_hash[:15], 16)
+    return -round(_epoch(cached_at) * 1000)
+
+
+def _pad(n):
+    return (8 - n % 8) % 8
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value):
+        if value is None:
+            return NO_STRING
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return sid
+
+
+def compile_snapshot(path):
+    """Export all cached credits to `path`. Returns (titles, credits, persons) counts."""
+    strings = _StringTable()
+    title_ids, title_start, title_count, title_version = array("i"), array("i"), array("i"), array("q")
+    c_person, c_order, c_kind, c_role, c_dept = array("i"), array("i"), array("b"), array("i"), array("i")
+
+    titles = db.session.execute(
+        select(Title.id, Title.credits_hash, Title.cached_at)
+        .where(Title.credits_cached == True).order_by(Title.id)  # noqa: E712
+    ).all()
+    versions = {t.id: credits_version(t.credits_hash, t.cached_at) for t in titles}
+
+    kind = case((Credit.credit_type == "cast", KIND_CAST), else_=KIND_CREW)
+    order = func.coalesce(Credit.display_order, NO_ORDER)
+    rows = db.session.execute(
+        select(Credit.title_id, Credit.person_id, kind, order, Credit.character, Credit.job, Credit.department)
+        .join(Person, Person.id == Credit.person_id)
+        .join(Title, Title.id == Credit.title_id)
+        .where(Title.credits_cached == True)  # noqa: E712
+        .order_by(Credit.title_id, kind, order, Credit.id)
+        .execution_options(yield_per=10000)
+    )
+
+    person_ids = set()
+    current = None
+    for title_id, person_id, k, o, character, job, department in rows:
+        if title_id != current:
+            current = title_id
+            title_ids.append(title_id)
+            title_start.append(len(c_person))
+            title_count.append(0)
+            title_version.append(versions[title_id])
+        title_count[-1] += 1
+        c_person.append(person_id)
+        c_kind.append(k)
+        if k == KIND_CAST:
+            c_order.append(o)
+            c_role.append(strings.intern(character or ""))
+            c_dept.append(NO_STRING)
+        else:
+            c_order.append(NO_ORDER)
+            c_role.append(strings.intern(job or ""))
+            c_dept.append(strings.intern(department or ""))
+        person_ids.add(person_id)
+
+    # Titles with no credits still belong in the snapshot, as empty slices.
+    missing = sorted(set(versions) - set(title_ids))
+    if missing:
+        merged = sorted(
+            list(zip(title_ids, title_start, title_count, title_version))
+            + [(tid, len(c_person), 0, versions[tid]) for tid in missing]
+        )
+        title_ids = array("i", (m[0] for m in merged))
+        title_start = array("i", (m[1] for m in merged))
+        title_count = array("i", (m[2] for m in merged))
+        title_version = array("q", (m[3] for m in merged))
+
+    p_ids, p_name, p_profile, p_kfd = array("i"), array("i"), array("i"), array("i")
+    persons = db.session.execute(
+        select(Person.id, Person.name, Person.profile_path, Person.known_for_department)
+        .order_by(Person.id)
+        .execution_options(yield_per=10000)
+    )
+    for pid, name, profile_path, kfd in persons:
+        if pid not in person_ids:
+            continue
+        p_ids.append(pid)
+        p_name.append(strings.intern(name))
+        p_profile.append(strings.intern(profile_path))
+        p_kfd.append(strings.intern(kfd))
+
+    blob = bytearray()
+    offsets = array("i", [0])
+    for value in strings.values:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+
+    sections = [
+        title_ids, title_start, title_count, title_version,
+        c_person, c_order, c_kind, c_role, c_dept,
+        p_ids, p_name, p_profile, p_kfd,
+        offsets,
+    ]
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(title_ids), len(c_person), len(p_ids), len(strings.values), time.time()))
+        f.write(b"\0" * _pad(HEADER.size))
+        for section in sections:
+            data = section.tobytes()
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return len(title_ids), len(c_person), len(p_ids)
+
+
+class CreditSnapshot:
+    """Zero-copy view over a compiled snapshot file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, n_titles, n_credits, n_persons, n_strings, self.compiled_at = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a credit snapshot")
+
+        offset = HEADER.size + _pad(HEADER.size)
+
+        def column(fmt, count):
+            nonlocal offset
+            size = struct.calcsize(fmt) * count
+            col = view[offset:offset + size].cast(fmt)
+            offset += size + _pad(size)
+            return col
+
+        self.title_ids = column("i", n_titles)
+        self._title_start = column("i", n_titles)
+        self._title_count = column("i", n_titles)
+        self._title_version = column("q", n_titles)
+        self._person = column("i", n_credits)
+        self._order = column("i", n_credits)
+        self._kind = column("b", n_credits)
+        self._role = column("i", n_credits)
+        self._dept = column("i", n_credits)
+        self.person_ids = column("i", n_persons)
+        self._person_name = column("i", n_persons)
+        self._person_profile = column("i", n_persons)
+        self._person_kfd = column("i", n_persons)
+        self._string_offsets = column("i", n_strings + 1)
+        self._blob = view[offset:]
+
+    def _string(self, sid):
+        if sid == NO_STRING:
+            return None
+        return str(self._blob[self._string_offsets[sid]:self._string_offsets[sid + 1]], "utf-8")
+
+    def _title_index(self, title_id):
+        i = bisect_left(self.title_ids, title_id)
+        if i < len(self.title_ids) and self.title_ids[i] == title_id:
+            return i
+        return None
+
+    def credit_range(self, title_id, version=None):
+        """Return the (start, stop) credit slice for a title, or None if it's
+        missing or the DB copy's credits_version() differs from the snapshot's."""
+        i = self._title_index(title_id)
+        if i is None:
+            return None
+        if version is not None and self._title_version[i] != version:
+            return None
+        start = self._title_start[i]
+        return start, start + self._title_count[i]
+
+    def load_credits(self, title_id, version=None):
+        """Return (cast, crew) in the _load_from_db format, or None on a miss."""
+        span = self.credit_range(title_id, version)
+        if span is None:
+            return None
+        cast = []
+        crew = []
+        for c in range(*span):
+            entry = self.entry(c)
+            (cast if entry["credit_type"] == "cast" else crew).append(entry)
+        return cast, crew
+
+    def credit_vectors(self, title_id, version=None):
+        """Return a SnapshotCredits view of one title, or None on a miss."""
+        span = self.credit_range(title_id, version)
+        if span is None:
+            return None
+        start, stop = span
+        split = start + bisect_left(self._kind[start:stop], KIND_CREW)
+        return SnapshotCredits(self, start, split, stop)
+
+    def entry(self, c):
+        """Materialize credit row `c` as a dict in the _load_from_db format."""
+        person_id = self._person[c]
+        p = bisect_left(self.person_ids, person_id)
+        entry = {
+            "person_id": person_id,
+            "name": self._string(self._person_name[p]),
+            "profile_path": self._string(self._person_profile[p]),
+            "known_for_department": self._string(self._person_kfd[p]),
+        }
+        if self._kind[c] == KIND_CAST:
+            entry["credit_type"] = "cast"
+            entry["character"] = self._string(self._role[c])
+            entry["display_order"] = self._order[c]
+        else:
+            entry["credit_type"] = "crew"
+            entry["job"] = self._string(self._role[c])
+            entry["department"] = self._string(self._dept[c])
+        return entry
+
+
+class SnapshotCredits:
+    """One title's cast/crew person IDs as int32 arrays over the mmap'd columns."""
+
+    def __init__(self, snapshot, start, split, stop):
+        import numpy as np  # off the boot path: cache imports this module, and fragments imports cache
+
+        self._snapshot = snapshot
+        self._cast_start = start
+        self._crew_start = split
+        self.cast_ids = np.frombuffer(snapshot._person, dtype=np.int32, count=split - start, offset=start * 4)
+        self.crew_ids = np.frombuffer(snapshot._person, dtype=np.int32, count=stop - split, offset=split * 4)
+
+    def cast_entry(self, i):
+        return self._snapshot.entry(self._cast_start + i)
+
+    def crew_entry(self, i):
+        return self._snapshot.entry(self._crew_start + i)
+
+
+def snapshot_path():
+    return current_app.config["CREDIT_SNAPSHOT_PATH"] or os.path.join(current_app.instance_path, "credits.snap")
+
+
+def get_snapshot():
+    """Return this worker's snapshot, reopening it if the file was recompiled."""
+    global _snapshot, _snapshot_key
+    path = snapshot_path()
+    try:
+        st = os.stat(path)
+    except OSError:
+        _snapshot = _snapshot_key = None
+        return None
+    key = (path, st.st_mtime_ns, st.st_size)
+    if key != _snapshot_key:
+        try:
+            _snapshot = CreditSnapshot(path)
+        except ValueError as e:  # e.g. compiled by an older release; serve from the DB until recompiled
+            current_app.logger.warning("ignoring credit snapshot: %s", e)
+            _snapshot = None
+        _snapshot_key = key
+    return _snapshot
@@ -0,0 +1,92 @@
+"""Homepage rendering without a database read per hit.
+
+The homepage only varies with the active suggestions. Each worker renders the
+page once and keeps the HTML and its ETag, keyed by the active suggestions
+themselves. Those are re-read from the database at most every
+SUGGESTIONS_DB_CHECK_SECONDS, which is how a change made on another instance
+(or straight in the database) reaches this one. The CLI commands that write
+suggestions also call bump_version(), which rewrites a small version file;
+workers stat it on every hit, the way get_snapshot() watches the credit
+snapshot, and re-read at once when it changes, so on a single host the page
+updates on the next request.
+
+Browsers revalidate with If-None-Match and get a 304 while the page is the
+same.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import current_app, render_template
+
+from app.services.fragments import template_version
+from app.services.metrics import inc
+
+TEMPLATES = ("index.html", "base.html")
+
+_page = None  # (key, html, etag)
+_page_lock = threading.Lock()
+_suggestions = None  # (checked_at, file version, active suggestions JSON)
+
+
+def version_path():
+    return current_app.config["SUGGESTIONS_VERSION_PATH"] or os.path.join(
+        current_app.instance_path, "suggestions.version")
+
+
+def bump_version():
+    """Tell every worker to re-render the homepage (call after committing suggestion changes)."""
+    path = version_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+
+
+def _version():
+    try:
+        st = os.stat(version_path())
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def active_suggestions_json():
+    from app.models import Suggestion
+
+    rows = Suggestion.query.filter_by(active=True).order_by(Suggestion.id).all()
+    return json.dumps([s.to_dict() for s in rows])
+
+
+def _active_suggestions():
+    """The active suggestions as JSON, re-read when the version file changes or the last read is stale."""
+    global _suggestions
+    version = _version()
+    now = time.monotonic()
+    state = _suggestions
+    if (state is None or state[1] != version
+            or now - state[0] >= current_app.config["SUGGESTIONS_DB_CHECK_SECONDS"]):
+        state = _suggestions = (now, version, active_suggestions_json())
+    return state[2]
+
+
+def homepage():
+    """(html, etag) of the homepage, rendered at most once per set of active suggestions."""
+    global _page
+    suggestions_json = _active_suggestions()
+    key = (suggestions_json, template_version(TEMPLATES))
+    page = _page
+    if page is not None and page[0] == key:
+        inc("homepage_renders_total", result="hit")
+        return page[1], page[2]
+    with _page_lock:
+        if _page is None or _page[0] != key:
+            inc("homepage_renders_total", result="miss")
+            html = render_template("index.html", suggestions_json=suggestions_json)
+            _page = (key, html, hashlib.sha1(html.encode()).hexdigest()[:16])
+        else:
+            inc("homepage_renders_total", result="hit")
+        return _page[1], _page[2]
@@ -0,0 +1,146 @@
+"""Per-title credit statistics for puzzle generation.
+
+_save_to_db() upserts a title's row from the details it is already writing,
+so picking puzzle candidates is an index range scan on title_stats instead of
+a GROUP BY over the whole credits table.
+"""
+import math
+import random
+from datetime import datetime, timezone
+from itertools import groupby
+
+from sqlalchemy import select
+
+from app import db
+from app.models import Credit, Title, TitleStat
+
+TOP_CAST = 10
+REBUILD_BATCH = 1000
+
+
+def difficulty(popularity):
+    """Map TMDB popularity to 0.0 (blockbuster, ~1000+) .. 1.0 (obscure, ~0)."""
+    if popularity is None:
+        return None
+    return round(max(0.0, 1.0 - math.log10(1 + popularity) / 3), 3)
+
+
+def _billing(entry):
+    return 999 if entry.get("display_order") is None else entry["display_order"]
+
+
+def _top_cast(cast):
+    """Person IDs of the first TOP_CAST distinct cast members by billing order."""
+    top = []
+    for entry in sorted(cast, key=_billing):
+        if entry["person_id"] not in top:
+            top.append(entry["person_id"])
+            if len(top) == TOP_CAST:
+                break
+    return top
+
+
+def stats_row(details, now):
+    """The title_stats row for a details dict about to be saved."""
+    popularity = details.get("popularity")
+    return {
+        "title_id": details["id"],
+        "cast_count": len(details.get("cast", [])),
+        "crew_count": len(details.get("crew", [])),
+        "top_cast_ids": _top_cast(details.get("cast", [])),
+        "popularity": popularity,
+        "difficulty": difficulty(popularity),
+        "updated_at": now,
+    }
+
+
+class StreamedStats:
+    """Builds a title's stats row from credits seen a batch at a time.
+
+    Only the current top TOP_CAST cast entries are kept, so a streamed title
+    with thousands of credits needs no more memory than a small one.
+    """
+
+    def __init__(self):
+        self.cast_count = 0
+        self.crew_count = 0
+        self._top = []
+
+    def add(self, entries):
+        cast = [{"person_id": e["person_id"], "display_order": e.get("display_order")}
+                for e in entries if e["credit_type"] == "cast"]
+        self.cast_count += len(cast)
+        self.crew_count += len(entries) - len(cast)
+        top, seen = [], set()
+        for entry in sorted(self._top + cast, key=_billing):
+            if entry["person_id"] not in seen:
+                seen.add(entry["person_id"])
+                top.append(entry)
+                if len(top) == TOP_CAST:
+                    break
+        self._top = top
+
+    def row(self, details, now):
+        row = stats_row(dict(details, cast=self._top, crew=()), now)
+        row.update(cast_count=self.cast_count, crew_count=self.crew_count)
+        return row
+
+
+def sample_query(columns, min_cast, start, limit, before=False):
+    """Cached titles with `min_cast`+ cast from `start` on in sample_key order (before it, to wrap around)."""
+    in_window = TitleStat.sample_key < start if before else TitleStat.sample_key >= start
+    return (
+        select(*columns)
+        .join(TitleStat, TitleStat.title_id == Title.id)
+        .where(in_window, Title.credits_cached == True, TitleStat.cast_count >= min_cast)  # noqa: E712
+        .order_by(TitleStat.sample_key)
+        .limit(limit)
+    )
+
+
+def sample_titles(columns, min_cast, n):
+    """A random sample of `n` eligible titles, read in index order instead of sorting by random().
+
+    Each row's sample_key is a random number fixed when it is inserted, so the
+    rows following a random start form a random sample; the read stops after
+    `n` of them, wrapping around to the start of the index if it runs out.
+    """
+    start = random.random()
+    rows = db.session.execute(sample_query(columns, min_cast, start, n)).all()
+    if len(rows) < n:
+        rows += db.session.execute(sample_query(columns, min_cast, start, n - len(rows), before=True)).all()
+    return rows
+
+
+def rebuild(session):
+    """Recompute counts and top cast for every cached title from the credits table.
+
+    Popularity is not in the credits, so existing values are kept. Returns the
+    number of rows written.
+    """
+    from app.services.cache import _upsert
+
+    now = datetime.now(timezone.utc)
+    rows = session.execute(
+        select(Credit.title_id, Credit.credit_type, Credit.person_id, Credit.display_order)
+        .join(Title, Title.id == Credit.title_id)
+        .where(Title.credits_cached == True)  # noqa: E712
+        .order_by(Credit.title_id)
+        .execution_options(yield_per=10000)
+    )
+    batch, written = [], 0
+    for title_id, credits in groupby(rows, key=lambda r: r.title_id):
+        cast, crew = [], 0
+        for row in credits:
+            if row.credit_type == "cast":
+                cast.append({"person_id": row.person_id, "display_order": row.display_order})
+            else:
+                crew += 1
+        batch.append({"title_id": title_id, "cast_count": len(cast), "crew_count": crew,
+                      "top_cast_ids": _top_cast(cast), "updated_at": now})
+        if len(batch) == REBUILD_BATCH:
+            _upsert(TitleStat, batch, key="title_id")
+            written += len(batch)
+            batch = []
+    _upsert(TitleStat, batch, key="title_id")
+    return written + len(batch)
@@ -1,6 +1,60 @@
-import requests
+import tempfile
+
 from flask import current_app
 
+from app.services.http import get_session
+from app.services.metrics import timed
+from app.services.upstream import check_deadline, deadline_timeouts, get_breaker, request_timeout
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _endpoint_label(endpoint):
+    """'movie/27205' -> 'movie/{id}', so metrics don't get a series per title."""
+    return "/".join("{id}" if part.isdigit() else part for part in endpoint.split("/"))
+
+
+def _top_level_fields(ijson, fp):
+    """The top-level scalar fields of a JSON object in `fp`.
+
+    TMDB appends aggregate_credits after the show's own fields, so the parse
+    normally stops there; if anything follows it, the whole body is scanned.
+    """
+    fields = {}
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if prefix == "aggregate_credits" and event == "start_map":
+            if "id" in fields:
+                return fields
+        elif "." not in prefix and event in ("string", "number", "boolean", "null"):
+            fields[prefix] = value
+    return fields
+
+
+class StreamedCredits:
+    """The normalized cast then crew entries of a spooled tv/<id> body.
+
+    Each iteration re-parses the spool from the start, so the credits can be
+    read more than once without ever being held in memory. close() discards
+    the spool.
+    """
+
+    def __init__(self, client, fp):
+        self._client = client
+        self._fp = fp
+
+    def __iter__(self):
+        import ijson
+
+        # One pass per list: ijson's C backend builds each item itself, which
+        # is several times faster than handling every parse event in Python.
+        for credit_type in ("cast", "crew"):
+            self._fp.seek(0)
+            for member in ijson.items(self._fp, f"aggregate_credits.{credit_type}.item", use_float=True):
+                yield self._client._normalize_member(member, "tv", credit_type)
+
+    def close(self):
+        self._fp.close()
+
 
 class TMDBClient:
     def __init__(self):
@@ -12,9 +66,11 @@ class TMDBClient:
         params = params or {}
         params["api_key"] = self.api_key
         url = f"{self.base_url}/{endpoint}"
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
+        with get_breaker().guard(), timed("tmdb_request_seconds", endpoint=_endpoint_label(endpoint)), \
+                deadline_timeouts():
+            resp = get_session().get(url, params=params, timeout=request_timeout(10))
+            resp.raise_for_status()
+            return resp.json()
 
     def search_multi(self, query):
         """Search for movies and TV shows together."""
@@ -31,10 +87,33 @@ class TMDBClient:
         data = self._get(f"movie/{movie_id}", {"append_to_response": "credits"})
         return self._normalize_details(data, "movie")
 
-    def get_tv_details(self, tv_id):
-        """Get TV show details with aggregate credits (all seasons)."""
-        data = self._get(f"tv/{tv_id}", {"append_to_response": "aggregate_credits"})
-        return self._normalize_details(data, "tv")
+    def stream_tv_details(self, tv_id):
+        """Get TV show details with aggregate credits (all seasons), without building the whole payload in memory.
+
+        Long-running shows return aggregate_credits of several megabytes. The
+        body is spooled to a temporary file (in memory up to STREAM_SPOOL_BYTES)
+        and parsed incrementally. Returns (details, records): `details` holds
+        the title fields (no cast/crew), and `records` is a StreamedCredits
+        that yields normalized cast entries then crew entries one at a time.
+        """
+        import ijson  # only long TV payloads take this path
+
+        spool = tempfile.SpooledTemporaryFile(max_size=current_app.config["STREAM_SPOOL_BYTES"])
+        params = {"append_to_response": "aggregate_credits", "api_key": self.api_key}
+        try:
+            with get_breaker().guard(), timed("tmdb_request_seconds", endpoint="tv/{id}"), deadline_timeouts():
+                with get_session().get(f"{self.base_url}/tv/{tv_id}", params=params, timeout=request_timeout(10),
+                                       stream=True) as resp:
+                    resp.raise_for_status()
+                    for chunk in resp.iter_content(STREAM_CHUNK_BYTES):
+                        spool.write(chunk)
+                        check_deadline()
+            spool.seek(0)
+            details = self._normalize_title(_top_level_fields(ijson, spool), "tv")
+        except BaseException:
+            spool.close()
+            raise
+        return details, StreamedCredits(self, spool)
 
     def get_image_url(self, path, size="w500"):
         """Construct full TMDB image URL."""
@@ -63,27 +142,42 @@ class TMDBClient:
         }
 
     def _normalize_details(self, data, media_type):
+        credits_data = data.get("credits" if media_type == "movie" else "aggregate_credits", {})
+        details = self._normalize_title(data, media_type)
+        details["cast"] = [self._normalize_member(m, media_type, "cast") for m in credits_data.get("cast", [])]
+        details["crew"] = [self._normalize_member(m, media_type, "crew") for m in credits_data.get("crew", [])]
+        return details
+
+    def _normalize_title(self, data, media_type):
         if media_type == "movie":
             title = data.get("title", "")
             date = data.get("release_date", "")
-            credits_data = data.get("credits", {})
         else:
             title = data.get("name", "")
             date = data.get("first_air_date", "")
-            credits_data = data.get("aggregate_credits", {})
 
         year = int(date[:4]) if date and len(date) >= 4 else None
 
-        cast = []
-        for member in credits_data.get("cast", []):
-            entry = {
-                "person_id": member["id"],
-                "name": member.get("name", ""),
-                "profile_path": member.get("profile_path"),
-                "known_for_department": member.get("known_for_department"),
-                "credit_type": "cast",
-                "display_order": member.get("order", 999),
-            }
+        return {
+            "id": data["id"],
+            "media_type": media_type,
+            "title": title,
+            "release_year": year,
+            "overview": data.get("overview", ""),
+            "poster_path": data.get("poster_path"),
+            "popularity": data.get("popularity"),
+        }
+
+    def _normalize_member(self, member, media_type, credit_type):
+        entry = {
+            "person_id": member["id"],
+            "name": member.get("name", ""),
+            "profile_path": member.get("profile_path"),
+            "known_for_department": member.get("known_for_department"),
+            "credit_type": credit_type,
+        }
+        if credit_type == "cast":
+            entry["display_order"] = member.get("order", 999)
             # TV aggregate_credits nests roles differently
             if media_type == "tv":
                 roles = member.get("roles", [])
@@ -91,34 +185,12 @@ class TMDBClient:
                 entry["character"] = " / ".join(characters) if characters else ""
             else:
                 entry["character"] = member.get("character", "")
-            cast.append(entry)
-
-        crew = []
-        for member in credits_data.get("crew", []):
-            entry = {
-                "person_id": member["id"],
-                "name": member.get("name", ""),
-                "profile_path": member.get("profile_path"),
-                "known_for_department": member.get("known_for_department"),
-                "credit_type": "crew",
-            }
+        else:
             if media_type == "tv":
                 jobs = member.get("jobs", [])
                 job_names = [j.get("job", "") for j in jobs if j.get("job")]
                 entry["job"] = " / ".join(job_names) if job_names else ""
-                entry["department"] = member.get("department", "")
             else:
                 entry["job"] = member.get("job", "")
-                entry["department"] = member.get("department", "")
-            crew.append(entry)
-
-        return {
-            "id": data["id"],
-            "media_type": media_type,
-            "title": title,
-            "release_year": year,
-            "overview": data.get("overview", ""),
-            "poster_path": data.get("poster_path"),
-            "cast": cast,
-            "crew": crew,
-        }
+            entry["department"] = member.get("department", "")
+        return entry
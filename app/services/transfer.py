@@ -0,0 +1,105 @@
+"""Bulk loading: COPY into Postgres, and the one-shot SQLite → Postgres mover.
+
+    flask --app wsgi db migrate-sqlite-to-postgres instance/samecast.db
+
+runs against the app's configured (Postgres) DATABASE_URL: it applies the
+schema migrations, then streams every table out of the SQLite file in
+batches and loads each batch with COPY.
+"""
+import json
+import os
+
+import sqlalchemy as sa
+from sqlalchemy import func, select, text
+
+from app import db
+from app.migrations import upgrade
+
+# Parents before children, so foreign keys hold at every step.
+TABLES = ("titles", "persons", "credits", "title_stats", "costar_scores", "suggestions", "oddoneout_rounds",
+          "daily_pairs", "whoami_puzzles", "similar_titles")
+
+
+def copy_rows(connection, table, columns, rows):
+    """Bulk-load `rows` (tuples in `columns` order) into `table` on `connection`.
+
+    Postgres streams them through COPY ... FROM STDIN inside the connection's
+    current transaction; other backends fall back to an executemany INSERT.
+    Returns the number of rows written.
+    """
+    if connection.dialect.name != "postgresql":
+        params = [dict(zip(columns, row)) for row in rows]
+        if params:
+            connection.execute(table.insert(), params)
+        return len(params)
+
+    written = 0
+    names = ", ".join(f'"{c}"' for c in columns)
+    # COPY takes JSON columns as text; everything else adapts as-is.
+    json_columns = [i for i, c in enumerate(columns) if isinstance(table.c[c].type, sa.JSON)]
+    raw = connection.connection.driver_connection
+    with raw.cursor() as cursor, cursor.copy(f'COPY "{table.name}" ({names}) FROM STDIN') as copy:
+        for row in rows:
+            if json_columns:
+                row = list(row)
+                for i in json_columns:
+                    row[i] = None if row[i] is None else json.dumps(row[i])
+            copy.write_row(row)
+            written += 1
+    return written
+
+
+def migrate_sqlite_to_postgres(source_path, batch_size=5000, truncate=False, progress=None):
+    """Copy every table from the SQLite file at `source_path` into the app's database.
+
+    Refuses to load into non-empty tables unless `truncate` is set. Each table
+    is copied in one transaction; `progress(table, rows_so_far)` is called
+    after every batch. Returns [(table, rows)].
+    """
+    from app import models  # noqa: F401
+
+    target = db.engine
+    if target.dialect.name != "postgresql":
+        raise ValueError(f"DATABASE_URL must point at Postgres, not {target.dialect.name}.")
+    if not os.path.exists(source_path):
+        raise ValueError(f"No SQLite database at {source_path}.")
+
+    upgrade()
+    tables = [db.metadata.tables[name] for name in TABLES]
+    source = sa.create_engine(f"sqlite:///{os.path.abspath(source_path)}")
+
+    with target.begin() as conn:
+        if truncate:
+            conn.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY"))
+        for table in tables:
+            existing = conn.execute(select(func.count()).select_from(table)).scalar()
+            if existing:
+                raise ValueError(f"{table.name} already has {existing} row(s); pass --truncate to replace them.")
+
+    copied = []
+    try:
+        with source.connect() as src:
+            for table in tables:
+                columns = [c.name for c in table.columns]
+                result = src.execution_options(yield_per=batch_size).execute(
+                    select(table).order_by(*table.primary_key.columns)
+                )
+                total = 0
+                with target.begin() as conn:
+                    for batch in result.partitions():
+                        total += copy_rows(conn, table, columns, batch)
+                        if progress:
+                            progress(table.name, total)
+                    if "id" in table.c and table.c.id.autoincrement is True:
+                        # COPY bypasses the id sequence; move it past the copied rows.
+                        conn.execute(text(
+                            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                            f"COALESCE(MAX(id), 0) + 1, false) FROM {table.name}"
+                        ))
+                copied.append((table.name, total))
+    finally:
+        source.dispose()
+
+    with target.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+    return copied
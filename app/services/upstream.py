@@ -0,0 +1,306 @@
+"""Guarding TMDB: a circuit breaker and a negative cache of failed title lookups.
+
+Every TMDB request goes through the worker's CircuitBreaker. After
+TMDB_BREAKER_FAILURES consecutive upstream failures (connection errors,
+timeouts, 429 and 5xx responses) it opens and calls fail at once with
+UpstreamUnavailable instead of waiting on the network. After
+TMDB_BREAKER_RESET_SECONDS one request is let through as a probe: success
+closes the breaker, failure opens it again.
+
+Title lookups that fail are remembered per (title_id, media_type) in the
+worker's NegativeCache: a 404 for NEGATIVE_CACHE_NOT_FOUND_SECONDS and any
+other failure for NEGATIVE_CACHE_ERROR_SECONDS. Until then the same lookup
+raises again without a request, so bots retrying made-up permalinks don't
+turn into upstream traffic.
+
+Requests also carry a deadline, REQUEST_DEADLINE_SECONDS after they start.
+TMDB calls get at most the time left (request_timeout()), and one that would
+run past it raises DeadlineExceeded, which the breaker doesn't count against
+TMDB. latency_budget() tightens the deadline for a block, so that re-fetching
+a title that is already cached can give up early and serve the cached copy
+(see cache._fetch_or_stale); such responses are marked with X-Samecast-Stale.
+
+State is per worker process, like the HTTP session; the tmdb_breaker_open
+gauge is reported per pid.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context
+
+from app.services.metrics import inc, set_gauge
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+NEGATIVE_CACHE_SIZE = 10000
+STALE_HEADER = "X-Samecast-Stale"
+
+_breaker = None
+_negative_cache = None
+
+
+class TitleNotFound(LookupError):
+    """TMDB has no title with this ID and media type."""
+
+
+class UpstreamUnavailable(RuntimeError):
+    """TMDB is failing; the request wasn't sent (or was recently failing for this title)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """The request's latency budget ran out before TMDB answered."""
+
+
+def is_upstream_failure(exc):
+    """Whether `exc` says TMDB is unhealthy, as opposed to a bad request for one resource."""
+    import requests
+
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else 500
+        return status == 429 or status >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def is_not_found(exc):
+    import requests
+
+    return isinstance(exc, requests.HTTPError) and exc.response is not None and exc.response.status_code == 404
+
+
+class CircuitBreaker:
+    """Closed → open after `failures` consecutive failures → half-open after `reset_seconds` → closed."""
+
+    def __init__(self, failures, reset_seconds):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+        set_gauge("tmdb_breaker_open", 0)
+
+    def retry_after(self):
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def _allow(self):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now - self._opened_at >= self.reset_seconds:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back is replaced.
+                if self._probe_started is None or now - self._probe_started >= self.reset_seconds:
+                    self._probe_started = now
+                    return True
+            return False
+
+    def _record(self, failed):
+        with self._lock:
+            self._probe_started = None
+            if not failed:
+                self._consecutive = 0
+                if self.state != CLOSED:
+                    self._set_state(CLOSED)
+                return
+            self._consecutive += 1
+            if self.state == HALF_OPEN or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+                if self.state != OPEN:
+                    self._set_state(OPEN)
+
+    def _release_probe(self):
+        with self._lock:
+            self._probe_started = None
+
+    def _set_state(self, state):
+        self.state = state
+        set_gauge("tmdb_breaker_open", 1 if state == OPEN else 0)
+        inc("tmdb_breaker_transitions_total", state=state)
+
+    @contextmanager
+    def guard(self):
+        """Run one upstream call, or raise UpstreamUnavailable at once while the breaker is open."""
+        if not self._allow():
+            inc("tmdb_breaker_rejected_total")
+            raise UpstreamUnavailable("TMDB is unavailable", retry_after=self.retry_after())
+        try:
+            yield
+        except DeadlineExceeded:  # our budget ran out, which says nothing about TMDB
+            self._release_probe()
+            raise
+        except Exception as e:
+            self._record(is_upstream_failure(e))
+            raise
+        except BaseException:  # nor does a killed greenlet
+            self._release_probe()
+            raise
+        else:
+            self._record(False)
+
+
+class NegativeCache:
+    """Bounded map of (title_id, media_type) → (expiry, exception) for failed lookups."""
+
+    def __init__(self, max_entries=NEGATIVE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """A fresh copy of the exception remembered for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, exc = entry
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                del self._entries[key]
+                return None
+        if isinstance(exc, UpstreamUnavailable):
+            return UpstreamUnavailable(str(exc), retry_after=remaining)
+        return type(exc)(*exc.args)
+
+    def put(self, key, exc, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, exc)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def get_breaker():
+    """Return this worker's TMDB circuit breaker, created from config on first use."""
+    global _breaker
+    if _breaker is None:
+        config = current_app.config
+        _breaker = CircuitBreaker(config["TMDB_BREAKER_FAILURES"], config["TMDB_BREAKER_RESET_SECONDS"])
+    return _breaker
+
+
+def init_upstream(app):
+    """Give each request a deadline and flag responses served from stale data."""
+
+    @app.before_request
+    def _start_deadline():
+        seconds = app.config["REQUEST_DEADLINE_SECONDS"]
+        if seconds > 0:
+            g.deadline = time.monotonic() + seconds
+
+    @app.after_request
+    def _flag_stale(response):
+        if g.get("served_stale"):
+            response.headers[STALE_HEADER] = "1"
+        return response
+
+
+def time_left():
+    """Seconds until the current deadline, or None if there is none."""
+    deadline = g.get("deadline") if has_app_context() else None
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def request_timeout(default):
+    """Timeout for one TMDB request: `default`, cut to the time left before the deadline.
+
+    Raises DeadlineExceeded if there's no time left to send it.
+    """
+    left = time_left()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline passed before calling TMDB")
+    return min(default, left)
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current deadline has passed (between chunks of a long read)."""
+    left = time_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("request deadline passed while reading from TMDB")
+
+
+@contextmanager
+def deadline_timeouts():
+    """Turn a requests timeout caused by a deadline-shortened timeout into DeadlineExceeded."""
+    import requests
+
+    try:
+        yield
+    except (requests.Timeout, requests.ConnectionError) as e:  # streamed reads time out as ConnectionError
+        left = time_left()
+        if left is not None and left <= 0.05:
+            raise DeadlineExceeded("request deadline passed while waiting on TMDB") from e
+        raise
+
+
+@contextmanager
+def latency_budget(seconds):
+    """Tighten the deadline to at most `seconds` from now for the block."""
+    outer = g.get("deadline")
+    g.deadline = time.monotonic() + seconds if outer is None else min(outer, time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        if outer is None:
+            g.pop("deadline", None)
+        else:
+            g.deadline = outer
+
+
+def mark_stale():
+    """Flag the current response as served from cached data that is due for a refresh."""
+    g.served_stale = True
+
+
+def get_negative_cache():
+    global _negative_cache
+    if _negative_cache is None:
+        _negative_cache = NegativeCache()
+    return _negative_cache
+
+
+@contextmanager
+def title_lookup(title_id, media_type):
+    """Fetch one title from TMDB under the negative cache.
+
+    Raises the remembered TitleNotFound or UpstreamUnavailable if the same
+    lookup failed recently. Otherwise runs the block; a 404 is turned into
+    TitleNotFound, and it or any other failure is remembered for its TTL.
+    """
+    key = (int(title_id), media_type)
+    cache = get_negative_cache()
+    remembered = cache.get(key)
+    if remembered is not None:
+        inc("negative_cache_total", result="hit", reason=_reason(remembered))
+        raise remembered
+    config = current_app.config
+    try:
+        yield
+    except UpstreamUnavailable:
+        raise  # the breaker already fails fast; nothing per title to remember
+    except Exception as e:
+        if is_not_found(e):
+            exc = TitleNotFound(f"TMDB has no {media_type} {title_id}")
+            ttl = config["NEGATIVE_CACHE_NOT_FOUND_SECONDS"]
+        else:
+            exc = UpstreamUnavailable(f"fetching {media_type} {title_id} failed: {e}",
+                                      retry_after=config["NEGATIVE_CACHE_ERROR_SECONDS"])
+            ttl = config["NEGATIVE_CACHE_ERROR_SECONDS"]
+        cache.put(key, exc, ttl)
+        inc("negative_cache_total", result="store", reason=_reason(exc))
+        raise exc from e
+
+
+def _reason(exc):
+    return "not_found" if isinstance(exc, TitleNotFound) else "error"
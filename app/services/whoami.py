@@ -0,0 +1,250 @@
+"""WhoAmI: guess a person from clues about their filmography.
+
+`flask whoami seed` loads every cast credit once into a FilmographyIndex — a
+sparse persons × titles matrix whose rows are each person's title IDs in
+sorted order, plus each title's year and media type — and generates puzzles
+for a run of days from it. A clue is a predicate over persons ("appeared in a
+2008 film", "shared a cast with X in 2 titles", "appeared in Heat") evaluated
+as one sparse product over the whole matrix, so narrowing the candidate set
+never goes back to the database.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from app import db
+from app.engine import write_transaction
+from app.models import Credit, Person, Title, TitleStat, WhoAmIPuzzle
+from app.services.metrics import timed
+
+# The order clues are revealed in, vaguest first. A puzzle may finish early
+# once the answer is unique, but never needs more than this.
+CLUE_PLAN = ("years", "years", "costar", "costar", "title")
+MIN_TITLES = 5  # cast credits an answer needs for a fair set of clues
+TOP_BILLED = 5  # answers must be billed this high on at least one title
+MAX_COSTARS = 10
+MAX_YEAR_PAIRS = 60
+MAX_TITLES = 20
+MAX_ATTEMPTS = 200  # answers tried per day before giving up
+
+MEDIA_NOUNS = {"movie": "film", "tv": "TV series"}
+
+
+class FilmographyIndex:
+    """Every person's cast filmography, held as sparse matrices over titles."""
+
+    def __init__(self, person_ids, title_ids, years, media_types, names, rows, cols):
+        from scipy import sparse  # only the batch job needs it
+
+        self.person_ids = person_ids
+        self.title_ids = title_ids
+        self.years = years
+        self.media_types = media_types
+        self.names = names
+        data = np.ones(len(rows), dtype=np.int32)
+        # by_person[p] is person p's titles (as positions into title_ids, sorted);
+        # by_title[t] is title t's cast.
+        self.by_person = sparse.csr_matrix((data, (rows, cols)), shape=(len(person_ids), len(title_ids)))
+        self.by_person.sum_duplicates()
+        self.by_person.data[:] = 1  # two roles in one title count once
+        self.by_title = self.by_person.T.tocsr()
+        self._year_masks = {}
+
+    @classmethod
+    def load(cls):
+        """Build the index from the titles and cast credits in the database."""
+        # Plain Core rows: building ORM rows for every credit costs more than the query.
+        conn = db.session.connection()
+        titles = conn.execute(
+            select(Title.id, Title.release_year, Title.media_type, Title.title).order_by(Title.id)
+        ).all()
+        title_ids = np.array([t.id for t in titles], dtype=np.int64)
+        years = np.array([t.release_year or 0 for t in titles], dtype=np.int32)
+        media_types = np.array([t.media_type for t in titles])
+        names = [t.title for t in titles]
+
+        person_col, title_col = [], []
+        result = conn.execution_options(yield_per=50000).execute(
+            select(Credit.person_id, Credit.title_id).where(Credit.credit_type == "cast")
+        )
+        for batch in result.partitions():
+            person_col.extend(p for p, _ in batch)
+            title_col.extend(t for _, t in batch)
+
+        person_ids, rows = np.unique(np.asarray(person_col, dtype=np.int64), return_inverse=True)
+        cols = np.searchsorted(title_ids, np.asarray(title_col, dtype=np.int64))
+        return cls(person_ids, title_ids, years, media_types, names, rows, cols)
+
+    def row(self, person_id):
+        """Row number of a person, or None if they have no cast credits."""
+        i = np.searchsorted(self.person_ids, person_id)
+        return int(i) if i < len(self.person_ids) and self.person_ids[i] == person_id else None
+
+    def filmography(self, person_id):
+        """[(title_id, year, media_type)] for a person, sorted by title ID."""
+        i = self.row(person_id)
+        if i is None:
+            return []
+        cols = self.by_person.indices[self.by_person.indptr[i]:self.by_person.indptr[i + 1]]
+        return [(int(self.title_ids[c]), int(self.years[c]) or None, str(self.media_types[c])) for c in cols]
+
+    def titles_per_person(self):
+        return np.diff(self.by_person.indptr)
+
+    def matches(self, title_mask):
+        """Number of titles in `title_mask` (bool per title) each person appeared in."""
+        return self.by_person @ title_mask.astype(np.int32)
+
+    def costars(self, row):
+        """Shared-title counts between person `row` and everyone (themself included)."""
+        return self.matches(self._title_mask(row))
+
+    def year_mask(self, year, media_type):
+        """Persons with at least one `media_type` title released in `year`."""
+        key = (year, media_type)
+        if key not in self._year_masks:
+            titles = (self.years == year) & (self.media_types == media_type)
+            self._year_masks[key] = self.matches(titles) > 0
+        return self._year_masks[key]
+
+    def cast_mask(self, col):
+        """Persons in the cast of title `col`."""
+        mask = np.zeros(len(self.person_ids), dtype=bool)
+        mask[self.by_title.indices[self.by_title.indptr[col]:self.by_title.indptr[col + 1]]] = True
+        return mask
+
+    def _title_mask(self, row):
+        mask = np.zeros(len(self.title_ids), dtype=bool)
+        mask[self.by_person.indices[self.by_person.indptr[row]:self.by_person.indptr[row + 1]]] = True
+        return mask
+
+
+def _clue_options(index, row, rng):
+    """Candidate clues about person `row`, by kind: {kind: [(text, person mask)]}."""
+    cols = index.by_person.indices[index.by_person.indptr[row]:index.by_person.indptr[row + 1]]
+    facts = sorted({(int(index.years[c]), str(index.media_types[c])) for c in cols if index.years[c]})
+    pairs = [(a, b) for i, a in enumerate(facts) for b in facts[i + 1:]]
+    years = []
+    for (y1, m1), (y2, m2) in rng.sample(pairs, min(len(pairs), MAX_YEAR_PAIRS)):
+        text = f"Appeared in a {y1} {MEDIA_NOUNS.get(m1, m1)} and a {y2} {MEDIA_NOUNS.get(m2, m2)}"
+        years.append((text, index.year_mask(y1, m1) & index.year_mask(y2, m2)))
+    # Single years are vaguer still, for people with few dated credits.
+    years += [(f"Appeared in a {y} {MEDIA_NOUNS.get(m, m)}", index.year_mask(y, m)) for y, m in facts]
+
+    shared = index.costars(row)
+    shared[row] = 0
+    top = [c for c in np.argsort(shared)[::-1][:MAX_COSTARS] if shared[c] >= 2]
+    names = dict(db.session.execute(
+        select(Person.id, Person.name).where(Person.id.in_([int(index.person_ids[c]) for c in top]))
+    ).all())
+    costar = []
+    for c in top:
+        name = names.get(int(index.person_ids[c]))
+        if name:
+            n = int(shared[c])
+            costar.append((f"Shared a cast with {name} in {n} titles", index.costars(c) >= n))
+
+    title = []
+    for c in rng.sample(list(cols), min(len(cols), MAX_TITLES)):
+        year = f" ({index.years[c]})" if index.years[c] else ""
+        title.append((f"Appeared in {index.names[c]}{year}", index.cast_mask(c)))
+    return {"years": years, "costar": costar, "title": title}
+
+
+def pick_clues(index, row, rng=random):
+    """Choose clues for person `row` that narrow every cast member down to them.
+
+    Each step takes the clue of the planned kind whose surviving candidate
+    count is closest (on a log scale) to an even descent from the current
+    count to 1 over the remaining steps. Returns [{kind, text, remaining}],
+    or None if the plan cannot single the person out.
+    """
+    options = _clue_options(index, row, rng)
+    alive = np.ones(len(index.person_ids), dtype=bool)
+    remaining = int(alive.sum())
+    clues, used = [], set()
+    for step, kind in enumerate(CLUE_PLAN):
+        steps_left = len(CLUE_PLAN) - step
+        target = math.log(remaining) * (steps_left - 1) / steps_left
+        best = None
+        for text, mask in options[kind]:
+            if text in used:
+                continue
+            count = int((alive & mask).sum())
+            if count >= remaining:
+                continue
+            score = abs(math.log(count) - target)
+            if best is None or score < best[0]:
+                best = (score, text, mask, count)
+        if best is None:
+            continue
+        _, text, mask, remaining = best
+        alive &= mask
+        used.add(text)
+        clues.append({"kind": kind, "text": text, "remaining": remaining})
+        if remaining == 1:
+            return clues
+    return None
+
+
+def _answer_pool(index):
+    """Rows of people well known enough to be answers."""
+    top_billed = set()
+    for (top_cast,) in db.session.execute(select(TitleStat.top_cast_ids)):
+        top_billed.update((top_cast or ())[:TOP_BILLED])
+    enough = index.titles_per_person() >= MIN_TITLES
+    return [i for i in np.flatnonzero(enough) if int(index.person_ids[i]) in top_billed]
+
+
+def generate_puzzles(start_date, days, index=None, rng=random):
+    """Generate WhoAmI puzzles for `days` dates from `start_date`, skipping dates that have one.
+
+    Loads the FilmographyIndex once for the whole batch. Returns
+    (puzzles created, seconds).
+    """
+    start = time.perf_counter()
+    with timed("whoami_generate_seconds"):
+        dates = [start_date + timedelta(days=i) for i in range(days)]
+        taken = set(db.session.scalars(
+            select(WhoAmIPuzzle.puzzle_date).where(WhoAmIPuzzle.puzzle_date.in_(dates))
+        ))
+        dates = [d for d in dates if d not in taken]
+        if not dates:
+            return [], time.perf_counter() - start
+
+        index = index or FilmographyIndex.load()
+        used = set(db.session.scalars(select(WhoAmIPuzzle.person_id)))
+        pool = [i for i in _answer_pool(index) if int(index.person_ids[i]) not in used]
+        rng.shuffle(pool)
+
+        picked = []
+        for target_date in dates:
+            for _ in range(MAX_ATTEMPTS):
+                if not pool:
+                    raise ValueError("Not enough cached people to make WhoAmI puzzles. Cache more titles first.")
+                row = pool.pop()
+                clues = pick_clues(index, row, rng)
+                if clues:
+                    picked.append((target_date, int(index.person_ids[row]), clues))
+                    break
+            else:
+                raise ValueError(f"No one could be singled out by clues for {target_date}.")
+
+        persons = {p.id: p for p in Person.query.filter(Person.id.in_([p for _, p, _ in picked]))}
+        puzzles = [
+            WhoAmIPuzzle(
+                puzzle_date=target_date,
+                person_id=person_id,
+                person_name=persons[person_id].name,
+                profile_path=persons[person_id].profile_path,
+                clues=clues,
+            )
+            for target_date, person_id, clues in picked
+        ]
+        with write_transaction():
+            db.session.add_all(puzzles)
+    return puzzles, time.perf_counter() - start
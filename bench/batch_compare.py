@@ -0,0 +1,75 @@
+"""Benchmark: batch pair comparison against one find_shared() call per pair.
+
+Builds (or reuses) a synthetic dataset, draws random pairs of cached titles
+and times compare_pairs() over all of them, then checks a sample against
+find_shared() and times that per-pair path for the same sample:
+
+    python -m bench.batch_compare --db /tmp/samecast-bench.db --pairs 20000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Existing dataset (default: generate one in a temp dir).")
+    parser.add_argument("--titles", type=int, default=100000)
+    parser.add_argument("--credits", type=int, default=1000000)
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--check", type=int, default=200, help="Pairs also run through find_shared().")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    if not os.path.exists(db_path):
+        from bench.dataset import generate
+
+        generate(db_path, titles=args.titles, credits=args.credits)
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.abspath(db_path)}", TMDB_API_KEY="bench")
+    os.environ.setdefault("CREDIT_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "none.snap"))
+    os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.mkdtemp(), "metrics"))
+
+    from sqlalchemy import select
+
+    from app import create_app, db
+    from app.models import Title
+    from app.services.batch_compare import compare_pairs
+    from app.services.comparison import find_shared
+
+    app = create_app()
+    with app.app_context():
+        titles = db.session.execute(
+            select(Title.id, Title.media_type).where(Title.credits_cached == True)  # noqa: E712
+        ).all()
+        rng = random.Random(7)
+        pairs = [(*rng.choice(titles), *rng.choice(titles)) for _ in range(args.pairs)]
+
+        start = time.perf_counter()
+        results = list(compare_pairs(pairs))
+        batch_seconds = time.perf_counter() - start
+
+        sample = rng.sample(range(len(pairs)), min(args.check, len(pairs)))
+        mismatches = 0
+        start = time.perf_counter()
+        for i in sample:
+            shared = find_shared(*pairs[i])
+            got = results[i]
+            if (got["shared_cast"], got["shared_crew"]) != (len(shared["shared_cast"]), len(shared["shared_crew"])):
+                mismatches += 1
+        per_pair_seconds = (time.perf_counter() - start) / max(len(sample), 1)
+
+    print(json.dumps({
+        "pairs": len(pairs),
+        "batch_seconds": round(batch_seconds, 3),
+        "batch_pairs_per_second": round(len(pairs) / batch_seconds),
+        "find_shared_pairs_per_second": round(1 / per_pair_seconds) if per_pair_seconds else None,
+        "checked": len(sample),
+        "mismatches": mismatches,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Microbenchmark: find_shared on large TV casts, dict-based vs vector-based.
+
+Caches two synthetic TV titles with 1000+ credits each in a temporary SQLite
+DB, compiles the credit snapshot, then times the pre-vector implementation
+(four {person_id: credit} dicts over fully loaded credit lists) against the
+current find_shared, reporting mean latency and tracemalloc peak:
+
+    python -m bench.find_shared_bench --cast 1500 --crew 600
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+
+def tv_details(title_id, cast_size, crew_size, person_pool, seed):
+    rng = random.Random(seed)
+    people = rng.sample(range(1, person_pool + 1), cast_size + crew_size)
+    return {
+        "id": title_id,
+        "media_type": "tv",
+        "title": f"Long Running Show {title_id}",
+        "release_year": 1999,
+        "overview": "A synthetic procedural.",
+        "poster_path": f"/poster{title_id}.jpg",
+        "cast": [
+            {"person_id": pid, "name": f"Guest Star {pid}", "profile_path": f"/p{pid}.jpg",
+             "known_for_department": "Acting", "credit_type": "cast",
+             "character": f"Witness #{i} / Detective {i}", "display_order": i}
+            for i, pid in enumerate(people[:cast_size])
+        ],
+        "crew": [
+            {"person_id": pid, "name": f"Crew Member {pid}", "profile_path": None,
+             "known_for_department": "Directing", "credit_type": "crew",
+             "job": "Director / Writer", "department": rng.choice(["Directing", "Writing", "Camera"])}
+            for pid in people[cast_size:]
+        ],
+    }
+
+
+def legacy_find_shared(details_1, details_2):
+    """find_shared as it was before the vector rewrite (intersection part only)."""
+    cast_1 = {c["person_id"]: c for c in details_1["cast"]}
+    cast_2 = {c["person_id"]: c for c in details_2["cast"]}
+    crew_1 = {c["person_id"]: c for c in details_1["crew"]}
+    crew_2 = {c["person_id"]: c for c in details_2["crew"]}
+    shared_cast_ids = set(cast_1.keys()) & set(cast_2.keys())
+    shared_crew_ids = (set(crew_1.keys()) & set(crew_2.keys())) - shared_cast_ids
+    shared_cast = sorted(
+        ({"person_id": pid, "name": cast_1[pid]["name"], "profile_path": cast_1[pid]["profile_path"],
+          "role_1": cast_1[pid].get("character", ""), "role_2": cast_2[pid].get("character", ""),
+          "order": min(cast_1[pid].get("display_order", 999), cast_2[pid].get("display_order", 999))}
+         for pid in shared_cast_ids),
+        key=lambda x: x["order"],
+    )
+    dept_order = {"Directing": 0, "Writing": 1, "Production": 2, "Sound": 3, "Camera": 4}
+    shared_crew = sorted(
+        ({"person_id": pid, "name": crew_1[pid]["name"], "profile_path": crew_1[pid]["profile_path"],
+          "role_1": crew_1[pid].get("job", ""), "role_2": crew_2[pid].get("job", ""),
+          "department": crew_1[pid].get("department", "")}
+         for pid in shared_crew_ids),
+        key=lambda x: (dept_order.get(x["department"], 99), x["name"]),
+    )
+    return shared_cast, shared_crew
+
+
+def measure(fn, runs):
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    mean_us = (time.perf_counter() - start) / runs * 1e6
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"mean_us": round(mean_us, 1), "peak_alloc_kb": round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cast", type=int, default=1500)
+    parser.add_argument("--crew", type=int, default=600)
+    parser.add_argument("--pool", type=int, default=40000, help="Distinct people to draw credits from.")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["CREDIT_SNAPSHOT_PATH"] = os.path.join(tmp, "credits.snap")
+
+    from app import create_app
+    from app.services.cache import _save_to_db, get_title_with_credits
+    from app.services.comparison import find_shared
+    from app.services.cache import ListCredits
+    from app.services.snapshot import compile_snapshot, snapshot_path
+
+    from app.migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+        d1 = tv_details(1, args.cast, args.crew, args.pool, seed=1)
+        d2 = tv_details(2, args.cast, args.crew, args.pool, seed=2)
+        _save_to_db(d1)
+        _save_to_db(d2)
+
+        from app.services import comparison
+
+        def in_memory(details_1, details_2):
+            # find_shared's intersection step alone, on already loaded lists
+            credits = {1: (details_1, ListCredits(details_1["cast"], details_1["crew"])),
+                       2: (details_2, ListCredits(details_2["cast"], details_2["crew"]))}
+            original = comparison.get_title_credits
+            comparison.get_title_credits = lambda tid, _mt: credits[int(tid)]
+            try:
+                return find_shared(1, "tv", 2, "tv")
+            finally:
+                comparison.get_title_credits = original
+
+        new = in_memory(d1, d2)
+        old_cast, old_crew = legacy_find_shared(d1, d2)
+        # Ties in billing order came out in set-iteration order before; compare order-insensitively
+        by_person = lambda rows: sorted(rows, key=lambda r: r["person_id"])  # noqa: E731
+        assert by_person(new["shared_cast"]) == by_person(old_cast)
+        assert by_person(new["shared_crew"]) == by_person(old_crew)
+
+        report = {
+            "cast_per_title": args.cast,
+            "crew_per_title": args.crew,
+            "shared_people": new["total_shared"],
+            "intersection_only": {
+                "dicts": measure(lambda: legacy_find_shared(d1, d2), args.runs),
+                "vectors": measure(lambda: in_memory(d1, d2), args.runs),
+            },
+        }
+
+        def legacy_end_to_end():
+            return legacy_find_shared(get_title_with_credits(1, "tv"), get_title_with_credits(2, "tv"))
+
+        report["cached_db_end_to_end"] = {
+            "dicts": measure(legacy_end_to_end, max(args.runs // 20, 3)),
+            "vectors": measure(lambda: find_shared(1, "tv", 2, "tv"), args.runs // 4),
+        }
+        compile_snapshot(snapshot_path())
+        report["cached_snapshot_end_to_end"] = {
+            "dicts": measure(legacy_end_to_end, args.runs // 4),
+            "vectors": measure(lambda: find_shared(1, "tv", 2, "tv"), args.runs // 4),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
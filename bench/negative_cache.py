@@ -0,0 +1,87 @@
+"""Benchmark: upstream calls caused by bad permalinks and by a TMDB outage.
+
+Runs two scenarios against the stub TMDB through the Flask test client, each
+with the protection on and off:
+
+  crawl   a bot requests permalinks for made-up title IDs (TMDB answers 404),
+          each ID several times; the negative cache should absorb repeats.
+  outage  every TMDB request fails with a 503 after --latency seconds, while
+          visitors open permalinks for uncached titles; the circuit breaker
+          should stop sending requests after the first few failures.
+
+    python -m bench.negative_cache --bogus-ids 50 --repeats 10 --outage-requests 200
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from bench.stub_tmdb import serve
+
+MAX_ID = 1_000_000
+
+
+def _run(app, server, urls):
+    from app.services import upstream
+
+    upstream._breaker = upstream._negative_cache = None
+    client = app.test_client()
+    hits = server.hits
+    statuses = {}
+    start = time.perf_counter()
+    for url in urls:
+        status = client.get(url).status_code
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(urls),
+        "upstream_calls": server.hits - hits,
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bogus-ids", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--outage-requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub TMDB delay before each failure.")
+    args = parser.parse_args()
+
+    server, api_url, _ = serve(latency=args.latency, max_id=MAX_ID)
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", TMDB_API_KEY="bench", TMDB_BASE_URL=api_url,
+        CREDIT_SNAPSHOT_PATH=os.path.join(tmp, "none.snap"), METRICS_DIR=os.path.join(tmp, "metrics"),
+    )
+
+    from app import create_app
+    from app.migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+
+    report = {}
+    try:
+        crawl = [f"/compare/{MAX_ID + 1 + i % args.bogus_ids}-movie/1-movie"
+                 for i in range(args.bogus_ids * args.repeats)]
+        for label, ttl in (("crawl_without_negative_cache", 0), ("crawl_with_negative_cache", 600)):
+            app.config["NEGATIVE_CACHE_NOT_FOUND_SECONDS"] = ttl
+            report[label] = _run(app, server, crawl)
+
+        server.RequestHandlerClass.error_rate = 1.0
+        app.config["NEGATIVE_CACHE_ERROR_SECONDS"] = 0  # distinct titles anyway; isolate the breaker
+        outage = [f"/compare/{10 + i}-movie/{20000 + i}-movie" for i in range(args.outage_requests)]
+        for label, failures in (("outage_without_breaker", 10 ** 9), ("outage_with_breaker", 5)):
+            app.config["TMDB_BREAKER_FAILURES"] = failures
+            report[label] = _run(app, server, outage)
+    finally:
+        server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
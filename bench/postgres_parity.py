@@ -0,0 +1,94 @@
+"""SQLite vs Postgres parity and write timing, against a local Postgres.
+
+Generates a SQLite dataset, moves it into Postgres with
+`flask db migrate-sqlite-to-postgres --truncate`, then runs the same reads
+and _save_to_db() upserts against both and checks the results match:
+
+    createdb samecast_bench
+    python -m bench.postgres_parity --url postgresql://localhost/samecast_bench
+
+The target database is truncated. Also runs `flask db explain` on both.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from bench.upstream_latency import ROOT
+
+PROBE = r"""
+import json, time
+from app import create_app
+from app.models import Credit, Title
+from app.services.cache import _save_to_db, get_title_with_credits
+from app.services.comparison import find_shared
+from bench.sqlite_stress import synthetic_details
+
+app = create_app()
+out = {"shared": {}}
+with app.app_context():
+    ids = [t.id for t in Title.query.order_by(Title.id).limit(PAIRS + 1)]
+    for a, b in zip(ids, ids[1:]):
+        result = find_shared(a, "movie", b, "movie")
+        out["shared"][f"{a}-{b}"] = sorted(p["person_id"] for p in result["shared_cast"] + result["shared_crew"])
+
+    details = [synthetic_details(900000 + i, cast_size=200, crew_size=100, person_pool=5000) for i in range(SAVES)]
+    details[0]["cast"].append(dict(details[0]["cast"][0], character="Second role"))
+    start = time.perf_counter()
+    for d in details + details:  # second pass updates every row
+        _save_to_db(d)
+    out["save_ms"] = round((time.perf_counter() - start) * 1000 / (2 * SAVES), 2)
+    out["saved_credits"] = Credit.query.filter(Credit.title_id >= 900000).count()
+    out["reloaded_cast"] = len(get_title_with_credits(900000, "movie")["cast"])
+print(json.dumps(out))
+"""
+
+
+def _run(args, env, **kwargs):
+    return subprocess.run(args, cwd=ROOT, env=env, check=True, text=True, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Postgres URL of a scratch database (it is truncated).")
+    parser.add_argument("--titles", type=int, default=5000)
+    parser.add_argument("--credits", type=int, default=100000)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--saves", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    sqlite_path = os.path.join(workdir, "parity.db")
+    base = dict(os.environ, CREDIT_SNAPSHOT_PATH=os.path.join(workdir, "none.snap"),
+                METRICS_DIR=os.path.join(workdir, "metrics"))
+    backends = {"sqlite": dict(base, DATABASE_URL=f"sqlite:///{sqlite_path}"), "postgres": dict(base, DATABASE_URL=args.url)}
+
+    _run([sys.executable, "-m", "bench.dataset", "--db", sqlite_path,
+          "--titles", str(args.titles), "--credits", str(args.credits)], backends["sqlite"])
+    _run([sys.executable, "-m", "flask", "--app", "wsgi", "db", "migrate-sqlite-to-postgres",
+          sqlite_path, "--truncate"], backends["postgres"], stdout=subprocess.DEVNULL)
+
+    probe = PROBE.replace("PAIRS", str(args.pairs)).replace("SAVES", str(args.saves))
+    report, results = {}, {}
+    for name, env in backends.items():
+        explain = subprocess.run([sys.executable, "-m", "flask", "--app", "wsgi", "db", "explain"],
+                                 cwd=ROOT, env=env, text=True, capture_output=True)
+        out = json.loads(_run([sys.executable, "-c", probe], env, capture_output=True).stdout.splitlines()[-1])
+        results[name] = out
+        report[name] = {
+            "plans_ok": explain.returncode == 0,
+            "save_ms": out["save_ms"],
+            "saved_credits": out["saved_credits"],
+            "reloaded_cast": out["reloaded_cast"],
+        }
+    report["results_match"] = all(
+        results["sqlite"][key] == results["postgres"][key] for key in ("shared", "saved_credits", "reloaded_cast")
+    )
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["results_match"] and all(r["plans_ok"] for r in (report["sqlite"], report["postgres"])) else 1)
+
+
+if __name__ == "__main__":
+    main()
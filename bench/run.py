@@ -0,0 +1,214 @@
+"""Reproducible benchmark suite.
+
+Builds (or reuses) a synthetic credits database, starts the local stub TMDB,
+and drives the app in-process through scenarios that mirror production
+traffic. Prints per-scenario p50/p95/p99 latency and throughput as JSON:
+
+    python -m bench.run --titles 20000 --credits 200000 --latency 0.05
+    python -m bench.run --db /tmp/samecast-bench.db --scenarios warm_compare,puzzle_generation
+
+Scenarios:
+    cold_compare        /compare on titles not yet cached (TMDB fetch + save)
+    warm_compare        /compare on distinct cached pairs (DB/snapshot reads + render)
+    hot_permalink       the same few permalinks over and over (fragment cache)
+    autocomplete_storm  concurrent /search/autocomplete with distinct queries
+    puzzle_generation   generate_rounds_for_date() against the whole credits table
+    image_burst         a burst of uncached profile images, then the same burst warm
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from bench.stub_tmdb import serve
+
+SCENARIOS = ["cold_compare", "warm_compare", "hot_permalink", "autocomplete_storm",
+             "puzzle_generation", "image_burst"]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2)  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+class Driver:
+    """Runs batches of GET requests against the app from a thread pool."""
+
+    def __init__(self, app, concurrency):
+        self.app = app
+        self.concurrency = concurrency
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def _get(self, url):
+        start = time.perf_counter()
+        resp = self._client().get(url)
+        elapsed = time.perf_counter() - start
+        failed = resp.status_code >= 500 or b"alert-error" in resp.data
+        return elapsed, failed
+
+    def run(self, urls):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(self._get, urls))
+        elapsed = time.perf_counter() - start
+        return summarize([r[0] for r in results], sum(1 for r in results if r[1]), elapsed)
+
+
+def compare_url(id1, id2, media_type="movie"):
+    return f"/compare?title_id_1={id1}&media_type_1={media_type}&title_id_2={id2}&media_type_2={media_type}"
+
+
+def scenario_cold_compare(ctx):
+    # Stub IDs far above the dataset's range are never cached.
+    base = ctx["titles"] + 1_000_000
+    urls = [compare_url(base + 2 * i, base + 2 * i + 1) for i in range(ctx["requests"])]
+    return ctx["driver"].run(urls)
+
+
+def scenario_warm_compare(ctx):
+    rng = random.Random(1)
+    urls = []
+    for _ in range(ctx["requests"]):
+        id1, id2 = rng.sample(range(1, ctx["titles"] + 1), 2)
+        urls.append(compare_url(id1, id2, "tv" if id1 % 3 == 0 else "movie"))
+    return ctx["driver"].run(urls)
+
+
+def scenario_hot_permalink(ctx):
+    hot = [f"/compare/{i}-movie/{i + 1}-movie" for i in range(1, 6 * 3, 3)]
+    return ctx["driver"].run([hot[i % len(hot)] for i in range(ctx["requests"])])
+
+
+def scenario_autocomplete_storm(ctx):
+    words = ["the", "break", "office", "dark", "game", "star", "lost", "wire", "crown", "succession"]
+    urls = [f"/search/autocomplete?q={words[i % len(words)]}{i}&slot={1 + i % 2}" for i in range(ctx["requests"])]
+    return ctx["driver"].run(urls)
+
+
+def scenario_puzzle_generation(ctx):
+    from app import db
+    from app.models import OddOneOutRound
+    from app.services.puzzle import generate_rounds_for_date
+
+    runs = max(ctx["requests"] // 20, 3)
+    start_date = date(2100, 1, 1)
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    with ctx["app"].app_context():
+        for i in range(runs):
+            t0 = time.perf_counter()
+            try:
+                generate_rounds_for_date(start_date + timedelta(days=i))
+            except ValueError:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+        OddOneOutRound.query.filter(OddOneOutRound.puzzle_date >= start_date).delete()
+        db.session.commit()
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def scenario_image_burst(ctx):
+    urls = [f"/images/profile/bench-{i}.jpg" for i in range(ctx["requests"])]
+    return {"cold": ctx["driver"].run(urls), "warm": ctx["driver"].run(urls)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Reuse an existing dataset (see bench.dataset) instead of generating one.")
+    parser.add_argument("--titles", type=int, default=20000)
+    parser.add_argument("--credits", type=int, default=200000)
+    parser.add_argument("--scenarios", default="all", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub TMDB latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    args = parser.parse_args()
+
+    names = SCENARIOS if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="samecast-bench-")
+    server, api_url, image_url = serve(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    try:
+        db_path = args.db or os.path.join(workdir, "bench.db")
+        # app.config reads the environment once, at import — set it all first.
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.abspath(db_path)}",
+            TMDB_BASE_URL=api_url,
+            TMDB_IMAGE_BASE_URL=image_url,
+            TMDB_API_KEY="bench",
+            IMAGE_CACHE_DIR=os.path.join(workdir, "images"),
+            METRICS_DIR=os.path.join(workdir, "metrics"),
+            CREDIT_SNAPSHOT_PATH=os.path.join(workdir, "credits.snap"),
+        )
+        titles = args.titles
+        if args.db is None:
+            from bench.dataset import generate
+
+            generate(db_path, args.titles, args.credits)
+
+        from app import create_app
+
+        app = create_app()
+        if args.db:
+            with app.app_context():
+                from app.models import Title
+
+                titles = Title.query.count()
+
+        ctx = {"app": app, "driver": Driver(app, args.concurrency), "titles": titles, "requests": args.requests}
+        report = {
+            "config": {
+                "titles": titles, "requests": args.requests, "concurrency": args.concurrency,
+                "latency_s": args.latency, "jitter_s": args.jitter, "error_rate": args.error_rate,
+            },
+            "scenarios": {},
+        }
+        for name in names:
+            report["scenarios"][name] = globals()[f"scenario_{name}"](ctx)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Concurrency stress test for SQLite writes through the cache layer.
+
+Spawns several processes (standing in for gunicorn workers), each with a few
+threads, that interleave _save_to_db() refreshes of overlapping titles with
+cached reads, then reports how many operations hit "database is locked":
+
+    python -m bench.sqlite_stress --processes 4 --threads 4 --iterations 50
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+
+def synthetic_details(title_id, cast_size=40, crew_size=20, person_pool=400):
+    rng = random.Random(title_id)
+    people = rng.sample(range(1, person_pool + 1), cast_size + crew_size)
+    return {
+        "id": title_id,
+        "media_type": "movie",
+        "title": f"Title {title_id}",
+        "release_year": 2000 + title_id % 20,
+        "overview": "",
+        "poster_path": None,
+        "cast": [
+            {"person_id": pid, "name": f"Person {pid}", "profile_path": None,
+             "known_for_department": "Acting", "credit_type": "cast",
+             "character": f"Role {i}", "display_order": i}
+            for i, pid in enumerate(people[:cast_size])
+        ],
+        "crew": [
+            {"person_id": pid, "name": f"Person {pid}", "profile_path": None,
+             "known_for_department": "Directing", "credit_type": "crew",
+             "job": "Director", "department": "Directing"}
+            for pid in people[cast_size:]
+        ],
+    }
+
+
+def _worker(threads, iterations, titles, results):
+    from sqlalchemy.exc import OperationalError
+
+    from app import create_app, db
+    from app.models import Title
+    from app.services.cache import _load_from_db, _save_to_db
+
+    app = create_app()
+    counts = {"writes": 0, "reads": 0, "locked": 0, "other_errors": 0}
+    lock = threading.Lock()
+
+    def run():
+        rng = random.Random()
+        with app.app_context():
+            for _ in range(iterations):
+                title_id = rng.randint(1, titles)
+                try:
+                    if rng.random() < 0.5:
+                        _save_to_db(synthetic_details(title_id))
+                        key = "writes"
+                    else:
+                        title = db.session.get(Title, title_id)
+                        if title:
+                            _load_from_db(title)
+                        db.session.rollback()
+                        key = "reads"
+                except OperationalError as e:
+                    db.session.rollback()
+                    key = "locked" if "locked" in str(e) else "other_errors"
+                with lock:
+                    counts[key] += 1
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--titles", type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from app import create_app
+    from app.migrations import upgrade
+
+    with create_app().app_context():
+        upgrade()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(args.threads, args.iterations, args.titles, results))
+        for _ in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    totals = {"writes": 0, "reads": 0, "locked": 0, "other_errors": 0}
+    for _ in procs:
+        for key, value in results.get().items():
+            totals[key] += value
+    for p in procs:
+        p.join()
+    totals["elapsed_s"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Cold-start timing: how long until a fresh process can serve.
+
+Measures, each in a fresh interpreter and reported as the median of N runs:
+
+- import: `import wsgi` (create_app with no DDL and no heavy service imports)
+- first_request: create_app plus the first /robots.txt response
+- first_compare: the first cached /compare, which pays for the deferred imports
+- gunicorn: process spawn until a single sync worker answers /robots.txt
+
+    python -m bench.startup --runs 7 --budget-ms 1500
+
+With --budget-ms the exit code is 1 when the gunicorn boot median exceeds it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.upstream_latency import ROOT, _free_port, _wait_for
+
+FIRST_REQUEST = """
+import time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+resp = app.test_client().get({path!r})
+assert resp.status_code == 200, resp.status_code
+print(time.perf_counter() - start)
+"""
+
+
+def _timed_run(code, env):
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def _gunicorn_boot(env):
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=ROOT, env=dict(env, PORT=str(port), WEB_CONCURRENCY="1", SAMECAST_ASYNC="0"),
+    )
+    try:
+        _wait_for(f"http://127.0.0.1:{port}/robots.txt")
+        return time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        CREDIT_SNAPSHOT_PATH=os.path.join(workdir, "credits.snap"),
+        METRICS_DIR=os.path.join(workdir, "metrics"),
+    )
+    # One-off schema and a cached pair, as `flask db upgrade` would leave it on a deploy.
+    subprocess.run([sys.executable, "-c", "\n".join([
+        "from app import create_app",
+        "from app.migrations import upgrade",
+        "from app.services.cache import _save_to_db",
+        "from bench.sqlite_stress import synthetic_details",
+        "app = create_app()",
+        "with app.app_context():",
+        "    upgrade()",
+        "    _save_to_db(synthetic_details(1))",
+        "    _save_to_db(synthetic_details(2))",
+    ])], cwd=ROOT, env=env, check=True)
+
+    scenarios = {
+        "import": lambda: _timed_run(
+            "import time; s = time.perf_counter(); import wsgi; print(time.perf_counter() - s)", env),
+        "first_request": lambda: _timed_run(FIRST_REQUEST.format(path="/robots.txt"), env),
+        "first_compare": lambda: _timed_run(FIRST_REQUEST.format(path="/compare/1-movie/2-movie"), env),
+        "gunicorn": lambda: _gunicorn_boot(env),
+    }
+    report = {}
+    for name, fn in scenarios.items():
+        samples = [fn() * 1000 for _ in range(args.runs)]
+        report[name] = {"median_ms": round(statistics.median(samples), 1),
+                        "min_ms": round(min(samples), 1), "max_ms": round(max(samples), 1)}
+    print(json.dumps(report, indent=2))
+
+    if args.budget_ms is not None and report["gunicorn"]["median_ms"] > args.budget_ms:
+        print(f"gunicorn boot {report['gunicorn']['median_ms']} ms exceeds budget {args.budget_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
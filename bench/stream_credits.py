@@ -0,0 +1,120 @@
+"""Benchmark: streamed vs whole-body parsing of a large TV aggregate_credits payload.
+
+Serves a synthetic ~5 MB `tv/<id>` response from the stub TMDB and saves it
+both ways against a scratch SQLite database:
+
+    python -m bench.stream_credits --cast 24000 --crew 6000
+
+- whole:    resp.json() + full normalized lists (the old get_tv_details()) + _save_to_db()
+- streamed: stream_tv_details() (spooled body, ijson) + _save_streamed()
+
+Reports wall time and peak Python allocation (tracemalloc) for each, and
+checks both wrote the same credits. Every save is forced to a full rewrite;
+the *_noop rows time the same saves again once the credits are cached, when
+the fingerprint matches and no credits are written.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.stub_tmdb import title_details
+from bench.upstream_latency import ROOT, _free_port, _wait_for
+
+TITLE_ID = 1
+
+
+def _measure(fn, runs):
+    """Best wall time over `runs`, then peak allocation from one traced run (tracing slows it down)."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(min(times), 3), "peak_alloc_mb": round(peak / 1024 / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cast", type=int, default=24000)
+    parser.add_argument("--crew", type=int, default=6000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # The stub runs in its own process so its allocations stay out of tracemalloc.
+    port = _free_port()
+    stub = subprocess.Popen([sys.executable, "-m", "bench.stub_tmdb", "--port", str(port),
+                             "--cast", str(args.cast), "--crew", str(args.crew)],
+                            cwd=ROOT, stdout=subprocess.DEVNULL)
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        CREDIT_SNAPSHOT_PATH=os.path.join(tmp, "none.snap"),
+        METRICS_DIR=os.path.join(tmp, "metrics"),
+        TMDB_BASE_URL=f"http://127.0.0.1:{port}/3",
+        TMDB_IMAGE_BASE_URL=f"http://127.0.0.1:{port}/t/p",
+        TMDB_API_KEY="bench",
+    )
+
+    from sqlalchemy import func, select, update
+
+    from app import create_app, db
+    from app.migrations import upgrade
+    from app.models import Credit, Title
+    from app.services.cache import _save_streamed, _save_to_db
+    from app.services.tmdb import TMDBClient
+
+    payload = json.dumps(title_details(TITLE_ID, "tv", args.cast, args.crew))
+    report = {"payload_mb": round(len(payload) / 1024 / 1024, 2)}
+    del payload
+
+    app = create_app()
+    try:
+        _wait_for(f"http://127.0.0.1:{port}/3/tv/{TITLE_ID}", timeout=30)
+        with app.app_context():
+            upgrade()
+            client = TMDBClient()
+
+            def full(save):
+                def run():
+                    # Uncached credits are always rewritten in full.
+                    db.session.execute(update(Title).where(Title.id == TITLE_ID).values(credits_cached=False))
+                    db.session.commit()
+                    save()
+                return run
+
+            def whole_details():
+                data = client._get(f"tv/{TITLE_ID}", {"append_to_response": "aggregate_credits"})
+                return client._normalize_details(data, "tv")
+
+            modes = {
+                "whole": lambda: _save_to_db(whole_details()),
+                "streamed": lambda: _save_streamed(TITLE_ID, *client.stream_tv_details(TITLE_ID)),
+            }
+            written = {}
+            for name, fn in modes.items():
+                fn()  # warm up the HTTP pool and the database file
+                report[name] = _measure(full(fn), args.runs)
+                report[f"{name}_noop"] = _measure(fn, args.runs)
+                written[name] = db.session.execute(
+                    select(Credit.credit_type, func.count(), func.count(func.distinct(Credit.person_id)))
+                    .where(Credit.title_id == TITLE_ID)
+                    .group_by(Credit.credit_type)
+                    .order_by(Credit.credit_type)
+                ).all()
+            report["credits_match"] = written["whole"] == written["streamed"]
+    finally:
+        stub.terminate()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
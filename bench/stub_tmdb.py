@@ -0,0 +1,178 @@
+"""Local stand-in for the TMDB API and image CDN used by the benchmarks.
+
+Serves deterministic synthetic responses for `movie/<id>`, `tv/<id>`,
+`search/multi` and `/t/p/<size>/<file>` images, with configurable latency,
+jitter and error rate, so upstream behaviour can be simulated without touching
+the real API:
+
+    python -m bench.stub_tmdb --port 5099 --latency 0.2 --error-rate 0.01
+
+Point the app at it with TMDB_BASE_URL=http://127.0.0.1:5099/3 and
+TMDB_IMAGE_BASE_URL=http://127.0.0.1:5099/t/p.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Image content is never decoded — the app just streams and caches the bytes.
+IMAGE_BYTES = b"\xff\xd8\xff\xe0" + b"\0" * 8 * 1024 + b"\xff\xd9"
+
+
+def search_results(query, count=10):
+    return {
+        "page": 1,
+        "results": [
+            {
+                "id": 1000 + i,
+                "media_type": "movie" if i % 2 else "tv",
+                "title": f"{query.title()} {i}",
+                "name": f"{query.title()} {i}",
+                "release_date": f"{1990 + i}-01-01",
+                "first_air_date": f"{1990 + i}-01-01",
+                "overview": f"Synthetic result {i} for {query}.",
+                "poster_path": f"/poster{i}.jpg",
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def title_details(title_id, media_type, cast_size=40, crew_size=20, person_pool=50000):
+    """Deterministic TMDB-shaped details for one title, credits included."""
+    rng = random.Random(title_id * 2 + (media_type == "tv"))
+    people = rng.sample(range(1, person_pool + 1), cast_size + crew_size)
+    year = 1950 + title_id % 70
+    data = {"id": title_id, "overview": f"Synthetic {media_type} {title_id}.", "poster_path": f"/poster{title_id}.jpg"}
+    if media_type == "movie":
+        data.update(title=f"Movie {title_id}", release_date=f"{year}-06-01")
+        data["credits"] = {
+            "cast": [
+                {"id": pid, "name": f"Person {pid}", "profile_path": f"/p{pid}.jpg",
+                 "known_for_department": "Acting", "character": f"Role {i}", "order": i}
+                for i, pid in enumerate(people[:cast_size])
+            ],
+            "crew": [
+                {"id": pid, "name": f"Person {pid}", "profile_path": None,
+                 "known_for_department": "Directing", "job": "Director", "department": "Directing"}
+                for pid in people[cast_size:]
+            ],
+        }
+    else:
+        data.update(name=f"Show {title_id}", first_air_date=f"{year}-09-01")
+        data["aggregate_credits"] = {
+            "cast": [
+                {"id": pid, "name": f"Person {pid}", "profile_path": f"/p{pid}.jpg",
+                 "known_for_department": "Acting", "order": i,
+                 "roles": [{"character": f"Role {i}", "episode_count": 1 + i % 50}]}
+                for i, pid in enumerate(people[:cast_size])
+            ],
+            "crew": [
+                {"id": pid, "name": f"Person {pid}", "profile_path": None,
+                 "known_for_department": "Writing", "department": "Writing",
+                 "jobs": [{"job": "Writer", "episode_count": 3}]}
+                for pid in people[cast_size:]
+            ],
+        }
+    return data
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hits = 0  # API requests answered, so benchmarks can count upstream calls
+        self._hits_lock = threading.Lock()
+
+    def count_hit(self):
+        with self._hits_lock:
+            self.hits += 1
+
+
+class StubTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    cast_size = 40
+    crew_size = 20
+    max_id = None
+
+    def do_GET(self):
+        self.server.count_hit()
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_json({"status_message": "Synthetic failure"}, status=503)
+            return
+
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        if url.path.startswith("/t/p/"):
+            self._send(IMAGE_BYTES, "image/jpeg")
+        elif parts[:3] == ["3", "search", "multi"]:
+            self._send_json(search_results(params.get("query", "")))
+        elif (len(parts) == 3 and parts[1] in ("movie", "tv") and parts[2].isdigit()
+              and (self.max_id is None or int(parts[2]) <= self.max_id)):
+            self._send_json(title_details(int(parts[2]), parts[1], self.cast_size, self.crew_size))
+        else:
+            self._send_json({"status_message": "The resource you requested could not be found."}, status=404)
+
+    def _send_json(self, payload, status=200):
+        self._send(json.dumps(payload).encode(), "application/json", status)
+
+    def _send(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, latency=0.0, jitter=0.0, error_rate=0.0, cast_size=40, crew_size=20, max_id=None):
+    """Start the stub in a background thread. Returns (server, api_base_url, image_base_url).
+
+    Titles with an ID above `max_id` are answered with a 404. `error_rate` can
+    be changed while running through server.RequestHandlerClass.
+    """
+    handler = type("Handler", (StubTMDBHandler,), {
+        "latency": latency, "jitter": jitter, "error_rate": error_rate,
+        "cast_size": cast_size, "crew_size": crew_size, "max_id": max_id,
+    })
+    server = StubServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_port}"
+    return server, f"{root}/3", f"{root}/t/p"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay each response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay, up to this many seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503.")
+    parser.add_argument("--cast", type=int, default=40, help="Cast members per title.")
+    parser.add_argument("--crew", type=int, default=20, help="Crew members per title.")
+    parser.add_argument("--max-id", type=int, default=None, help="Answer titles with a higher ID with a 404.")
+    args = parser.parse_args()
+    server, api_url, image_url = serve(args.port, args.latency, args.jitter, args.error_rate, args.cast, args.crew,
+                                       args.max_id)
+    print(f"Stub TMDB API at {api_url}, images at {image_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Load test: autocomplete concurrency under slow upstream responses.
+
+Starts the stub TMDB with a fixed delay, then boots gunicorn twice — once with
+sync workers and once with SAMECAST_ASYNC=1 (gevent) — and fires the same
+burst of concurrent /search/autocomplete requests at each:
+
+    python -m bench.upstream_latency --latency 0.5 --concurrency 200
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.stub_tmdb import serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+def _fetch(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as resp:
+            resp.read()
+            ok = resp.status == 200
+    except OSError:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def run_mode(async_mode, tmdb_url, workers, concurrency, requests_total):
+    port = _free_port()
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        SAMECAST_ASYNC="1" if async_mode else "0",
+        TMDB_BASE_URL=tmdb_url,
+        TMDB_API_KEY="bench",
+        DATABASE_URL=f"sqlite:///{db_path}",
+    )
+    subprocess.run([sys.executable, "-m", "flask", "--app", "wsgi", "db", "upgrade"],
+                   cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_for(f"{base}/robots.txt")
+        urls = [f"{base}/search/autocomplete?q=query{i}&slot=1" for i in range(requests_total)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(_fetch, urls))
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    latencies = sorted(lat for _, lat in results)
+    return {
+        "mode": "gevent" if async_mode else "sync",
+        "workers": workers,
+        "requests": requests_total,
+        "errors": sum(1 for ok, _ in results if not ok),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests_total / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated TMDB latency in seconds.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=400)
+    args = parser.parse_args()
+
+    server, tmdb_url, _ = serve(latency=args.latency)
+    try:
+        report = [
+            run_mode(mode, tmdb_url, args.workers, args.concurrency, args.requests)
+            for mode in (False, True)
+        ]
+    finally:
+        server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
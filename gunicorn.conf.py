@@ -0,0 +1,14 @@
+# Gunicorn settings shared by Render and local load tests.
+#
+# SAMECAST_ASYNC=1 switches workers to gevent: blocking socket calls (TMDB API,
+# image CDN) yield to other requests, so a single worker keeps hundreds of
+# upstream requests in flight instead of one. Blueprints and templates are
+# unchanged — the same WSGI app runs under either worker class.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5050')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+
+if os.environ.get("SAMECAST_ASYNC", "").lower() in ("1", "true", "yes"):
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "500"))